@@ -0,0 +1,103 @@
+import argparse
+import os
+import random
+import sqlite3
+import statistics
+import string
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from rate_bot import migrations
+
+# Время типичных выборок до и после миграций (индексы + даты в unix-времени)
+# на синтетической таблице отзывов.
+# Запуск: python benchmarks/bench_indexes.py --rows 1000000
+
+CLEANERS = ['Ilya', 'Alexey', 'Maria', 'Olga', 'Sergey']
+START = datetime(2024, 1, 1)
+
+
+def fill(conn, rows, users):
+    rng = random.Random(42)
+    conn.execute('BEGIN')
+    conn.executemany('INSERT INTO users (user_id, name, last_check, coupon) VALUES (?, ?, ?, ?)', (
+        (user_id, f'user{user_id}', (START + timedelta(days=rng.randrange(900))).strftime('%Y-%m-%d %H:%M:%S'),
+         ''.join(rng.choices(string.ascii_uppercase, k=6)))
+        for user_id in range(1, users + 1)))
+    conn.executemany('''
+        INSERT INTO feedback (user_id, name, cleaner_name, address, cleaning_type, surfaces, floor, bathrooms,
+                              kitchen, trash, mirror, cleaner_rating, manager_rating, recommendation_rating,
+                              suggestions, date)
+        VALUES (?, ?, ?, ?, ?, 1, 1, 1, 1, 1, 1, ?, ?, ?, '', ?)
+    ''', (
+        (rng.randrange(1, users + 1), 'name', rng.choice(CLEANERS), 'address', rng.choice('gm'),
+         rng.randint(1, 10), rng.randint(1, 10), rng.randint(1, 10),
+         START + timedelta(seconds=rng.randrange(900 * 86400)))
+        for _ in range(rows)))
+    conn.execute('COMMIT')
+
+
+def measure(conn, sql, params, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        conn.execute(sql, params).fetchall()
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+
+# Выборки: (название, SQL до миграций, параметры со строковыми датами, SQL после, параметры с unix-временем).
+# После миграций отзывы клинера выбираются по cleaner_id (у "Maria" он 3: после двух прежних клинеров)
+def queries():
+    month_start, month_end = datetime(2025, 3, 1), datetime(2025, 4, 1)
+    text = (str(month_start), str(month_end))
+    epoch = (int(month_start.timestamp()), int(month_end.timestamp()))
+    return [
+        ("отзывы клиента", 'SELECT * FROM feedback WHERE user_id = ?', (123,), None, (123,)),
+        ("клинер за месяц", 'SELECT COUNT(*), AVG(cleaner_rating) FROM feedback WHERE cleaner_name = ? AND date >= ? AND date < ?',
+         ('Maria', *text),
+         'SELECT COUNT(*), AVG(cleaner_rating) FROM feedback WHERE cleaner_id = ? AND date >= ? AND date < ?',
+         (3, *epoch)),
+        ("тип уборки за месяц", 'SELECT COUNT(*) FROM feedback WHERE cleaning_type = ? AND date >= ? AND date < ?',
+         ('g', *text), None, ('g', *epoch)),
+        ("все отзывы за месяц", 'SELECT COUNT(*) FROM feedback WHERE date >= ? AND date < ?', text, None, epoch),
+        ("поиск по купону", 'SELECT user_id FROM users WHERE coupon = ?', ('QWERTY',), None, ('QWERTY',)),
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--users', type=int, default=200_000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        conn = sqlite3.connect(os.path.join(tmp, 'bench.db'), isolation_level=None)
+        conn.execute('PRAGMA journal_mode=WAL')
+        migrations.migrate(conn, target=1)
+
+        started = time.perf_counter()
+        fill(conn, args.rows, args.users)
+        print(f"Заполнение: {args.rows} отзывов, {args.users} клиентов за {time.perf_counter() - started:.1f} с")
+
+        before = [measure(conn, sql, text_params, args.repeat) for _, sql, text_params, _, _ in queries()]
+
+        started = time.perf_counter()
+        migrations.migrate(conn)
+        print(f"Миграция до версии {migrations.LATEST_VERSION}: {time.perf_counter() - started:.1f} с\n")
+
+        after = [measure(conn, after_sql or sql, epoch_params, args.repeat)
+                 for _, sql, _, after_sql, epoch_params in queries()]
+
+        print(f"{'Выборка':<24}{'до, мс':>12}{'после, мс':>12}{'ускорение':>12}")
+        for (name, *_), old, new in zip(queries(), before, after):
+            print(f"{name:<24}{old:>12.2f}{new:>12.3f}{old / new if new else float('inf'):>11.0f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Время холодного старта бота.
+# 1. python -X importtime: сколько занимает импорт rate_bot.main и какие модули
+#    самые дорогие; тяжелые пакеты выгрузки и графиков (openpyxl, pyarrow, matplotlib) при
+#    импорте загружаться не должны, файлы базы и лога - создаваться тоже.
+# 2. Полный перезапуск процесса: интерпретатор, импорт и setup() (миграции,
+#    хранилища) на новой и на уже существующей базе.
+# Запуск: python benchmarks/bench_startup.py --runs 10
+
+HEAVY_MODULES = ('openpyxl', 'pyarrow', 'matplotlib', 'numpy', 'aiohttp')
+
+SETUP_SCRIPT = '''
+import time
+started = time.perf_counter()
+from rate_bot import main
+imported = time.perf_counter()
+main.setup()
+print(imported - started, time.perf_counter() - imported)
+'''
+
+
+def python(args, cwd):
+    env = dict(os.environ, YOUR_BOT_TOKEN='123456:STARTUP', ADMIN_USER_ID='1', PYTHONPATH=ROOT,
+               PYTHONDONTWRITEBYTECODE='1')
+    return subprocess.run([sys.executable, *args], cwd=cwd, env=env, capture_output=True, text=True, check=True)
+
+
+# Строки вида "import time: self [us] | cumulative | module" -> {модуль: (self, cumulative)}
+def parse_importtime(stderr):
+    modules = {}
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        modules[name.strip()] = (int(self_us), int(cumulative_us))
+    return modules
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Время импорта и запуска бота")
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--top', type=int, default=10, help="Сколько самых дорогих модулей показать")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='rate_bot_startup_')
+    imports = []
+    for _ in range(args.runs):
+        modules = parse_importtime(python(['-X', 'importtime', '-c', 'import rate_bot.main'], workdir).stderr)
+        imports.append(modules)
+    created = os.listdir(workdir)
+
+    totals = [modules['rate_bot.main'][1] / 1000 for modules in imports]
+    print(f"Импорт rate_bot.main: медиана {statistics.median(totals):.1f} мс, мин. {min(totals):.1f} мс")
+    modules = imports[-1]
+    print(f"Самые дорогие модули (суммарно с зависимостями), всего {len(modules)}:")
+    top = sorted(((cumulative, name) for name, (_, cumulative) in modules.items() if '.' not in name),
+                 reverse=True)
+    for cumulative, name in top[:args.top]:
+        print(f"  {name:<25} {cumulative / 1000:>8.1f} мс")
+    heavy = sorted({name.split('.')[0] for name in modules} & set(HEAVY_MODULES))
+    print(f"Тяжелые пакеты при импорте: {', '.join(heavy) or 'нет'}")
+    print(f"Файлы, созданные импортом: {', '.join(created) or 'нет'}")
+
+    # Полный старт: первый запуск создает базу и применяет миграции, следующие - нет
+    python(['-c', SETUP_SCRIPT], workdir)
+    for title, fresh in (("новая база", True), ("существующая база", False)):
+        results = []
+        for _ in range(args.runs):
+            cwd = tempfile.mkdtemp(prefix='rate_bot_startup_') if fresh else workdir
+            results.append([float(value) * 1000 for value in python(['-c', SETUP_SCRIPT], cwd).stdout.split()])
+        import_ms = statistics.median(result[0] for result in results)
+        setup_ms = statistics.median(result[1] for result in results)
+        print(f"Старт ({title}): импорт {import_ms:.1f} мс, setup() {setup_ms:.1f} мс")
+
+    sys.exit(1 if heavy or created else 0)
+
+
+if __name__ == '__main__':
+    main()
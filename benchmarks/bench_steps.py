@@ -0,0 +1,148 @@
+import argparse
+import os
+import secrets
+import sys
+import tempfile
+import time
+import tracemalloc
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from telebot import types
+
+from rate_bot.checklist import CHECK, QUESTIONS, Checklist, Reply
+from rate_bot.cleaners import Roster
+from rate_bot.db import Database
+from rate_bot.sessions import SessionStore
+from rate_bot.steps import LocalRedis, RedisStepStorage
+
+# Стоимость одного шага чек-листа: прежние функции-шаги, собиравшие клавиатуру
+# при каждом вызове, против диспетчера checklist.py с готовыми клавиатурами.
+# Хранилища сессий и шагов в обоих случаях одинаковые (в памяти), запись в БД
+# не выполняется, поэтому разница - это подготовка ответа и разбор нажатия.
+# Список клинеров диспетчер читает из таблицы cleaners (проверка версии списка
+# входит в стоимость шага), прежние функции-шаги использовали две кнопки в коде.
+# Запуск: python benchmarks/bench_steps.py --checklists 2000
+
+# Вопросы "выполнено/нет" генеральной уборки и ответы на них
+CHECKS = [question for question in QUESTIONS if question.kind == CHECK]
+GENERAL = ['Убрали ✅', 'Чисто ✅', 'Убрали ✅', 'Убрали ✅', 'Убрали ✅', 'Убрали ✅', 'Убрали ✅', 'Вынесли ✅', 'Помыли ✅']
+
+
+def message(chat_id, text):
+    return SimpleNamespace(chat=SimpleNamespace(id=chat_id), text=text, message_id=1,
+                           from_user=SimpleNamespace(is_bot=False))
+
+
+def callback(chat_id, data):
+    return SimpleNamespace(data=data, message=message(chat_id, ''))
+
+
+# Прежний способ: клавиатура собирается заново на каждом шаге и сериализуется при отправке
+def legacy_check_markup(labels):
+    markup = types.ReplyKeyboardMarkup(row_width=2, one_time_keyboard=True)
+    markup.add(types.KeyboardButton(labels[0]), types.KeyboardButton(labels[1]))
+    return markup.to_json()
+
+
+def legacy_rating_markup(prefix, token):
+    markup = types.InlineKeyboardMarkup(row_width=5)
+    for i in range(1, 11):
+        markup.add(types.InlineKeyboardButton(str(i), callback_data=f'{prefix}_{token}_{i}'))
+    return markup.to_json()
+
+
+def legacy_choice_markup(prefix, token, options):
+    markup = types.InlineKeyboardMarkup(row_width=2)
+    markup.add(*[types.InlineKeyboardButton(label, callback_data=f'{prefix}_{token}_{value}')
+                 for label, value in options])
+    return markup.to_json()
+
+
+def run_legacy(chat_id, sessions, step_states):
+    replies = [Reply(chat_id, "Как Вас зовут?")]
+    step_states.set(chat_id, 'get_name')
+    step_states.delete(chat_id)
+    # Прежние кнопки несли в callback_data токен сессии
+    token = secrets.token_hex(3)
+    sessions.start(chat_id, name='Иван')
+    replies.append(Reply(chat_id, '', legacy_choice_markup('nc', token, (("Илья", 'Ilya'), ("Алексей", 'Alexey')))))
+    prefix, token, choice = f'nc_{token}_Ilya'.split('_', 2)
+    sessions.get(chat_id)
+    sessions.update(chat_id, cleaner_name=choice)
+    step_states.set(chat_id, 'get_cleaning_type')
+    replies.append(Reply(chat_id, ''))
+    step_states.delete(chat_id)
+    sessions.update(chat_id, address='Адрес')
+    replies.append(Reply(chat_id, '', legacy_choice_markup('ct', token, (("Генеральная", 'g'), ("Поддерживающая", 'm')))))
+    sessions.get(chat_id)
+    sessions.update(chat_id, cleaning_type='g')
+    for question, text in zip(CHECKS, GENERAL):
+        step_states.set(chat_id, question.key)
+        replies.append(Reply(chat_id, question.text, legacy_check_markup(question.options)))
+        step_states.get(chat_id)
+        step_states.delete(chat_id)
+        sessions.update(chat_id, **{question.key: 1 if text == question.options[0] else 0})
+    for prefix in ('cln', 'mgr', 'rec'):
+        replies.append(Reply(chat_id, '', legacy_rating_markup(prefix, token)))
+        prefix, token, choice = f'{prefix}_{token}_7'.split('_', 2)
+        sessions.get(chat_id)
+        sessions.update(chat_id, **{prefix: int(choice)})
+    step_states.set(chat_id, 'finalize_feedback')
+    step_states.get(chat_id)
+    step_states.delete(chat_id)
+    sessions.finish(chat_id)
+    return replies
+
+
+def run_engine(chat_id, checklist):
+    replies = checklist.start(message(chat_id, '/start'))
+    replies += checklist.process_message(message(chat_id, 'Иван'))
+    replies += checklist.process_callback(callback(chat_id, 'cleaner_id:1'))[1]
+    replies += checklist.process_message(message(chat_id, 'Адрес'))
+    replies += checklist.process_callback(callback(chat_id, 'cleaning_type:g'))[1]
+    for text in GENERAL:
+        replies += checklist.process_message(message(chat_id, text))
+    for key in ('cleaner_rating', 'manager_rating', 'recommendation_rating'):
+        replies += checklist.process_callback(callback(chat_id, f'{key}:7'))[1]
+    replies += checklist.process_message(message(chat_id, 'Нет'))
+    return replies
+
+
+def measure(name, run, count, steps):
+    started = time.perf_counter()
+    for chat_id in range(count):
+        run(chat_id)
+    elapsed = time.perf_counter() - started
+
+    # Память: сколько байт выделяется за чек-лист (пик относительно начала прогона)
+    tracemalloc.start()
+    allocated = 0
+    for chat_id in range(count, count + 100):
+        before = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        run(chat_id)
+        allocated += tracemalloc.get_traced_memory()[1] - before
+    tracemalloc.stop()
+    print(f"{name:<15} {elapsed * 1e6 / (count * steps):>8.1f} мкс/шаг {allocated / (100 * steps) / 1024:>8.1f} КБ/шаг")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Стоимость шага чек-листа")
+    parser.add_argument('--checklists', type=int, default=2000)
+    args = parser.parse_args()
+
+    steps = 18  # /start и 17 ответов генеральной уборки
+    sessions, step_states = SessionStore(ttl=3600), RedisStepStorage(LocalRedis(), ttl=3600)
+    measure("функции-шаги", lambda chat_id: run_legacy(chat_id, sessions, step_states), args.checklists, steps)
+    db = Database(os.path.join(tempfile.mkdtemp(prefix='rate_bot_steps_'), 'bench.db'))
+    db.start()
+    roster = Roster(db)
+    checklist = Checklist(SessionStore(ttl=3600), RedisStepStorage(LocalRedis(), ttl=3600), on_complete=lambda m, a: [],
+                          rosters={roster.key: roster})
+    measure("checklist.py", lambda chat_id: run_engine(chat_id, checklist), args.checklists, steps)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,150 @@
+import itertools
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+# Локальная замена Telegram Bot API для нагрузочных тестов.
+# Реализует методы, которыми пользуется бот: getUpdates (long polling),
+# sendMessage, answerCallbackQuery, deleteMessage(s), sendDocument.
+# Обновления от "клиентов" кладутся в очередь через push_update, а сообщения
+# бота запоминаются по чатам, чтобы симулятор мог дождаться ответа.
+# Бот подключается через telebot.apihelper.API_URL = server.api_url
+
+
+class FakeTelegram:
+    def __init__(self, host='127.0.0.1', port=0):
+        self._updates = []
+        self._update_ids = itertools.count(1)
+        self._message_ids = itertools.count(1)
+        self._messages = {}  # chat_id -> [(время, сообщение, клавиатура)]
+        self._cond = threading.Condition()
+        self.calls = {}  # метод -> число вызовов
+        self.deleted = 0
+
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            # Заголовки и тело уходят разными пакетами: без этого keep-alive упирается в задержку ACK (~40 мс)
+            disable_nagle_algorithm = True
+
+            def do_GET(self):
+                self._handle()
+
+            def do_POST(self):
+                self._handle()
+
+            def _handle(self):
+                url = urlsplit(self.path)
+                params = {key: values[0] for key, values in parse_qs(url.query).items()}
+                length = int(self.headers.get('Content-Length') or 0)
+                body = self.rfile.read(length) if length else b''
+                if self.headers.get('Content-Type', '').startswith('application/x-www-form-urlencoded'):
+                    params.update({key: values[0] for key, values in parse_qs(body.decode()).items()})
+                method = url.path.rsplit('/', 1)[-1]
+                payload = json.dumps({'ok': True, 'result': fake.call(method, params)}).encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        self.api_url = f'http://{host}:{self.server.server_address[1]}/bot{{0}}/{{1}}'
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, name='fake-telegram', daemon=True).start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+
+    def next_message_id(self):
+        return next(self._message_ids)
+
+    # --- Сторона клиентов ---
+
+    def push_update(self, update):
+        with self._cond:
+            update['update_id'] = next(self._update_ids)
+            self._updates.append(update)
+            self._cond.notify_all()
+
+    def messages(self, chat_id):
+        with self._cond:
+            return list(self._messages.get(chat_id, ()))
+
+    # Ожидание сообщения бота в чат с номером больше count. Возвращает (время, сообщение, клавиатура) или None
+    def wait_message(self, chat_id, count, timeout=30):
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while len(self._messages.get(chat_id, ())) <= count:
+                left = deadline - time.monotonic()
+                if left <= 0:
+                    return None
+                self._cond.wait(left)
+            return self._messages[chat_id][count]
+
+    # --- Методы Bot API ---
+
+    def call(self, method, params):
+        with self._cond:
+            self.calls[method] = self.calls.get(method, 0) + 1
+        handler = getattr(self, f'api_{method}', None)
+        return handler(params) if handler else True
+
+    def api_getMe(self, params):
+        return {'id': 1, 'is_bot': True, 'first_name': 'Rate Cleaning', 'username': 'rate_cleaning_bot'}
+
+    def api_getUpdates(self, params):
+        offset = int(params.get('offset', 0))
+        limit = int(params.get('limit', 100))
+        deadline = time.monotonic() + float(params.get('timeout', 0))
+        with self._cond:
+            self._updates = [update for update in self._updates if update['update_id'] >= offset]
+            while not self._updates and time.monotonic() < deadline:
+                self._cond.wait(deadline - time.monotonic())
+            return self._updates[:limit]
+
+    def _store(self, chat_id, message, markup=None):
+        with self._cond:
+            self._messages.setdefault(chat_id, []).append((time.perf_counter(), message, markup))
+            self._cond.notify_all()
+        return message
+
+    def api_sendMessage(self, params):
+        chat_id = int(params['chat_id'])
+        message = {
+            'message_id': self.next_message_id(), 'date': int(time.time()),
+            'chat': {'id': chat_id, 'type': 'private'}, 'from': self.api_getMe(params),
+            'text': params.get('text', ''),
+        }
+        markup = json.loads(params['reply_markup']) if params.get('reply_markup') else {}
+        # Как и Telegram, в ответе возвращаем только инлайн-клавиатуру
+        if 'inline_keyboard' in markup:
+            message['reply_markup'] = markup
+        return self._store(chat_id, message, markup)
+
+    def api_sendDocument(self, params):
+        chat_id = int(params['chat_id'])
+        return self._store(chat_id, {
+            'message_id': self.next_message_id(), 'date': int(time.time()),
+            'chat': {'id': chat_id, 'type': 'private'}, 'from': self.api_getMe(params),
+            'document': {'file_id': 'fake', 'file_unique_id': 'fake'},
+        })
+
+    def api_deleteMessage(self, params):
+        with self._cond:
+            self.deleted += 1
+        return True
+
+    def api_deleteMessages(self, params):
+        with self._cond:
+            self.deleted += len(json.loads(params['message_ids']))
+        return True
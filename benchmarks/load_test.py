@@ -0,0 +1,169 @@
+import argparse
+import logging
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_telegram import FakeTelegram
+
+# Нагрузочный тест без сети: бот (main.py в режиме polling) работает с локальной
+# заменой Bot API, а N синтетических клиентов одновременно проходят чек-лист
+# генеральной и поддерживающей уборки. Задержка шага - время от появления
+# обновления в getUpdates до сообщения бота в ответ.
+# Запуск: python benchmarks/load_test.py --customers 200
+# Лимиты отправки по умолчанию сняты, чтобы мерить обработчики; с лимитами
+# Telegram: --chat-rate 1 --global-rate 30
+
+ADMIN_CHAT_ID = 1
+
+
+def percentile(values, p):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+
+class Customer:
+    def __init__(self, fake, chat_id, cleaning_type, think_time, rng):
+        self.fake = fake
+        self.chat_id = chat_id
+        self.cleaning_type = cleaning_type
+        self.think_time = think_time
+        self.rng = rng
+        self.latencies = []
+        self.completed = False
+        self.error = None
+
+    def user(self):
+        return {'id': self.chat_id, 'is_bot': False, 'first_name': f'Клиент {self.chat_id}'}
+
+    def send_text(self, text):
+        message = {
+            'message_id': self.fake.next_message_id(), 'date': int(time.time()),
+            'chat': {'id': self.chat_id, 'type': 'private'}, 'from': self.user(), 'text': text,
+        }
+        if text.startswith('/'):
+            message['entities'] = [{'type': 'bot_command', 'offset': 0, 'length': len(text)}]
+        self.fake.push_update({'message': message})
+
+    def press(self, message, callback_data):
+        self.fake.push_update({'callback_query': {
+            'id': str(self.fake.next_message_id()), 'chat_instance': str(self.chat_id), 'from': self.user(),
+            'message': message, 'data': callback_data,
+        }})
+
+    # Ответ на вопрос бота по его клавиатуре: кнопка, вариант обычной клавиатуры или текст
+    def answer(self, message, markup):
+        if 'inline_keyboard' in markup:
+            # Кнопки листания списка клинеров ("cleaner_id:page:1", "cleaner_id:-") не отвечают на вопрос
+            buttons = [button['callback_data'] for row in markup['inline_keyboard'] for button in row
+                       if ':page:' not in button['callback_data'] and not button['callback_data'].endswith(':-')]
+            typed = [data for data in buttons if data.endswith(f':{self.cleaning_type}')]
+            self.press(message, typed[0] if typed else self.rng.choice(buttons))
+        elif 'keyboard' in markup:
+            self.send_text(self.rng.choice([button['text'] for row in markup['keyboard'] for button in row]))
+        elif message['text'].startswith("Теперь укажите"):
+            self.send_text(f"ул. Тестовая, д. {self.chat_id}")
+        else:
+            self.send_text(f"Клиент {self.chat_id}")
+
+    def run(self, timeout):
+        try:
+            count = 0
+            self.send_text('/start')
+            while True:
+                started = time.perf_counter()
+                reply = self.fake.wait_message(self.chat_id, count, timeout)
+                if reply is None:
+                    raise TimeoutError(f"Нет ответа бота в чат {self.chat_id} после {count} сообщений")
+                received_at, message, markup = reply
+                self.latencies.append(received_at - started)
+                count += 1
+                if 'купон' in message['text']:
+                    self.completed = True
+                    return
+                if self.think_time:
+                    time.sleep(self.rng.uniform(0, self.think_time))
+                self.answer(message, markup or {})
+        except Exception as e:
+            self.error = e
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Нагрузочный тест чек-листа с локальной заменой Telegram")
+    parser.add_argument('--customers', type=int, default=100, help="Число одновременных клиентов")
+    parser.add_argument('--think-time', type=float, default=0, help="Пауза клиента перед ответом, до N секунд")
+    parser.add_argument('--chat-rate', type=float, default=1000, help="Лимит сообщений в один чат в секунду")
+    parser.add_argument('--global-rate', type=float, default=1000, help="Общий лимит сообщений в секунду")
+    parser.add_argument('--threads', type=int, default=2, help="Потоки обработчиков telebot")
+    parser.add_argument('--timeout', type=float, default=60, help="Ожидание ответа бота, сек.")
+    args = parser.parse_args()
+
+    fake = FakeTelegram().start()
+
+    # Бот создает базу в текущем каталоге - работаем во временном
+    workdir = tempfile.mkdtemp(prefix='rate_bot_load_')
+    os.chdir(workdir)
+    os.environ.update({
+        'YOUR_BOT_TOKEN': '123456:LOADTEST', 'ADMIN_USER_ID': str(ADMIN_CHAT_ID),
+        'OUTBOX_CHAT_RATE': str(args.chat_rate), 'OUTBOX_GLOBAL_RATE': str(args.global_rate),
+    })
+    from telebot import apihelper
+    apihelper.API_URL = fake.api_url
+
+    from rate_bot import main as bot_main
+    logging.basicConfig(level=logging.WARNING)
+    bot_main.setup()
+    bot_main.bot.num_threads = args.threads
+    bot_main.outbox.start()
+    threading.Thread(target=bot_main.bot.polling, kwargs={'non_stop': True, 'interval': 0, 'timeout': 10},
+                     name='polling', daemon=True).start()
+
+    rng = random.Random(42)
+    customers = [Customer(fake, 1000 + i, 'g' if i % 2 else 'm', args.think_time, random.Random(rng.random()))
+                 for i in range(args.customers)]
+    threads = [threading.Thread(target=customer.run, args=(args.timeout,)) for customer in customers]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    # Отчеты администратору и удаление сообщений уходят из очереди уже после ответа клиенту
+    deadline = time.monotonic() + 10
+    while bot_main.outbox.pending() and time.monotonic() < deadline:
+        time.sleep(0.05)
+
+    completed = [customer for customer in customers if customer.completed]
+    latencies = [latency * 1000 for customer in customers for latency in customer.latencies]
+    steps = len(latencies)
+    db_stats = bot_main.db.stats()
+    print(f"Клиентов: {args.customers}, завершили чек-лист: {len(completed)}, время: {elapsed:.1f} с")
+    for customer in customers:
+        if customer.error:
+            print(f"  ошибка: {customer.error}")
+            break
+    print(f"Пропускная способность: {len(completed) / elapsed:.1f} чек-листов/с, {steps / elapsed:.0f} шагов/с")
+    print(f"Задержка шага: p50 {percentile(latencies, 0.50):.1f} мс, p95 {percentile(latencies, 0.95):.1f} мс, "
+          f"p99 {percentile(latencies, 0.99):.1f} мс, макс. {max(latencies, default=0):.1f} мс")
+    print(f"Запись в БД: p50 {db_stats['submit_p50_ms']:.1f} мс, p95 {db_stats['submit_p95_ms']:.1f} мс, "
+          f"p99 {db_stats['submit_p99_ms']:.1f} мс, макс. {db_stats['submit_max_ms']:.1f} мс; "
+          f"записей {db_stats['writes']}, транзакций {db_stats['batches']} (в среднем {db_stats['avg_batch']:.1f})")
+    print(f"Отчетов администратору: {len(fake.messages(ADMIN_CHAT_ID))}, удалено сообщений: {fake.deleted}")
+    print("Вызовы API: " + ', '.join(f"{method} {count}" for method, count in sorted(fake.calls.items())))
+    # Сводка метрик бота (та же, что в /health): где тратится время - в API или в SQLite
+    print(bot_main.format_health())
+    os._exit(0 if len(completed) == args.customers else 1)
+
+
+if __name__ == '__main__':
+    main()
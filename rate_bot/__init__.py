@@ -0,0 +1,9 @@
+# Чек-лист бот Rate Cleaning.
+# Импорт пакета и его модулей не подключается к Telegram и не открывает базу данных:
+# бот запускается явно через run() - python -m rate_bot [polling|dispatcher|worker]
+# или python main.py, webhook-сервер - python -m rate_bot.webhook или python webhook.py
+
+
+def run(argv=None):
+    from rate_bot.main import run
+    run(argv)
@@ -0,0 +1,3 @@
+from rate_bot import run
+
+run()
@@ -0,0 +1,249 @@
+import logging
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta
+
+from rate_bot import metrics
+from rate_bot import reports
+from rate_bot import stats
+
+logger = logging.getLogger(__name__)
+
+# Разделение отзывов на оперативные и архивные, обслуживание файла базы.
+# Отзывы старше after_days целыми месяцами переносятся из feedback в отдельные
+# файлы SQLite (archive/feedback_ГГГГ-ММ.db), поэтому рабочая база, ее кэш страниц
+# и резервные копии не растут вместе с историей. Перенесенные месяцы записаны в
+# archived_months; архивный файл открывается только при чтении (выгрузка /get_db).
+# Агрегаты /stats и сводки не теряют архивные отзывы: перед переносом отзывы
+# учитываются в summaries (reports.fold), а их вклад в cleaner_stats сохраняется
+# в archive_stats для /rebuild_stats.
+# Перенос месяца - две транзакции: копия фиксируется в архивном файле, затем в
+# рабочей базе удаляются именно скопированные строки. При сбое между ними
+# следующий проход повторяет оба шага (повторная копия не дублирует строки).
+# Все операции выполняет поток-писатель БД (задачи вне транзакции), поэтому они
+# не конкурируют с записью отзывов за блокировку. После переноса свободные
+# страницы возвращаются порциями (incremental_vacuum), а WAL сбрасывается checkpoint.
+
+VACUUM_PAGES = 2000  # Страниц за одну задачу incremental_vacuum (4 КБ страница - 8 МБ)
+
+ARCHIVED_ROWS = metrics.register(metrics.Counter('rate_bot_archived_rows_total', "Отзывы, перенесенные в архив"))
+MAINTENANCE_SECONDS = metrics.register(metrics.Histogram(
+    'rate_bot_maintenance_seconds', "Время обслуживания базы: архив, vacuum, checkpoint", ['stage'],
+    buckets=(0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30, 60, 300)))
+
+SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS archived_months (
+        month TEXT PRIMARY KEY,
+        path TEXT NOT NULL,
+        rows INTEGER NOT NULL DEFAULT 0,
+        max_id INTEGER,
+        archived_at INTEGER
+    )
+'''
+
+
+# Границы месяца по локальному времени (unix-время начала и конца)
+def month_bounds(month):
+    start = datetime.strptime(month, '%Y-%m')
+    end = (start + timedelta(days=32)).replace(day=1)
+    return int(start.timestamp()), int(end.timestamp())
+
+
+def table_columns(conn, table, schema='main'):
+    return [(row[1], row[2], row[5]) for row in conn.execute(f'PRAGMA {schema}.table_info({table})')]
+
+
+# Месяцы, которые пора перенести: полностью старше now - after_days
+def due_months(conn, after_days, now):
+    cutoff = (now - timedelta(days=after_days)).replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    return [row[0] for row in conn.execute('''
+        SELECT DISTINCT strftime('%Y-%m', date, 'unixepoch', 'localtime') FROM feedback
+        WHERE date < ? ORDER BY 1
+    ''', (int(cutoff.timestamp()),))]
+
+
+# Перенос отзывов месяца в архивный файл. Задача потока-писателя вне транзакции (ATTACH
+# внутри транзакции невозможен). Переносятся только отзывы, уже учтенные в сводках.
+# Возвращает число перенесенных отзывов
+def archive_month(conn, directory, month):
+    start, end = month_bounds(month)
+    row = conn.execute("SELECT last_feedback_id FROM export_state WHERE name = 'summaries'").fetchone()
+    where, params = 'date >= ? AND date < ? AND id <= ?', (start, end, row[0] if row else 0)
+    columns = table_columns(conn, 'feedback')
+    names = ', '.join(name for name, _, _ in columns)
+    path = os.path.join(directory, f'feedback_{month}.db')
+
+    os.makedirs(directory, exist_ok=True)
+    conn.execute('ATTACH DATABASE ? AS cold', (path,))
+    try:
+        conn.execute('BEGIN')
+        conn.execute(f'''
+            CREATE TABLE IF NOT EXISTS cold.feedback (
+                {', '.join(f"{name} {declared}{' PRIMARY KEY' if pk else ''}" for name, declared, pk in columns)}
+            )
+        ''')
+        # Колонки, добавленные в feedback после создания архива
+        archived = {name for name, _, _ in table_columns(conn, 'feedback', 'cold')}
+        for name, declared, _ in columns:
+            if name not in archived:
+                conn.execute(f'ALTER TABLE cold.feedback ADD COLUMN {name} {declared}')
+        conn.execute(f'INSERT OR IGNORE INTO cold.feedback ({names}) SELECT {names} FROM main.feedback WHERE {where}',
+                     params)
+        conn.execute('COMMIT')
+    finally:
+        if conn.in_transaction:
+            conn.execute('ROLLBACK')
+        conn.execute('DETACH DATABASE cold')
+
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        count, max_id = conn.execute(f'SELECT COUNT(*), MAX(id) FROM feedback WHERE {where}', params).fetchone()
+        if not count:
+            conn.execute('COMMIT')
+            return 0
+        stats.archive_feedback(conn, where, params)
+        conn.execute(f'DELETE FROM feedback WHERE {where}', params)
+        conn.execute('''
+            INSERT INTO archived_months (month, path, rows, max_id, archived_at) VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT (month) DO UPDATE SET
+                rows = rows + excluded.rows, max_id = MAX(max_id, excluded.max_id), archived_at = excluded.archived_at
+        ''', (month, path, count, max_id, int(time.time())))
+        conn.execute('COMMIT')
+    except Exception:
+        conn.execute('ROLLBACK')
+        raise
+    return count
+
+
+# Перевод существующей базы в режим auto_vacuum=INCREMENTAL: один полный VACUUM.
+# Возвращает True, если он понадобился
+def enable_incremental_vacuum(conn):
+    if conn.execute('PRAGMA auto_vacuum').fetchone()[0] == 2:
+        return False
+    conn.execute('PRAGMA auto_vacuum=INCREMENTAL')
+    conn.execute('VACUUM')
+    return True
+
+
+# Возврат до pages свободных страниц файлу. Возвращает, сколько свободных страниц осталось
+def incremental_vacuum(conn, pages=VACUUM_PAGES):
+    if conn.execute('PRAGMA freelist_count').fetchone()[0]:
+        # Прагма освобождает по странице на шаг, поэтому результат нужно дочитать
+        conn.execute(f'PRAGMA incremental_vacuum({int(pages)})').fetchall()
+    return conn.execute('PRAGMA freelist_count').fetchone()[0]
+
+
+# Перенос WAL в базу и усечение файла WAL до нуля. Возвращает (занято, страниц в WAL, перенесено)
+def checkpoint(conn):
+    return conn.execute('PRAGMA wal_checkpoint(TRUNCATE)').fetchone()
+
+
+# Архивные месяцы, которые нужно прочитать для выгрузки: (месяц, путь к файлу).
+# since_epoch и after_id отсекают месяцы, целиком не попадающие в выгрузку
+def archived(conn, since_epoch=None, after_id=None):
+    months = []
+    for month, path, max_id in conn.execute('SELECT month, path, max_id FROM archived_months ORDER BY month'):
+        if since_epoch is not None and month_bounds(month)[1] <= since_epoch:
+            continue
+        if after_id is not None and (max_id or 0) <= after_id:
+            continue
+        months.append((month, path))
+    return months
+
+
+# Чтение отзывов из архивных файлов и рабочей базы подряд, с интерфейсом курсора
+# (description, fetchmany) для export.py. Каждый архивный файл открывается только
+# на чтение и только когда до него доходит очередь. query(columns) строит запрос по
+# колонкам конкретного файла (в старом архиве может не быть новых колонок)
+class FeedbackCursor:
+    def __init__(self, live, paths, query, params):
+        self.description = live.description
+        self._live = live
+        self._paths = list(paths)
+        self._query = query
+        self._params = params
+        self._current = None
+        self._conn = None
+
+    def _next_source(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+        if not self._paths:
+            self._current = self._live
+            return
+        self._conn = sqlite3.connect(f'file:{self._paths.pop(0)}?mode=ro', uri=True)
+        columns = {name for name, _, _ in table_columns(self._conn, 'feedback')}
+        self._current = self._conn.execute(self._query(columns), self._params)
+
+    def fetchmany(self, size):
+        while True:
+            if self._current is None:
+                self._next_source()
+            rows = self._current.fetchmany(size)
+            if rows or self._current is self._live:
+                return rows
+            self._current = None
+
+
+# Обслуживание базы в отдельном потоке раз в interval секунд: перенос старых месяцев
+# в архив (after_days=0 - без архива), возврат свободных страниц и checkpoint
+class Archiver:
+    def __init__(self, db, directory='archive', after_days=365, interval=3600):
+        self.db = db
+        self.directory = directory
+        self.after_days = after_days
+        self.interval = interval
+        self._thread = None
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._loop, name='archive', daemon=True)
+        self._thread.start()
+
+    def _loop(self):
+        while True:
+            try:
+                self.run_once(datetime.now())
+            except Exception as e:
+                logger.exception(f"Ошибка обслуживания базы: {e}")
+            time.sleep(self.interval)
+
+    def run_once(self, now):
+        if self.after_days:
+            # Все отзывы, которые могут попасть в архив, должны быть учтены в сводках
+            while self.db.submit(reports.fold).result():
+                pass
+            for month in due_months(self.db.reader(), self.after_days, now):
+                with MAINTENANCE_SECONDS.time('archive'):
+                    count = self.db.submit(lambda conn: archive_month(conn, self.directory, month),
+                                           transaction=False).result()
+                ARCHIVED_ROWS.inc(amount=count)
+                logger.info(f"Отзывы за {month} перенесены в архив: {count}")
+
+        with MAINTENANCE_SECONDS.time('vacuum'):
+            if self.db.submit(enable_incremental_vacuum, transaction=False).result():
+                logger.info("База переведена в режим auto_vacuum=INCREMENTAL")
+            # Порциями, чтобы между ними успевали записываться отзывы
+            free = None
+            while True:
+                left = self.db.submit(incremental_vacuum, transaction=False).result()
+                if not left or left == free:
+                    break
+                free = left
+        with MAINTENANCE_SECONDS.time('checkpoint'):
+            busy, _, _ = self.db.submit(checkpoint, transaction=False).result()
+        if busy:
+            logger.warning("Checkpoint WAL не завершен: базу читают другие соединения")
+
+    # Размер рабочей базы, WAL и архива для /db_stats
+    def describe(self):
+        def megabytes(path):
+            return os.path.getsize(path) / 2 ** 20 if os.path.exists(path) else 0.0
+
+        months, rows = self.db.query_one('SELECT COUNT(*), COALESCE(SUM(rows), 0) FROM archived_months')
+        return (f"База: {megabytes(self.db.path):.1f} МБ, WAL {megabytes(self.db.path + '-wal'):.1f} МБ\n"
+                f"Архив: {months} мес., отзывов {rows}")
@@ -0,0 +1,224 @@
+from collections import namedtuple
+
+from telebot import types
+
+from rate_bot import metrics
+
+# Чек-лист, описанный данными.
+# Вопросы, подписи кнопок, ветвление по типу уборки и колонки БД задаются один раз
+# в QUESTIONS, а весь опрос ведет один диспетчер Checklist. Ключ вопроса - это
+# колонка таблицы feedback, в которую попадает ответ (колонку нового вопроса
+# добавляет миграция в migrations.py, ее наличие проверяется при запуске). Клавиатуры собираются и
+# сериализуются в JSON при импорте и переиспользуются для всех клиентов, поэтому
+# в callback_data нет ничего, кроме ключа вопроса и варианта ("cleaner_rating:7"),
+# а устаревшие кнопки отсекаются по текущему шагу клиента.
+
+# Шаги чек-листа не отправляют сообщения сами, а возвращают список ответов.
+# Их отправляет send_replies (polling/воркеры) или асинхронный webhook-сервер (webhook.py)
+
+# Исходящее сообщение клиенту или администратору. digest - отчет, который
+# в режиме сводки объединяется с другими (см. outbox.py), track - сообщение
+# чек-листа, которое удаляется по его завершении
+Reply = namedtuple('Reply', ['chat_id', 'text', 'markup', 'digest', 'track'], defaults=[None, False, False])
+# Удаление сообщений чек-листа (вопросов и ответов клиента) после его завершения
+Cleanup = namedtuple('Cleanup', ['chat_id'])
+# Замена клавиатуры уже отправленного сообщения (листание списка клинеров)
+EditMarkup = namedtuple('EditMarkup', ['chat_id', 'message_id', 'markup'])
+
+# Виды вопросов
+TEXT = 'text'      # ответ текстом; options - необязательные инлайн-кнопки вместо текста
+CHECK = 'check'    # выполнено/нет кнопками обычной клавиатуры, options = (выполнено, не выполнено), в БД 1/0
+CHOICE = 'choice'  # выбор инлайн-кнопкой, options = ((подпись, значение), ...)
+ROSTER = 'roster'  # выбор из списка, который ведет администратор (rosters[key], см. cleaners.py), в БД id
+
+# label - короткая подпись для отчета и /stats, only_for - типы уборки, в которых задается вопрос
+Question = namedtuple('Question', ['key', 'text', 'kind', 'options', 'label', 'only_for', 'row_width'],
+                      defaults=[(), None, None, 2])
+
+RATINGS = tuple((str(i), i) for i in range(1, 11))
+
+QUESTIONS = (
+    Question('name', "Добро пожаловать в чек-лист бота Rate Cleaning! Как Вас зовут?", TEXT),
+    Question('cleaner_id', "Выберите, кто проводил клининг:", ROSTER),
+    Question('address', "Теперь укажите ваш адрес", TEXT),
+    Question('cleaning_type', "Выберите тип уборки:", CHOICE, (("Генеральная", 'g'), ("Поддерживающая", 'm'))),
+    Question('windows', "Мойка окон:", CHECK, ('Убрали ✅', 'НЕ убрали ❌'), 'Окна', only_for=('g',)),
+    Question('cobweb', "Удаление паутины:", CHECK, ('Чисто ✅', 'НЕ убрали ❌'), 'Паутина', only_for=('g',)),
+    Question('balcony', "Уборка балкона и террасной зоны:", CHECK, ('Убрали ✅', 'НЕ убрали ❌'), 'Балкон/Терраса',
+             only_for=('g',)),
+    Question('surfaces', "Пыль и загрязнения на различных поверхностях:", CHECK, ('Убрали ✅', 'НЕ убрали ❌'),
+             'Поверхности'),
+    Question('floor', "Сухая и влажная уборка полов:", CHECK, ('Убрали ✅', 'НЕ убрали ❌'), 'Пол'),
+    Question('bathrooms', "Санузлы (смесители, унитаз):", CHECK, ('Убрали ✅', 'НЕ убрали ❌'), 'Санузлы'),
+    Question('kitchen', "Кухня (плита, столешницы, посуда, раковина, фасады):", CHECK, ('Убрали ✅', 'НЕ убрали ❌'),
+             'Кухня'),
+    Question('trash', "Мусор:", CHECK, ('Вынесли ✅', 'НЕ вынесли ❌'), 'Мусор'),
+    Question('mirror', "Зеркала:", CHECK, ('Помыли ✅', 'НЕ помыли ❌'), 'Зеркала'),
+    Question('cleaner_rating', "Оцените работу клинера от 1 до 10:", CHOICE, RATINGS, row_width=1),
+    Question('manager_rating', "Оцените работу менеджера от 1 до 10:", CHOICE, RATINGS, row_width=1),
+    Question('recommendation_rating', "Готовы ли вы рекомендовать нас от 1 до 10?", CHOICE, RATINGS, row_width=1),
+    Question('suggestions', "Есть ли замечания или предложения? Напишите их ниже или нажмите 'Нет':", TEXT,
+             (('Нет', ''),)),
+)
+
+# Вопрос, от ответа на который зависит дальнейший набор вопросов
+BRANCH_KEY = 'cleaning_type'
+
+SESSION_EXPIRED_TEXT = "Сессия чек-листа устарела. Начните заново: /start"
+STALE_BUTTON_TEXT = "Этот вопрос уже пройден"
+STALE_ROSTER_TEXT = "Этого варианта уже нет в списке, выберите другой"
+
+
+def build_markup(question):
+    if question.kind == CHECK:
+        markup = types.ReplyKeyboardMarkup(row_width=question.row_width, one_time_keyboard=True)
+        markup.add(*[types.KeyboardButton(label) for label in question.options])
+    elif question.options:
+        markup = types.InlineKeyboardMarkup(row_width=question.row_width)
+        markup.add(*[types.InlineKeyboardButton(label, callback_data=f'{question.key}:{value}')
+                     for label, value in question.options])
+    else:
+        return None
+    # Клавиатура сериализуется один раз: telebot передает строку в API как есть
+    return markup.to_json()
+
+
+# Диспетчер чек-листа. Ответы копятся в sessions (начиная с первого вопроса),
+# текущий вопрос и выбранный тип уборки - в step_states. По завершении
+# собранные ответы передаются в on_complete(message, answers), который
+# возвращает ответы бота. track(chat_id, message_id) запоминает сообщения
+# клиента в чек-листе, чтобы удалить их вместе с вопросами. on_start(message)
+# проверяет, можно ли начать чек-лист: возвращает ответы бота вместо первого
+# вопроса (отказ) или None. rosters - списки для вопросов ROSTER по ключу вопроса
+class Checklist:
+    def __init__(self, sessions, step_states, on_complete, track=None, on_start=None, rosters=None,
+                 questions=QUESTIONS, branch_key=BRANCH_KEY):
+        self.sessions = sessions
+        self.step_states = step_states
+        self.on_complete = on_complete
+        self.on_start = on_start or (lambda message: None)
+        self.track = track or (lambda chat_id, message_id: None)
+        self.rosters = rosters or {}
+        self.questions = questions
+        self.by_key = {question.key: question for question in questions}
+        self.markups = {question.key: build_markup(question) for question in questions}
+        self.choices = {question.key: {str(value): value for _, value in question.options}
+                        for question in questions if question.kind in (TEXT, CHOICE)}
+        self.remove_markup = types.ReplyKeyboardRemove().to_json()
+
+        # Следующий вопрос для каждой ветки: ветка None - пока тип уборки не выбран
+        branches = [None] + [value for _, value in self.by_key[branch_key].options]
+        self.branch_key = branch_key
+        self.next_question = {}
+        for branch in branches:
+            flow = self.flow(branch)
+            self.next_question[branch] = dict(zip((question.key for question in flow), flow[1:]))
+
+    # Подпись варианта ответа, например 'g' -> "Генеральная"
+    def option_label(self, key, value):
+        for label, option in self.by_key[key].options:
+            if option == value:
+                return label
+        return value
+
+    # Вопросы, которые задаются для данного типа уборки
+    def flow(self, branch):
+        return [question for question in self.questions if question.only_for is None or branch in question.only_for]
+
+    def handles(self, callback_data):
+        key = callback_data.partition(':')[0]
+        return key in self.choices or key in self.rosters
+
+    # Начало чек-листа по команде /start
+    def start(self, message):
+        refusal = self.on_start(message)
+        if refusal is not None:
+            return refusal
+        self.track(message.chat.id, message.message_id)
+        return self.ask(message.chat.id, self.questions[0], None)
+
+    def ask(self, chat_id, question, branch):
+        self.step_states.set(chat_id, question.key, branch)
+        if question.kind == ROSTER:
+            markup = self.rosters[question.key].markup()
+        else:
+            markup = self.markups[question.key]
+        return [Reply(chat_id, question.text, markup, track=True)]
+
+    def expired(self, chat_id):
+        return [Reply(chat_id, SESSION_EXPIRED_TEXT, self.remove_markup)]
+
+    # Сохранение ответа и переход к следующему вопросу ветки
+    def answer(self, message, question, value, branch):
+        chat_id = message.chat.id
+        next_question = self.next_question[branch].get(question.key)
+        if question is self.questions[0]:
+            # Первый ответ открывает новую сессию (предыдущая отбрасывается)
+            self.sessions.start(chat_id, **{question.key: value})
+        elif next_question is None:
+            self.step_states.delete(chat_id)
+            answers = self.sessions.finish(chat_id)
+            if answers is None:
+                return self.expired(chat_id)
+            answers[question.key] = value
+            return self.on_complete(message, answers)
+        elif not self.sessions.update(chat_id, **{question.key: value}):
+            self.step_states.delete(chat_id)
+            return self.expired(chat_id)
+
+        if question.key == self.branch_key:
+            branch = value
+            next_question = self.next_question[branch][question.key]
+        return self.ask(chat_id, next_question, branch)
+
+    # Текстовый ответ на текущий вопрос
+    def process_message(self, message):
+        state = self.step_states.get(message.chat.id)
+        if state is None:
+            return []
+        self.track(message.chat.id, message.message_id)
+        key, args = state
+        question = self.by_key.get(key)
+        if question is None:
+            # Шаг сохранен прежней версией бота
+            self.step_states.delete(message.chat.id)
+            return self.expired(message.chat.id)
+        if question.kind in (CHOICE, ROSTER):
+            # Ждем нажатия кнопки
+            return []
+
+        text = message.text
+        if question.kind == CHECK:
+            value = 1 if text == question.options[0] else 0
+        else:
+            value = next((value for label, value in question.options if text.lower() == label.lower()), text)
+        with metrics.STEP_SECONDS.time(key):
+            return self.answer(message, question, value, args[0] if args else None)
+
+    # Нажатие инлайн-кнопки "<ключ вопроса>:<вариант>".
+    # Возвращает текст предупреждения (если кнопка устарела) и ответы бота
+    def process_callback(self, call):
+        key, _, choice = call.data.partition(':')
+        state = self.step_states.get(call.message.chat.id)
+        if state is None:
+            return SESSION_EXPIRED_TEXT, []
+        step, args = state
+        if step != key:
+            return STALE_BUTTON_TEXT, []
+        if key in self.rosters:
+            roster = self.rosters[key]
+            action, _, page = choice.partition(':')
+            if action == 'page':
+                # Листание: новая страница той же клавиатуры в том же сообщении
+                return None, [EditMarkup(call.message.chat.id, call.message.message_id, roster.markup(int(page)))]
+            if action == '-':
+                return None, []
+            value = roster.choice(choice)
+            if value is None:
+                return STALE_ROSTER_TEXT, []
+        elif choice in self.choices[key]:
+            value = self.choices[key][choice]
+        else:
+            return STALE_BUTTON_TEXT, []
+        with metrics.STEP_SECONDS.time(key):
+            return None, self.answer(call.message, self.by_key[key], value, args[0] if args else None)
@@ -0,0 +1,114 @@
+from telebot import types
+
+# Список клинеров (таблица cleaners).
+# Администратор добавляет и удаляет клинеров командами /add_cleaner и /remove_cleaner.
+# Удаленный клинер только скрывается из выбора: его отзывы и статистика остаются.
+# Каждое изменение увеличивает версию списка (cleaners.version), поэтому
+# клавиатура выбора клинера собирается один раз на версию и страницу и общая
+# для всех клиентов. Версия проверяется одним запросом по индексу, так что
+# изменения, сделанные в другом воркере, тоже подхватываются.
+
+PAGE_SIZE = 8
+
+
+def normalize_name(name):
+    return ' '.join(name.split())
+
+
+# Поиск клинера по имени без учета регистра: (id, имя, активен) или None
+def find(conn, name):
+    name = normalize_name(name).casefold()
+    for row in conn.execute('SELECT id, name, active FROM cleaners'):
+        if row[1].casefold() == name:
+            return row
+    return None
+
+
+def next_version(conn):
+    return conn.execute('SELECT COALESCE(MAX(version), 0) + 1 FROM cleaners').fetchone()[0]
+
+
+# Задачи записи (выполняются в потоке-писателе БД). Возвращают текст ответа администратору
+def add(conn, name):
+    name = normalize_name(name)
+    row = find(conn, name)
+    if row and row[2]:
+        return f"Клинер {row[1]} уже есть в списке"
+    if row:
+        conn.execute('UPDATE cleaners SET active = 1, version = ? WHERE id = ?', (next_version(conn), row[0]))
+        return f"Клинер {row[1]} снова в списке"
+    conn.execute('INSERT INTO cleaners (name, active, version) VALUES (?, 1, ?)', (name, next_version(conn)))
+    return f"Клинер {name} добавлен"
+
+
+def remove(conn, name):
+    row = find(conn, name)
+    if not row or not row[2]:
+        return f"Клинера {normalize_name(name)} нет в списке"
+    if conn.execute('SELECT COUNT(*) FROM cleaners WHERE active = 1').fetchone()[0] == 1:
+        return "Нельзя удалить последнего клинера: клиентам не из кого будет выбрать"
+    conn.execute('UPDATE cleaners SET active = 0, version = ? WHERE id = ?', (next_version(conn), row[0]))
+    return f"Клинер {row[1]} удален из списка выбора"
+
+
+# Снимок списка одной версии: имена всех клинеров (для отчетов по старым отзывам),
+# активные клинеры по алфавиту и уже собранные страницы клавиатуры
+class Snapshot:
+    def __init__(self, version, rows):
+        self.version = version
+        self.names = {cleaner_id: name for cleaner_id, name, _ in rows}
+        self.active = [(cleaner_id, name) for cleaner_id, name, active in rows if active]
+        self.active_ids = {cleaner_id for cleaner_id, _ in self.active}
+        self.pages = {}  # номер страницы -> клавиатура (JSON)
+
+
+# Вопрос чек-листа с выбором клинера (вид ROSTER в checklist.py).
+# callback_data: "<key>:<id клинера>", листание - "<key>:page:<номер>"
+class Roster:
+    def __init__(self, db, key='cleaner_id', page_size=PAGE_SIZE, row_width=2):
+        self.db = db
+        self.key = key
+        self.page_size = page_size
+        self.row_width = row_width
+        self._snapshot = Snapshot(None, [])
+
+    def snapshot(self):
+        version = self.db.query_one('SELECT COALESCE(MAX(version), 0) FROM cleaners')[0]
+        snapshot = self._snapshot
+        if snapshot.version != version:
+            rows = self.db.query_all('SELECT id, name, active FROM cleaners ORDER BY name COLLATE NOCASE, id')
+            snapshot = self._snapshot = Snapshot(version, rows)
+        return snapshot
+
+    # Клавиатура страницы page (номер приводится к существующим страницам)
+    def markup(self, page=0):
+        snapshot = self.snapshot()
+        pages = max(1, -(-len(snapshot.active) // self.page_size))
+        page = min(max(page, 0), pages - 1)
+        markup = snapshot.pages.get(page)
+        if markup is None:
+            markup = snapshot.pages[page] = self._build(snapshot, page, pages)
+        return markup
+
+    def _build(self, snapshot, page, pages):
+        markup = types.InlineKeyboardMarkup(row_width=self.row_width)
+        start = page * self.page_size
+        markup.add(*[types.InlineKeyboardButton(name, callback_data=f'{self.key}:{cleaner_id}')
+                     for cleaner_id, name in snapshot.active[start:start + self.page_size]])
+        if pages > 1:
+            markup.row(
+                types.InlineKeyboardButton('◀️', callback_data=f'{self.key}:page:{(page - 1) % pages}'),
+                types.InlineKeyboardButton(f'{page + 1}/{pages}', callback_data=f'{self.key}:-'),
+                types.InlineKeyboardButton('▶️', callback_data=f'{self.key}:page:{(page + 1) % pages}'),
+            )
+        return markup.to_json()
+
+    # id клинера из callback_data или None, если клинер уже удален из списка
+    def choice(self, value):
+        if not value.isdigit():
+            return None
+        cleaner_id = int(value)
+        return cleaner_id if cleaner_id in self.snapshot().active_ids else None
+
+    def name(self, cleaner_id):
+        return self.snapshot().names.get(cleaner_id, str(cleaner_id))
@@ -0,0 +1,90 @@
+import hashlib
+import string
+import time
+from datetime import datetime, timedelta
+
+# Купоны на скидку.
+# Код купона - это порядковый номер выдачи, пропущенный через секретную
+# перестановку (сеть Фейстеля с ключом из secrets) пространства всех
+# 6-буквенных кодов. Перестановка взаимно однозначна, поэтому разные номера
+# всегда дают разные коды: при выдаче не нужны повторные попытки и проверки
+# в БД, а по виду кода нельзя угадать соседние купоны.
+
+ALPHABET = string.ascii_uppercase
+CODE_LENGTH = 6
+SPACE = len(ALPHABET) ** CODE_LENGTH  # 308 915 776 кодов
+HALF_BITS = 15  # перестановка на 2^30 > SPACE, лишние значения пропускаются (cycle walking)
+HALF_MASK = (1 << HALF_BITS) - 1
+ROUNDS = 4
+
+DEFAULT_TTL = timedelta(days=90)  # Срок действия купона (COUPON_TTL_DAYS в main.py)
+
+
+def _round(key, number, value):
+    digest = hashlib.blake2b(value.to_bytes(2, 'big'), digest_size=4, key=key, person=bytes([number]) * 16).digest()
+    return int.from_bytes(digest, 'big') & HALF_MASK
+
+
+# Ключевая перестановка чисел 0..SPACE-1
+def permute(key, seq):
+    value = seq
+    while True:
+        left, right = value >> HALF_BITS, value & HALF_MASK
+        for number in range(ROUNDS):
+            left, right = right, left ^ _round(key, number, right)
+        value = (left << HALF_BITS) | right
+        if value < SPACE:
+            return value
+
+
+def encode(value):
+    chars = []
+    for _ in range(CODE_LENGTH):
+        value, index = divmod(value, len(ALPHABET))
+        chars.append(ALPHABET[index])
+    return ''.join(reversed(chars))
+
+
+# Выдача купонов. Вызывается в потоке-писателе БД внутри транзакции сохранения отзыва
+class CouponIssuer:
+    def __init__(self, conn, ttl=DEFAULT_TTL):
+        self.ttl = int(ttl.total_seconds())
+        self.key = conn.execute('SELECT key FROM coupon_state WHERE id = 1').fetchone()[0]
+        # Купоны, выданные до появления этой таблицы, были случайными и могут
+        # совпасть с кодом из перестановки - такие номера пропускаем
+        self.legacy_codes = {row[0] for row in conn.execute('SELECT code FROM coupons WHERE seq IS NULL')}
+
+    def issue(self, conn, user_id, issued_at):
+        seq = conn.execute('SELECT next_seq FROM coupon_state WHERE id = 1').fetchone()[0]
+        code = encode(permute(self.key, seq))
+        while code in self.legacy_codes:
+            seq += 1
+            code = encode(permute(self.key, seq))
+        conn.execute('UPDATE coupon_state SET next_seq = ? WHERE id = 1', (seq + 1,))
+        conn.execute('INSERT INTO coupons (seq, code, user_id, issued_at, expires_at) VALUES (?, ?, ?, ?, ?)',
+                     (seq, code, user_id, issued_at, issued_at + self.ttl))
+        return code
+
+
+def format_date(epoch):
+    return datetime.fromtimestamp(epoch).strftime('%d.%m.%Y')
+
+
+# Погашение купона по команде /redeem CODE. Выполняется в потоке-писателе,
+# поэтому проверка и отметка об использовании не могут разойтись
+def redeem(conn, code, redeemed_by):
+    row = conn.execute('''
+        SELECT coupons.id, coupons.expires_at, coupons.redeemed_at, users.name
+        FROM coupons LEFT JOIN users ON users.user_id = coupons.user_id
+        WHERE coupons.code = ?
+    ''', (code,)).fetchone()
+    if row is None:
+        return f"Купон {code} не найден ❌"
+    coupon_id, expires_at, redeemed_at, name = row
+    now = int(time.time())
+    if redeemed_at:
+        return f"Купон {code} уже использован {format_date(redeemed_at)} ❌"
+    if expires_at and expires_at < now:
+        return f"Срок действия купона {code} истек {format_date(expires_at)} ❌"
+    conn.execute('UPDATE coupons SET redeemed_at = ?, redeemed_by = ? WHERE id = ?', (now, redeemed_by, coupon_id))
+    return f"Купон {code} погашен ✅\nКлиент: {name or '—'}"
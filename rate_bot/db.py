@@ -0,0 +1,287 @@
+import logging
+import queue
+import sqlite3
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import Future
+
+from rate_bot import checklist
+from rate_bot import cleaners
+from rate_bot import coupons
+from rate_bot import metrics
+from rate_bot import migrations
+from rate_bot import stats
+
+logger = logging.getLogger(__name__)
+
+# Настройки SQLite: WAL позволяет читать параллельно с записью,
+# synchronous=NORMAL в режиме WAL делает fsync только при checkpoint.
+# auto_vacuum действует только для новой базы (до создания таблиц): существующую
+# переводит в этот режим обслуживание в archive.py, после чего свободные страницы
+# возвращаются постепенно через incremental_vacuum
+PRAGMAS = (
+    'PRAGMA auto_vacuum=INCREMENTAL',
+    'PRAGMA journal_mode=WAL',
+    'PRAGMA synchronous=NORMAL',
+    'PRAGMA busy_timeout=5000',
+    'PRAGMA temp_store=MEMORY',
+    'PRAGMA cache_size=-16000',
+    'PRAGMA mmap_size=134217728',
+)
+
+LAST_CHECK_LOOKUPS = metrics.register(metrics.Counter(
+    'rate_bot_last_check_lookups_total', "Проверки времени последнего чек-листа: из кэша или из БД", ['source']))
+
+# Колонки отзыва: ответы на вопросы чек-листа (ключи QUESTIONS) и поля, которые заполняет бот.
+# Колонку нового вопроса добавляет миграция (migrations.py), иначе бот не запустится (check_schema)
+FEEDBACK_COLUMNS = ('user_id', *(question.key for question in checklist.QUESTIONS), 'cleaner_name', 'date')
+
+
+# Соединение, которое пишет время каждого запроса в метрики (операция и таблица, см. metrics.py)
+class TimedConnection(sqlite3.Connection):
+    def execute(self, sql, parameters=()):
+        with metrics.DB_SECONDS.time(metrics.statement_label(sql)):
+            return super().execute(sql, parameters)
+
+    def executemany(self, sql, parameters):
+        with metrics.DB_SECONDS.time(metrics.statement_label(sql)):
+            return super().executemany(sql, parameters)
+
+
+# Слой доступа к базе данных бота (таблицы users и feedback).
+# Чтение идет через отдельное соединение в каждом потоке. Все записи
+# выполняет один поток-писатель: он забирает из очереди все накопившиеся
+# задачи и фиксирует их одной транзакцией, поэтому при одновременных
+# отправках чек-листов на несколько клиентов приходится один fsync.
+class Database:
+    def __init__(self, path, batch_size=200, latency_window=1000, last_check_cache_size=10000, last_check_ttl=300,
+                 coupon_ttl=coupons.DEFAULT_TTL):
+        self.path = path
+        self.coupon_ttl = coupon_ttl
+        self.batch_size = batch_size
+        self.last_check_cache_size = last_check_cache_size
+        self.last_check_ttl = last_check_ttl
+        self._last_checks = OrderedDict()  # user_id -> (last_check, когда запомнено по time.monotonic())
+        self._last_checks_lock = threading.Lock()
+        self._local = threading.local()
+        self._queue = queue.Queue()
+        self._latencies = deque(maxlen=latency_window)  # время от постановки в очередь до commit, сек.
+        self._stats_lock = threading.Lock()
+        self.writes = 0
+        self.batches = 0
+        self._writer = None
+
+    # Подключение к базе при запуске бота: миграции схемы и поток-писатель.
+    # До вызова start() объект можно создавать и импортировать без обращения к файлу БД.
+    # migrate=False - отдельный файл только для сессий или шагов чек-листа, без таблиц бота
+    def start(self, migrate=True):
+        if self._writer is not None:
+            return
+        self._writer_conn = self._connect(check_same_thread=False)
+        if migrate:
+            migrations.migrate(self._writer_conn)
+            migrations.check_schema(self._writer_conn, FEEDBACK_COLUMNS)
+            self.coupons = coupons.CouponIssuer(self._writer_conn, ttl=self.coupon_ttl)
+        self._writer = threading.Thread(target=self._write_loop, name='db-writer', daemon=True)
+        self._writer.start()
+
+    def _connect(self, check_same_thread=True):
+        conn = sqlite3.connect(self.path, check_same_thread=check_same_thread, isolation_level=None,
+                               factory=TimedConnection)
+        for pragma in PRAGMAS:
+            conn.execute(pragma)
+        return conn
+
+    # Соединение для чтения, свое в каждом потоке
+    def reader(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._local.conn = self._connect()
+        return conn
+
+    def query_one(self, sql, params=()):
+        return self.reader().execute(sql, params).fetchone()
+
+    def query_all(self, sql, params=()):
+        return self.reader().execute(sql, params).fetchall()
+
+    # Постановка задачи записи в очередь. job(conn) выполняется в потоке-писателе
+    # внутри общей транзакции; результат (или исключение) возвращается через Future.
+    # transaction=False - задача выполняется отдельно, вне транзакции, и сама управляет
+    # транзакциями (нужно для ATTACH, VACUUM и checkpoint, см. archive.py)
+    def submit(self, job, transaction=True):
+        future = Future()
+        self._queue.put((job, future, time.perf_counter(), transaction))
+        return future
+
+    def execute(self, sql, params=()):
+        return self.submit(lambda conn: conn.execute(sql, params).rowcount)
+
+    def _write_loop(self):
+        conn = self._writer_conn
+        deferred = None  # Задача вне транзакции, на которой закончился предыдущий пакет
+        while True:
+            batch = [deferred or self._queue.get()]
+            deferred = None
+            if not batch[0][3]:
+                self._run_alone(conn, batch[0])
+                continue
+            while len(batch) < self.batch_size:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if not item[3]:
+                    deferred = item
+                    break
+                batch.append(item)
+
+            results = []
+            try:
+                conn.execute('BEGIN IMMEDIATE')
+                for job, future, _, _ in batch:
+                    # Ошибка одной задачи не должна откатывать остальные задачи пакета
+                    conn.execute('SAVEPOINT job')
+                    try:
+                        results.append((True, job(conn)))
+                        conn.execute('RELEASE job')
+                    except Exception as e:
+                        conn.execute('ROLLBACK TO job')
+                        conn.execute('RELEASE job')
+                        results.append((False, e))
+                conn.execute('COMMIT')
+            except Exception as e:
+                logger.exception(f"Ошибка записи пакета в БД: {e}")
+                if conn.in_transaction:
+                    conn.execute('ROLLBACK')
+                results = [(False, e)] * len(batch)
+
+            self._finish(batch, results)
+
+    def _run_alone(self, conn, item):
+        job, future, _, _ = item
+        try:
+            result = (True, job(conn))
+        except Exception as e:
+            if conn.in_transaction:
+                conn.execute('ROLLBACK')
+            result = (False, e)
+        self._finish([item], [result])
+
+    def _finish(self, batch, results):
+        now = time.perf_counter()
+        with self._stats_lock:
+            self.writes += len(batch)
+            self.batches += 1
+            self._latencies.extend(now - enqueued_at for _, _, enqueued_at, _ in batch)
+        for (_, future, _, _), (ok, value) in zip(batch, results):
+            if ok:
+                future.set_result(value)
+            else:
+                future.set_exception(value)
+
+    # Текущая очередь записи и задержка фиксации (submit -> commit) по последним записям
+    def stats(self):
+        with self._stats_lock:
+            latencies = sorted(self._latencies)
+            writes, batches = self.writes, self.batches
+
+        def percentile(p):
+            if not latencies:
+                return 0.0
+            return latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000
+
+        return {
+            'queue_depth': self._queue.qsize(),
+            'writes': writes,
+            'batches': batches,
+            'avg_batch': writes / batches if batches else 0.0,
+            'submit_p50_ms': percentile(0.50),
+            'submit_p95_ms': percentile(0.95),
+            'submit_p99_ms': percentile(0.99),
+            'submit_max_ms': latencies[-1] * 1000 if latencies else 0.0,
+        }
+
+    # --- Пользователи ---
+
+    # Время последнего чек-листа пользователя (unix-время или None).
+    # Значение кэшируется в памяти: LRU на last_check_cache_size пользователей, не дольше
+    # last_check_ttl секунд (в users пишут и другие воркеры). Запись отзыва сразу
+    # обновляет кэш. cached=False - прочитать из БД
+    def last_check(self, user_id, cached=True):
+        started = time.monotonic()
+        if cached:
+            with self._last_checks_lock:
+                entry = self._last_checks.get(user_id)
+                if entry is not None and started - entry[1] < self.last_check_ttl:
+                    self._last_checks.move_to_end(user_id)
+                    LAST_CHECK_LOOKUPS.inc('cache')
+                    return entry[0]
+        LAST_CHECK_LOOKUPS.inc('db')
+        row = self.query_one('SELECT last_check FROM users WHERE user_id = ?', (user_id,))
+        last_check = row[0] if row else None
+        # Если отзыв был зафиксирован уже после начала чтения, в кэше более свежее значение
+        self._remember_last_check(user_id, last_check, started)
+        return last_check
+
+    def _remember_last_check(self, user_id, last_check, remembered_at):
+        with self._last_checks_lock:
+            entry = self._last_checks.get(user_id)
+            if entry is not None and entry[1] > remembered_at:
+                return
+            self._last_checks[user_id] = (last_check, remembered_at)
+            self._last_checks.move_to_end(user_id)
+            while len(self._last_checks) > self.last_check_cache_size:
+                self._last_checks.popitem(last=False)
+
+    # Сообщение незавершенного чек-листа (удаляется по его завершении, см. outbox.py)
+    def track_message(self, chat_id, message_id):
+        return self.execute('INSERT OR IGNORE INTO checklist_messages (chat_id, message_id) VALUES (?, ?)',
+                            (chat_id, message_id))
+
+    # --- Отзывы ---
+
+    # Выдача купона, сохранение пользователя (имя берется из отзыва), сохранение отзыва
+    # и обновление агрегатов выполняются одной задачей, то есть всегда попадают в одну транзакцию.
+    # Результат задачи - (id отзыва, код купона)
+    def submit_feedback(self, user_id, last_check, feedback):
+        def job(conn):
+            coupon = self.coupons.issue(conn, user_id, last_check)
+            conn.execute('''
+                INSERT INTO users (user_id, name, last_check, coupon) VALUES (?, ?, ?, ?)
+                ON CONFLICT(user_id) DO UPDATE SET
+                    name = excluded.name, last_check = excluded.last_check, coupon = excluded.coupon
+            ''', (user_id, feedback['name'], last_check, coupon))
+            cursor = conn.execute(f'''
+                INSERT INTO feedback ({', '.join(FEEDBACK_COLUMNS)})
+                VALUES ({', '.join('?' * len(FEEDBACK_COLUMNS))})
+            ''', [feedback.get(column) for column in FEEDBACK_COLUMNS])
+            stats.apply_feedback(conn, feedback)
+            return cursor.lastrowid, coupon
+
+        def remember(future):
+            # Кэш обновляется только после фиксации транзакции
+            if future.exception() is None:
+                self._remember_last_check(user_id, last_check, time.monotonic())
+
+        future = self.submit(job)
+        future.add_done_callback(remember)
+        return future
+
+    # --- Купоны ---
+
+    def redeem_coupon(self, code, redeemed_by):
+        return self.submit(lambda conn: coupons.redeem(conn, code, redeemed_by))
+
+    # --- Клинеры ---
+
+    def add_cleaner(self, name):
+        return self.submit(lambda conn: cleaners.add(conn, name))
+
+    def remove_cleaner(self, name):
+        return self.submit(lambda conn: cleaners.remove(conn, name))
+
+    # Пересчет агрегатов cleaner_stats по всем отзывам. Возвращает число учтенных отзывов
+    def rebuild_stats(self):
+        return self.submit(stats.rebuild)
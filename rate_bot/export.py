@@ -0,0 +1,188 @@
+import csv
+import io
+import re
+import time
+import zipfile
+from datetime import datetime
+
+from rate_bot import archive
+
+# Потоковая выгрузка базы данных для команды /get_db.
+# Таблицы читаются курсором порциями по CHUNK_SIZE строк и сразу пишутся
+# в буфер в памяти, без промежуточных датафреймов и временных файлов.
+
+CHUNK_SIZE = 1000
+FORMATS = ('xlsx', 'csv', 'parquet')
+
+
+class ExportError(Exception):
+    pass
+
+
+# Разбор аргументов команды: /get_db [xlsx|csv|parquet] [since=ГГГГ-ММ-ДД|since=last]
+def parse_export_args(text):
+    fmt, since = 'xlsx', None
+    for arg in text.split()[1:]:
+        if arg.lower() in FORMATS:
+            fmt = arg.lower()
+        elif arg.startswith('since='):
+            since = arg[len('since='):]
+            if since != 'last' and not re.fullmatch(r'\d{4}-\d{2}-\d{2}', since):
+                raise ExportError("Укажите дату в формате since=ГГГГ-ММ-ДД или since=last")
+        else:
+            raise ExportError("Использование: /get_db [xlsx|csv|parquet] [since=ГГГГ-ММ-ДД|since=last]")
+    return fmt, since
+
+
+# Чтение результата запроса порциями
+def iter_chunks(cursor):
+    while True:
+        rows = cursor.fetchmany(CHUNK_SIZE)
+        if not rows:
+            break
+        yield rows
+
+
+def iter_rows(cursor):
+    for rows in iter_chunks(cursor):
+        yield from rows
+
+
+# Колонки с датами хранятся как unix-время, в выгрузку они попадают в читаемом виде
+DATE_COLUMNS = ('date', 'last_check')
+
+
+def select_list(conn, table, available=None):
+    columns = [row[1] for row in conn.execute(f'PRAGMA table_info({table})')]
+    return ', '.join('NULL AS ' + column if available is not None and column not in available else
+                     f"datetime({column}, 'unixepoch', 'localtime') AS {column}" if column in DATE_COLUMNS else column
+                     for column in columns)
+
+
+# Запросы для выгрузки: пользователи целиком, отзывы - с учетом since, из рабочей базы
+# и из архивных месяцев (archive.py). Отзывы ограничиваются id, зафиксированным до
+# начала выгрузки, чтобы отметка для since=last не пропускала отзывы, пришедшие во время выгрузки
+def export_queries(conn, since, last_feedback_id):
+    where, params = 'id <= ?', (last_feedback_id,)
+    since_epoch = after_id = None
+    if since == 'last':
+        row = conn.execute("SELECT last_feedback_id FROM export_state WHERE name = 'get_db'").fetchone()
+        after_id = row[0] if row else 0
+        where, params = where + ' AND id > ?', params + (after_id,)
+    elif since:
+        since_epoch = int(datetime.strptime(since, '%Y-%m-%d').timestamp())
+        where, params = where + ' AND date >= ?', params + (since_epoch,)
+
+    # Колонки архивного файла могут отставать от рабочей таблицы: недостающие выгружаются пустыми
+    def feedback_sql(available=None):
+        return f'SELECT {select_list(conn, "feedback", available)} FROM feedback WHERE {where} ORDER BY id'
+
+    feedback = archive.FeedbackCursor(conn.execute(feedback_sql(), params),
+                                      [path for _, path in archive.archived(conn, since_epoch, after_id)],
+                                      feedback_sql, params)
+    return [
+        ('Users', conn.execute(f'SELECT {select_list(conn, "users")} FROM users')),
+        ('Feedback', feedback),
+    ]
+
+
+def column_names(cursor):
+    return [column[0] for column in cursor.description]
+
+
+def write_xlsx(tables, buffer):
+    from openpyxl import Workbook
+
+    # write_only: строки не держатся в памяти целиком, а сразу сериализуются
+    workbook = Workbook(write_only=True)
+    for name, cursor in tables:
+        sheet = workbook.create_sheet(title=name)
+        sheet.append(column_names(cursor))
+        for row in iter_rows(cursor):
+            sheet.append(row)
+    workbook.save(buffer)
+
+
+# CSV не поддерживает несколько листов, поэтому каждая таблица - отдельный файл в zip-архиве
+def write_csv(tables, buffer):
+    with zipfile.ZipFile(buffer, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        for name, cursor in tables:
+            with archive.open(f'{name.lower()}.csv', 'w') as raw:
+                stream = io.TextIOWrapper(raw, encoding='utf-8-sig', newline='')
+                writer = csv.writer(stream)
+                writer.writerow(column_names(cursor))
+                for rows in iter_chunks(cursor):
+                    writer.writerows(rows)
+                stream.flush()
+                stream.detach()
+
+
+# Тип колонки parquet по объявленному типу колонки SQLite
+def parquet_type(pa, declared_type):
+    declared_type = (declared_type or '').upper()
+    if 'INT' in declared_type:
+        return pa.int64()
+    if any(name in declared_type for name in ('REAL', 'FLOA', 'DOUB')):
+        return pa.float64()
+    return pa.string()
+
+
+def write_parquet(tables, buffer, conn):
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ExportError("Для выгрузки в parquet установите пакет pyarrow")
+
+    with zipfile.ZipFile(buffer, 'w', compression=zipfile.ZIP_STORED) as archive:
+        for name, cursor in tables:
+            table_name = name.lower()
+            declared = {row[1]: row[2] for row in conn.execute(f'PRAGMA table_info({table_name})')}
+            columns = column_names(cursor)
+            schema = pa.schema([(column, parquet_type(pa, declared.get(column))) for column in columns])
+            text_columns = [i for i, column in enumerate(columns) if schema.field(column).type == pa.string()]
+            with archive.open(f'{table_name}.parquet', 'w') as raw:
+                with pq.ParquetWriter(raw, schema) as writer:
+                    for rows in iter_chunks(cursor):
+                        values = list(zip(*rows))
+                        for i in text_columns:
+                            values[i] = [None if value is None else str(value) for value in values[i]]
+                        writer.write_batch(pa.record_batch(values, schema=schema))
+
+
+# Выгрузка базы данных в буфер в памяти. Возвращает (имя файла, буфер, id последнего отзыва)
+def export_database(db, fmt='xlsx', since=None):
+    conn = db.reader()
+    # Вся выгрузка читает один снимок рабочей базы: месяц, перенесенный в архив во время
+    # выгрузки, попадет в нее из рабочей таблицы, а не пропадет и не повторится
+    conn.execute('BEGIN')
+    try:
+        last_feedback_id = conn.execute('SELECT MAX(id) FROM feedback').fetchone()[0] or 0
+        last_feedback_id = max(last_feedback_id, conn.execute('SELECT COALESCE(MAX(max_id), 0) FROM archived_months')
+                               .fetchone()[0])
+        tables = export_queries(conn, since, last_feedback_id)
+        buffer = io.BytesIO()
+        if fmt == 'xlsx':
+            write_xlsx(tables, buffer)
+            extension = 'xlsx'
+        elif fmt == 'csv':
+            write_csv(tables, buffer)
+            extension = 'csv.zip'
+        else:
+            write_parquet(tables, buffer, conn)
+            extension = 'parquet.zip'
+    finally:
+        conn.execute('COMMIT')
+    buffer.seek(0)
+
+    suffix = f"_since_{since}" if since else ''
+    file_name = f"checklist_bot_db{suffix}_{datetime.now():%Y%m%d_%H%M}.{extension}"
+    return file_name, buffer, last_feedback_id
+
+
+# Запоминаем, до какого отзыва выгрузка дошла, для следующего /get_db since=last
+def mark_exported(db, last_feedback_id):
+    return db.execute('''
+        INSERT INTO export_state (name, last_feedback_id, exported_at) VALUES ('get_db', ?, ?)
+        ON CONFLICT(name) DO UPDATE SET last_feedback_id = excluded.last_feedback_id, exported_at = excluded.exported_at
+    ''', (last_feedback_id, int(time.time())))
@@ -0,0 +1,396 @@
+import telebot
+import os
+import time
+from datetime import timedelta
+from dotenv import load_dotenv
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from rate_bot.checklist import CHECK, Checklist, Cleanup, EditMarkup, Reply
+from rate_bot.cleaners import Roster
+from rate_bot.db import FEEDBACK_COLUMNS, Database
+from rate_bot.outbox import Outbox
+from rate_bot import archive
+from rate_bot import export
+from rate_bot import metrics
+from rate_bot import reports
+from rate_bot import stats
+from rate_bot.sessions import SessionStore
+from rate_bot.steps import create_step_storage
+from rate_bot import workers
+import argparse
+
+# Модуль бота: обработчики команд и чек-листа.
+# Импорт модуля только создает объекты и регистрирует обработчики: база данных,
+# хранилища сессий и шагов, лог-файл и потоки отправки подключаются в setup(),
+# а бот запускается через run() (python -m rate_bot или python main.py)
+
+# Получаем логгер для использования в коде
+logger = logging.getLogger(__name__)
+
+# Настройка логирования (при запуске бота)
+def configure_logging():
+    logging.basicConfig(
+        level=logging.INFO,  # Уровень логирования (DEBUG, INFO, WARNING, ERROR, CRITICAL)
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',  # Формат записи
+        handlers=[
+            logging.FileHandler("checklist_bot.log"),  # Запись логов в файл
+            logging.StreamHandler()  # Вывод логов на консоль
+        ]
+    )
+
+# Загружаем user_id из файла .env
+load_dotenv()
+ADMIN_USER_ID = os.getenv('ADMIN_USER_ID')
+
+# Создаем экземпляр бота
+TOKEN = os.getenv('YOUR_BOT_TOKEN')
+bot = telebot.TeleBot(TOKEN)
+
+# Сессии чек-листа: ответы клиента хранятся на сервере до завершения чек-листа.
+# Если шаг чек-листа переживает перезапуск (STEP_STORAGE sqlite или redis), ответы тоже
+# хранятся в SQLite (SESSION_DB, по умолчанию в основной базе), иначе - только в памяти
+SESSION_TTL = int(os.getenv('SESSION_TTL', 3600))
+
+# Состояние следующего шага чек-листа хранится вне процесса (SQLite или Redis),
+# поэтому незавершенные чек-листы переживают перезапуск и доступны всем воркерам
+DB_PATH = 'checklist_bot.db'
+
+# Хранилища сессий и шагов создаются в setup()
+sessions = None
+step_states = None
+
+# Срок действия выдаваемых купонов
+COUPON_TTL = timedelta(days=int(os.getenv('COUPON_TTL_DAYS', 90)))
+
+# База данных: чтение - свое соединение в каждом потоке, запись - через один
+# поток-писатель с пакетной фиксацией транзакций (подключается в setup())
+db = Database(DB_PATH, coupon_ttl=COUPON_TTL)
+
+# Исходящие сообщения отправляются отдельным потоком через очередь в БД с учетом
+# лимитов Telegram. ADMIN_DIGEST_MINUTES > 0 включает сводку отчетов администратору
+outbox = Outbox(db, lambda chat_id, text, markup: bot.send_message(chat_id, text, reply_markup=markup),
+                bot.delete_messages,
+                send_photo=lambda chat_id, photo, caption: bot.send_photo(chat_id, photo, caption=caption),
+                global_rate=float(os.getenv('OUTBOX_GLOBAL_RATE', 30)),
+                chat_rate=float(os.getenv('OUTBOX_CHAT_RATE', 1)),
+                digest_interval=int(os.getenv('ADMIN_DIGEST_MINUTES', 0)) * 60)
+
+# Сводки администратору за прошедший день и неделю с графиком (reports.py), считаются в фоне
+# по новым отзывам. SUMMARY_REPORTS - какие сводки присылать (по умолчанию day,week; пусто - выключены),
+# SUMMARY_HOUR - с какого часа присылать сводку за вчера и за прошлую неделю (по умолчанию 9)
+reports_scheduler = reports.Scheduler(
+    db, outbox, ADMIN_USER_ID,
+    kinds=tuple(kind.strip() for kind in os.getenv('SUMMARY_REPORTS', 'day,week').split(',') if kind.strip()),
+    hour=int(os.getenv('SUMMARY_HOUR', 9)))
+
+# Обслуживание базы (archive.py) раз в MAINTENANCE_MINUTES минут (по умолчанию 60): отзывы старше
+# ARCHIVE_AFTER_DAYS дней (по умолчанию 365, 0 - не архивировать) целыми месяцами переносятся
+# в файлы каталога ARCHIVE_DIR, затем освобождается место в файле базы и сбрасывается WAL
+archiver = archive.Archiver(db, directory=os.getenv('ARCHIVE_DIR', 'archive'),
+                            after_days=int(os.getenv('ARCHIVE_AFTER_DAYS', 365)),
+                            interval=int(os.getenv('MAINTENANCE_MINUTES', 60)) * 60)
+
+# Метрики: время обработчиков, запросов к Telegram API и SQLite (см. metrics.py).
+# METRICS_PORT включает HTTP-эндпоинт /metrics для Prometheus (на METRICS_HOST, по умолчанию локально)
+METRICS_PORT = int(os.getenv('METRICS_PORT', 0))
+METRICS_HOST = os.getenv('METRICS_HOST', '127.0.0.1')
+
+# Показатели сессий, очереди отправки и записи в БД. Регистрируются в setup(): диспетчер
+# не подключает базу и хранилища, и его /metrics отдает только метрики запросов к API
+def register_gauges():
+    metrics.register(metrics.Gauge('rate_bot_sessions_active', "Незавершенные чек-листы в памяти",
+                                   fn=lambda: len(sessions)))
+    metrics.register(metrics.Gauge('rate_bot_outbox_pending', "Сообщения в очереди отправки",
+                                   fn=lambda: outbox.pending()))
+    metrics.register(metrics.Gauge('rate_bot_db_queue_depth', "Задачи в очереди записи БД",
+                                   fn=lambda: db.stats()['queue_depth']))
+
+# Воркеры слушают следующие порты: METRICS_PORT + 1 + номер шарда
+def start_metrics_server(offset=0):
+    if METRICS_PORT:
+        metrics.serve(METRICS_PORT + offset, METRICS_HOST)
+
+# Отправка ответов, подготовленных шагами чек-листа
+def send_replies(replies):
+    for reply in replies:
+        if isinstance(reply, Cleanup):
+            outbox.put_cleanup(reply.chat_id)
+        elif isinstance(reply, EditMarkup):
+            # Ответ на нажатие кнопки листания - сразу, без очереди
+            bot.edit_message_reply_markup(reply.chat_id, reply.message_id, reply_markup=reply.markup)
+        else:
+            outbox.put(reply.chat_id, reply.text, reply.markup, reply.digest, reply.track)
+
+# Обработчик команды /start
+@bot.message_handler(commands=['start'])
+@metrics.timed('start')
+def start_handler(message):
+    send_replies(checklist.start(message))
+
+# Выгрузки базы данных выполняются в отдельном потоке, чтобы не занимать обработчики сообщений
+export_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='export')
+
+# Подготовка и отправка выгрузки администратору (выполняется в export_executor)
+@metrics.timed('export')
+def send_export(user_id, fmt, since):
+    try:
+        file_name, buffer, last_feedback_id = export.export_database(db, fmt, since)
+        bot.send_document(user_id, buffer, visible_file_name=file_name)
+        export.mark_exported(db, last_feedback_id)
+    except Exception as e:
+        bot.send_message(user_id, f"Ошибка при создании или отправке файла: {str(e)}")
+
+# Обработчик команды /get_db, доступный только администратору
+# Использование: /get_db [xlsx|csv|parquet] [since=ГГГГ-ММ-ДД|since=last]
+@bot.message_handler(commands=['get_db'])
+@metrics.timed('get_db')
+def send_database(message):
+    user_id = message.chat.id
+    if str(user_id) == ADMIN_USER_ID:  # Проверка, что команду выполняет администратор
+        try:
+            fmt, since = export.parse_export_args(message.text)
+        except export.ExportError as e:
+            bot.send_message(user_id, str(e))
+            return
+        bot.send_message(user_id, "Готовлю выгрузку, файл придет отдельным сообщением.")
+        export_executor.submit(send_export, user_id, fmt, since)
+    else:
+        bot.send_message(user_id, "У вас нет доступа к этой команде.")
+
+# Обработчик команды /db_stats: очередь записи и задержка сохранения, только для администратора
+@bot.message_handler(commands=['db_stats'])
+@metrics.timed('db_stats')
+def send_db_stats(message):
+    if str(message.chat.id) != ADMIN_USER_ID:
+        bot.send_message(message.chat.id, "У вас нет доступа к этой команде.")
+        return
+    bot.send_message(message.chat.id, format_db_stats())
+
+def format_db_stats():
+    stats = db.stats()
+    return (f"Очередь записи: {stats['queue_depth']}\n"
+            f"Очередь отправки: {outbox.pending()} (отправлено {outbox.sent}, не доставлено {outbox.failed})\n"
+            f"Записей: {stats['writes']}, транзакций: {stats['batches']} (в среднем {stats['avg_batch']:.1f} записей)\n"
+            f"Задержка сохранения: p50 {stats['submit_p50_ms']:.1f} мс, p95 {stats['submit_p95_ms']:.1f} мс, "
+            f"макс. {stats['submit_max_ms']:.1f} мс\n"
+            f"{archiver.describe()}")
+
+# Обработчик команды /health: сводка метрик, только для администратора
+@bot.message_handler(commands=['health'])
+@metrics.timed('health')
+def send_health(message):
+    if str(message.chat.id) != ADMIN_USER_ID:
+        bot.send_message(message.chat.id, "У вас нет доступа к этой команде.")
+        return
+    bot.send_message(message.chat.id, format_health())
+
+def format_health():
+    stats = db.stats()
+    return metrics.health_report([
+        f"Незавершенных чек-листов: {len(sessions)}",
+        f"Очередь записи: {stats['queue_depth']}, очередь отправки: {outbox.pending()}",
+    ])
+
+# Обработчик команды /stats [клинер] [период]: статистика по готовым агрегатам, только для администратора
+@bot.message_handler(commands=['stats'])
+@metrics.timed('stats')
+def send_stats(message):
+    if str(message.chat.id) != ADMIN_USER_ID:
+        bot.send_message(message.chat.id, "У вас нет доступа к этой команде.")
+        return
+    bot.send_message(message.chat.id, stats.stats_report(db, message.text))
+
+# Обработчик команды /rebuild_stats: пересчет агрегатов по всем отзывам, только для администратора
+@bot.message_handler(commands=['rebuild_stats'])
+@metrics.timed('rebuild_stats')
+def rebuild_stats(message):
+    if str(message.chat.id) != ADMIN_USER_ID:
+        bot.send_message(message.chat.id, "У вас нет доступа к этой команде.")
+        return
+    reviews = db.rebuild_stats().result()
+    bot.send_message(message.chat.id, f"Статистика пересчитана, учтено отзывов: {reviews}")
+
+# Обработчик команды /redeem CODE: погашение купона клиента, только для администратора
+@bot.message_handler(commands=['redeem'])
+@metrics.timed('redeem')
+def redeem_coupon(message):
+    if str(message.chat.id) != ADMIN_USER_ID:
+        bot.send_message(message.chat.id, "У вас нет доступа к этой команде.")
+        return
+    args = message.text.split()
+    if len(args) != 2:
+        bot.send_message(message.chat.id, "Использование: /redeem КОД")
+        return
+    bot.send_message(message.chat.id, db.redeem_coupon(args[1].upper(), message.chat.id).result())
+
+# Обработчики команд /add_cleaner ИМЯ и /remove_cleaner ИМЯ: список клинеров для выбора
+# в чек-листе, только для администратора. Без имени - показывают текущий список
+@bot.message_handler(commands=['add_cleaner', 'remove_cleaner'])
+@metrics.timed('cleaners')
+def edit_cleaners(message):
+    if str(message.chat.id) != ADMIN_USER_ID:
+        bot.send_message(message.chat.id, "У вас нет доступа к этой команде.")
+        return
+    bot.send_message(message.chat.id, format_cleaners_command(message.text))
+
+def format_cleaners_command(text):
+    command, _, name = text.partition(' ')
+    if not name.strip():
+        active = ', '.join(cleaner for _, cleaner in roster.snapshot().active) or 'пусто'
+        return f"Использование: {command.split('@')[0]} ИМЯ\nСейчас в списке: {active}"
+    if command.startswith('/add_cleaner'):
+        return db.add_cleaner(name).result()
+    return db.remove_cleaner(name).result()
+
+# Повторно пройти чек-лист можно не раньше, чем через COOLDOWN_DAYS дней (по умолчанию 3)
+COOLDOWN = timedelta(days=float(os.getenv('COOLDOWN_DAYS', 3)))
+COOLDOWN_TEXT = "Вы уже проходили чек-лист после последнего клининга 👾"
+
+def in_cooldown(user_id, now, cached=True):
+    last_check = db.last_check(user_id, cached=cached)
+    return last_check is not None and now - last_check < COOLDOWN.total_seconds()
+
+# Проверка при /start (on_start чек-листа): по кэшу, без обращения к БД для недавно
+# проходивших чек-лист, чтобы не задавать вопросы, ответы на которые не сохранятся
+def check_cooldown(message):
+    if in_cooldown(message.chat.id, int(time.time())):
+        return [Reply(message.chat.id, COOLDOWN_TEXT)]
+    return None
+
+# Финализация фидбека: on_complete чек-листа, answers - ответы по ключам вопросов (колонкам feedback)
+def finalize_feedback(message, answers):
+    user_id = message.chat.id
+    name = answers['name']
+    cleaning_type = answers['cleaning_type']
+
+    # Даты хранятся как unix-время (см. migrations.py)
+    now = int(time.time())
+
+    # Повторная проверка по БД: кэш при /start мог не знать о чек-листе, завершенном другим воркером
+    if in_cooldown(user_id, now, cached=False):
+        return [Reply(message.chat.id, COOLDOWN_TEXT)]
+
+    # Выдаем новый купон, сохраняем пользователя и фидбек (одной транзакцией)
+    feedback = {column: answers.get(column) for column in FEEDBACK_COLUMNS}
+    # Имя клинера сохраняется и в самом отзыве: выгрузка читается без справочника
+    feedback.update(user_id=user_id, date=now, cleaner_name=roster.name(answers['cleaner_id']))
+    _, coupon = db.submit_feedback(user_id, now, feedback).result()
+
+    # Вопросы и ответы чек-листа удаляются, остается благодарность с купоном
+    replies = [Cleanup(user_id)]
+
+    replies.append(Reply(message.chat.id, f"Спасибо, {name}! Мы собираем эти данные, чтобы улучшить работу нашего клининга! В благодарность мы предлагаем вам купон на скидку 10% при следующем обращении! Ваш купон: {coupon}"))
+
+    # Пункты чек-листа - только те, что задавались для этого типа уборки
+    checks = '\n'.join(f"    {question.label}: {'✅' if answers.get(question.key) else '❌'}"
+                       for question in checklist.flow(cleaning_type) if question.kind == CHECK)
+    report = f"""
+    ___Новый отчет___
+
+    Клиент: {name} 👤
+    Купон: {coupon} 💸
+
+    Клиннер: {feedback['cleaner_name']} 👨🏼‍🚀
+    Адрес: {answers['address']} 📍
+    Тип уборки: {checklist.option_label('cleaning_type', cleaning_type)}
+
+{checks}
+
+    Оценка клинера: {answers['cleaner_rating']}
+    Оценка менеджера: {answers['manager_rating']}
+    Готовность рекомендовать: {answers['recommendation_rating']}
+
+    Замечания/Предложения: {answers['suggestions']}
+    """
+    replies.append(Reply(ADMIN_USER_ID, report, digest=True))
+    return replies
+
+# Список клинеров для выбора в чек-листе (таблица cleaners, клавиатура кэшируется по версии списка)
+roster = Roster(db)
+
+# Чек-лист: вопросы, кнопки и ветвление описаны в checklist.py (создается в setup())
+checklist = None
+
+# Обработчик нажатий инлайн-кнопок чек-листа
+@bot.callback_query_handler(func=lambda call: checklist.handles(call.data))
+@metrics.timed('callback')
+def handle_callback(call):
+    alert, replies = checklist.process_callback(call)
+    bot.answer_callback_query(call.id, alert, show_alert=alert is not None)
+    send_replies(replies)
+
+# Обработчик текстовых ответов: продолжает чек-лист с сохраненного шага.
+# Регистрируется последним, чтобы команды (/start, /get_db) обрабатывались раньше
+@bot.message_handler(func=lambda message: step_states.get(message.chat.id) is not None)
+@metrics.timed('next_step')
+def handle_next_step(message):
+    send_replies(checklist.process_message(message))
+
+# База для сессий и шагов чек-листа: основная или отдельный файл (SESSION_DB, STEP_DB)
+# со своим потоком-писателем. Отдельные файлы открываются один раз и без миграций бота
+store_databases = {}
+
+def store_database(path):
+    if path is None:
+        return None
+    if path == DB_PATH:
+        return db
+    if path not in store_databases:
+        store_databases[path] = Database(path)
+        store_databases[path].start(migrate=False)
+    return store_databases[path]
+
+# Подключение к базе и хранилищам при запуске бота (один раз, до обработки обновлений).
+# shared_sessions - хранить сессии в SQLite, чтобы их видели все воркеры
+def setup(shared_sessions=False):
+    global sessions, step_states, checklist
+    if checklist is not None:
+        return
+    metrics.instrument_telegram()
+    db.start()
+    step_storage = os.getenv('STEP_STORAGE', 'sqlite')
+    # Сохраненный шаг без сохраненных ответов после перезапуска дал бы "Сессия чек-листа устарела"
+    persistent = shared_sessions or step_storage != 'local'
+    session_db = os.getenv('SESSION_DB') or (DB_PATH if persistent else None)
+    sessions = SessionStore(ttl=SESSION_TTL, db=store_database(session_db))
+    step_states = create_step_storage(step_storage, store_database(os.getenv('STEP_DB', DB_PATH)),
+                                      redis_url=os.getenv('REDIS_URL'), ttl=SESSION_TTL)
+    checklist = Checklist(sessions, step_states, on_complete=finalize_feedback, track=db.track_message,
+                          on_start=check_cooldown, rosters={roster.key: roster})
+    register_gauges()
+
+# Запуск бота: polling, диспетчер или воркер
+def run(argv=None):
+    parser = argparse.ArgumentParser(description="Чек-лист бот Rate Cleaning")
+    parser.add_argument('mode', nargs='?', default='polling', choices=['polling', 'dispatcher', 'worker'],
+                        help="polling - один процесс; dispatcher + worker - несколько процессов с шардированием по chat_id")
+    parser.add_argument('--workers', type=int, default=int(os.getenv('WORKERS', 1)), help="Общее число воркеров")
+    parser.add_argument('--shard', type=int, default=0, help="Номер шарда этого воркера (от 0 до workers-1)")
+    args = parser.parse_args(argv)
+
+    configure_logging()
+    if args.mode == 'dispatcher':
+        # Диспетчер только раскладывает обновления по очереди и не работает с чек-листом;
+        # setup() он не вызывает, поэтому вызовы getUpdates учитываются в метриках здесь
+        metrics.instrument_telegram()
+        start_metrics_server()
+        workers.run_dispatcher(TOKEN, workers.UpdateQueue(os.getenv('QUEUE_DB', DB_PATH)), args.workers)
+        return
+
+    # Воркеры должны видеть ответы друг друга после перезапуска, поэтому сессии храним в SQLite
+    setup(shared_sessions=args.mode == 'worker')
+    if args.mode == 'polling':
+        start_metrics_server()
+        outbox.start()
+        reports_scheduler.start()
+        archiver.start()
+        bot.polling(none_stop=True)
+    else:
+        start_metrics_server(1 + args.shard)
+        queue = workers.UpdateQueue(os.getenv('QUEUE_DB', DB_PATH))
+        outbox.start(args.shard, args.workers)
+        if args.shard == 0:
+            # Сводки и обслуживание базы - в одном воркере
+            reports_scheduler.start()
+            archiver.start()
+        workers.run_worker(bot, queue, args.shard)
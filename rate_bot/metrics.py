@@ -0,0 +1,311 @@
+import functools
+import inspect
+import logging
+import re
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# Метрики бота в формате Prometheus.
+# Время обработчиков и шагов чек-листа, запросов к Telegram API и запросов
+# к SQLite пишется в гистограммы с разбивкой по имени, ошибки - в счетчики.
+# Метрики отдаются по HTTP (serve, переменная METRICS_PORT) и кратко - по команде /health.
+
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+STARTED_AT = time.time()
+
+
+def format_labels(names, values):
+    if not names:
+        return ''
+    return '{' + ','.join(f'{name}="{value}"' for name, value in zip(names, values)) + '}'
+
+
+class Counter:
+    kind = 'counter'
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, *labels):
+        return self._values.get(labels, 0)
+
+    def samples(self):
+        with self._lock:
+            values = dict(self._values)
+        for labels, value in sorted(values.items()):
+            yield self.name, format_labels(self.labels, labels), value
+
+
+# Значение задается явно (inc/dec) или вычисляется при выгрузке функцией fn
+class Gauge(Counter):
+    kind = 'gauge'
+
+    def __init__(self, name, documentation, labels=(), fn=None):
+        super().__init__(name, documentation, labels)
+        self.fn = fn
+
+    def dec(self, *labels, amount=1):
+        self.inc(*labels, amount=-amount)
+
+    def samples(self):
+        if self.fn is not None:
+            yield self.name, '', self.fn()
+        else:
+            yield from super().samples()
+
+
+class Histogram:
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self._series = {}  # метки -> [счетчики по корзинам..., +Inf, сумма]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * (len(self.buckets) + 2)
+            series[index] += 1
+            series[-1] += value
+
+    @contextmanager
+    def time(self, *labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, *labels)
+
+    # Число наблюдений и оценка квантиля по границам корзин
+    def count(self, *labels):
+        series = self._series.get(labels)
+        return sum(series[:-1]) if series else 0
+
+    def quantile(self, q, *labels):
+        with self._lock:
+            series = list(self._series.get(labels) or ())
+        total = sum(series[:-1])
+        if not total:
+            return 0.0
+        seen = 0
+        for bound, count in zip(self.buckets + (float('inf'),), series[:-1]):
+            seen += count
+            if seen >= total * q:
+                return bound
+        return float('inf')
+
+    def series(self):
+        with self._lock:
+            return {labels: list(series) for labels, series in self._series.items()}
+
+    def samples(self):
+        for labels, series in sorted(self.series().items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), series[:-1]):
+                cumulative += count
+                yield (f'{self.name}_bucket', format_labels(self.labels + ('le',), labels + (bound,)), cumulative)
+            yield f'{self.name}_sum', format_labels(self.labels, labels), series[-1]
+            yield f'{self.name}_count', format_labels(self.labels, labels), cumulative
+
+
+REGISTRY = []
+
+
+def register(metric):
+    REGISTRY.append(metric)
+    return metric
+
+
+def render():
+    lines = []
+    for metric in REGISTRY:
+        lines.append(f'# HELP {metric.name} {metric.documentation}')
+        lines.append(f'# TYPE {metric.name} {metric.kind}')
+        for name, labels, value in metric.samples():
+            lines.append(f'{name}{labels} {value}')
+    return '\n'.join(lines) + '\n'
+
+
+HANDLER_SECONDS = register(Histogram('rate_bot_handler_seconds', "Время обработчиков команд и кнопок", ['handler']))
+HANDLER_ERRORS = register(Counter('rate_bot_handler_errors_total', "Ошибки обработчиков", ['handler']))
+HANDLERS_IN_FLIGHT = register(Gauge('rate_bot_handlers_in_flight', "Обработчики, выполняющиеся сейчас"))
+STEP_SECONDS = register(Histogram('rate_bot_step_seconds', "Время шагов чек-листа по вопросам", ['step']))
+API_SECONDS = register(Histogram('rate_bot_telegram_api_seconds', "Время запросов к Telegram Bot API", ['method']))
+API_ERRORS = register(Counter('rate_bot_telegram_api_errors_total', "Ошибки запросов к Telegram Bot API", ['method']))
+DB_SECONDS = register(Histogram('rate_bot_sqlite_seconds', "Время выполнения запросов SQLite", ['statement']))
+
+
+# Декоратор для обработчиков (обычных и асинхронных): время, ошибки, число выполняющихся
+def timed(name):
+    def decorator(func):
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                HANDLERS_IN_FLIGHT.inc()
+                started = time.perf_counter()
+                try:
+                    return await func(*args, **kwargs)
+                except Exception:
+                    HANDLER_ERRORS.inc(name)
+                    raise
+                finally:
+                    HANDLER_SECONDS.observe(time.perf_counter() - started, name)
+                    HANDLERS_IN_FLIGHT.dec()
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            HANDLERS_IN_FLIGHT.inc()
+            started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            except Exception:
+                HANDLER_ERRORS.inc(name)
+                raise
+            finally:
+                HANDLER_SECONDS.observe(time.perf_counter() - started, name)
+                HANDLERS_IN_FLIGHT.dec()
+        return wrapper
+    return decorator
+
+
+# Метка запроса SQLite: операция и таблица, например "INSERT outbox"
+@functools.lru_cache(maxsize=256)
+def statement_label(sql):
+    match = re.match(r'\s*(\w+)', sql)
+    operation = match.group(1).upper() if match else 'SQL'
+    table = re.search(r'\b(?:FROM|INTO|UPDATE|TABLE|ON)\s+(?:IF\s+NOT\s+EXISTS\s+)?(\w+)', sql, re.IGNORECASE)
+    return f'{operation} {table.group(1)}' if table and operation != 'PRAGMA' else operation
+
+
+# Время запросов к Telegram API в синхронном режиме. Оборачивает CUSTOM_REQUEST_SENDER
+# (или сессию requests, которую telebot использует по умолчанию)
+def instrument_telegram():
+    from telebot import apihelper
+
+    previous = apihelper.CUSTOM_REQUEST_SENDER
+
+    def send(method, url, **kwargs):
+        api_method = url.rsplit('/', 1)[-1]
+        started = time.perf_counter()
+        try:
+            if previous is not None:
+                response = previous(method, url, **kwargs)
+            else:
+                response = apihelper._get_req_session().request(method, url, **kwargs)
+        except Exception:
+            API_ERRORS.inc(api_method)
+            raise
+        finally:
+            API_SECONDS.observe(time.perf_counter() - started, api_method)
+        if response.status_code != 200:
+            API_ERRORS.inc(api_method)
+        return response
+
+    apihelper.CUSTOM_REQUEST_SENDER = send
+
+
+# То же для AsyncTeleBot: все запросы проходят через asyncio_helper._process_request
+def instrument_async_telegram():
+    from telebot import asyncio_helper
+
+    process_request = asyncio_helper._process_request
+
+    async def timed_request(token, url, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return await process_request(token, url, *args, **kwargs)
+        except Exception:
+            API_ERRORS.inc(url)
+            raise
+        finally:
+            API_SECONDS.observe(time.perf_counter() - started, url)
+
+    asyncio_helper._process_request = timed_request
+
+
+# HTTP-сервер с метриками для Prometheus (GET /metrics)
+def serve(port, host='127.0.0.1'):
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path != '/metrics':
+                self.send_error(404)
+                return
+            payload = render().encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+            self.send_header('Content-Length', str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name='metrics', daemon=True).start()
+    logger.info(f"Метрики доступны на http://{host}:{port}/metrics")
+    return server
+
+
+# Квантили оцениваются по границам корзин, поэтому выводятся как "не больше"
+def format_ms(seconds):
+    return '>10 с' if seconds == float('inf') else f'≤{seconds * 1000:g} мс'
+
+
+# Сводка гистограммы по самым медленным (по p95) сериям для /health
+def slowest(histogram, limit=3, skip=()):
+    rows = []
+    for labels, series in histogram.series().items():
+        if labels and labels[0] in skip:
+            continue
+        rows.append((histogram.quantile(0.95, *labels), sum(series[:-1]), labels[0] if labels else ''))
+    rows.sort(reverse=True)
+    return [f"  {name}: p95 {format_ms(p95)}, {count} раз" for p95, count, name in rows[:limit]]
+
+
+def total_count(histogram):
+    return sum(sum(series[:-1]) for series in histogram.series().values())
+
+
+def total(counter):
+    return sum(value for _, _, value in counter.samples())
+
+
+# Краткая сводка для команды /health; extra - дополнительные строки (очереди, сессии)
+def health_report(extra=()):
+    uptime = int(time.time() - STARTED_AT)
+    lines = [
+        f"🩺 Работает {uptime // 3600} ч {uptime % 3600 // 60} мин",
+        f"Обработчики: {total_count(HANDLER_SECONDS)} вызовов, ошибок {total(HANDLER_ERRORS)}, "
+        f"выполняется {total(HANDLERS_IN_FLIGHT)}",
+        *slowest(HANDLER_SECONDS),
+        f"Telegram API: {total_count(API_SECONDS)} запросов, ошибок {total(API_ERRORS)}",
+        # getUpdates - длинный опрос, его время - это ожидание обновлений
+        *slowest(API_SECONDS, skip=('getUpdates',)),
+        f"SQLite: {total_count(DB_SECONDS)} запросов, фиксация пакета p95 {format_ms(DB_SECONDS.quantile(0.95, 'COMMIT'))}",
+        *slowest(DB_SECONDS, skip=('COMMIT', 'SAVEPOINT', 'RELEASE')),
+        *extra,
+    ]
+    return '\n'.join(lines)
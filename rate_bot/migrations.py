@@ -0,0 +1,284 @@
+import logging
+import secrets
+
+from rate_bot import archive
+from rate_bot import reports
+from rate_bot import stats
+
+logger = logging.getLogger(__name__)
+
+# Версионные миграции схемы базы данных.
+# Номер примененной версии хранится в PRAGMA user_version. При запуске
+# выполняются все миграции с большим номером, каждая в своей транзакции,
+# поэтому существующий checklist_bot.db обновляется на месте.
+
+
+# 1. Исходные таблицы (для старых баз ничего не меняет - таблицы уже есть)
+def create_tables(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS users (
+            user_id INTEGER PRIMARY KEY,
+            name TEXT,
+            last_check DATE,
+            coupon TEXT
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS feedback (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER,
+            name TEXT,
+            cleaner_name TEXT,
+            address TEXT,
+            cleaning_type TEXT,
+            surfaces INTEGER,
+            floor INTEGER,
+            bathrooms INTEGER,
+            kitchen INTEGER,
+            trash INTEGER,
+            mirror INTEGER,
+            windows INTEGER,
+            cobweb INTEGER,
+            balcony INTEGER,
+            cleaner_rating INTEGER,
+            manager_rating INTEGER,
+            recommendation_rating INTEGER,
+            suggestions TEXT,
+            date TIMESTAMP
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS export_state (
+            name TEXT PRIMARY KEY,
+            last_feedback_id INTEGER,
+            exported_at TIMESTAMP
+        )
+    ''')
+    conn.execute(stats.SCHEMA)
+
+
+# 2. Даты храним как целые unix-время. Раньше в feedback.date попадал datetime
+# ("2024-08-01 12:00:00.123456"), а в users.last_check - строка без микросекунд.
+# Модификатор 'utc' переводит локальное время, в котором писались даты, в UTC
+def dates_to_epoch(conn):
+    for table, column in (('feedback', 'date'), ('users', 'last_check'), ('export_state', 'exported_at')):
+        conn.execute(f'''
+            UPDATE {table} SET {column} = CAST(strftime('%s', {column}, 'utc') AS INTEGER)
+            WHERE typeof({column}) = 'text'
+        ''')
+
+
+# 3. Индексы для выборок по клиенту, периоду, клинеру, типу уборки и купону
+def add_lookup_indexes(conn):
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_feedback_user_id ON feedback (user_id)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_feedback_date ON feedback (date)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_feedback_cleaner_date ON feedback (cleaner_name, date)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_feedback_type_date ON feedback (cleaning_type, date)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_users_coupon ON users (coupon)')
+
+
+# 4. Агрегаты появились позже таблицы отзывов. Для существующей базы их заполняет
+# миграция 8: агрегаты теперь считаются по feedback.cleaner_id, которого здесь еще нет
+def fill_cleaner_stats(conn):
+    pass
+
+
+# 5. Купоны: отдельная таблица с уникальным индексом по коду и состояние генератора
+# (секретный ключ перестановки и следующий номер). Ранее выданные купоны переносятся из users.coupon
+def create_coupons(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS coupons (
+            id INTEGER PRIMARY KEY,
+            seq INTEGER,
+            code TEXT NOT NULL,
+            user_id INTEGER,
+            issued_at INTEGER,
+            expires_at INTEGER,
+            redeemed_at INTEGER,
+            redeemed_by INTEGER
+        )
+    ''')
+    conn.execute('CREATE UNIQUE INDEX IF NOT EXISTS idx_coupons_code ON coupons (code)')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS coupon_state (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            key BLOB NOT NULL,
+            next_seq INTEGER NOT NULL
+        )
+    ''')
+    conn.execute('INSERT OR IGNORE INTO coupon_state (id, key, next_seq) VALUES (1, ?, 0)', (secrets.token_bytes(16),))
+    conn.execute('''
+        INSERT OR IGNORE INTO coupons (code, user_id, issued_at)
+        SELECT coupon, user_id, last_check FROM users WHERE coupon IS NOT NULL
+    ''')
+
+
+# 6. Очередь исходящих сообщений (outbox.py)
+def create_outbox(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS outbox (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            chat_id INTEGER NOT NULL,
+            text TEXT NOT NULL,
+            markup TEXT,
+            digest INTEGER NOT NULL DEFAULT 0,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            next_attempt_at REAL NOT NULL DEFAULT 0,
+            created_at INTEGER
+        )
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_outbox_digest ON outbox (digest, id)')
+
+
+# 7. id сообщений незавершенного чек-листа (удаляются по его завершении) и вид строки очереди
+def track_checklist_messages(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS checklist_messages (
+            chat_id INTEGER,
+            message_id INTEGER,
+            PRIMARY KEY (chat_id, message_id)
+        ) WITHOUT ROWID
+    ''')
+    conn.execute("ALTER TABLE outbox ADD COLUMN kind TEXT NOT NULL DEFAULT 'message'")
+
+
+# 8. Клинеры в отдельной таблице (cleaners.py), отзывы ссылаются на них по id.
+# Прежние кнопки сохраняли в cleaner_name латинский код - заменяем его на имя.
+# Остальные имена из отзывов заводятся скрытыми клинерами: в выбор они не попадают,
+# пока администратор не добавит их через /add_cleaner. Агрегаты пересчитываются по id
+LEGACY_CLEANERS = (('Ilya', "Илья"), ('Alexey', "Алексей"))
+
+
+def create_cleaners(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS cleaners (
+            id INTEGER PRIMARY KEY,
+            name TEXT NOT NULL,
+            active INTEGER NOT NULL DEFAULT 1,
+            version INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+    conn.execute('CREATE UNIQUE INDEX IF NOT EXISTS idx_cleaners_name ON cleaners (name)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_cleaners_version ON cleaners (version)')
+    conn.execute('ALTER TABLE feedback ADD COLUMN cleaner_id INTEGER REFERENCES cleaners (id)')
+
+    for code, name in LEGACY_CLEANERS:
+        cleaner_id = conn.execute('INSERT INTO cleaners (name, active, version) VALUES (?, 1, 1)', (name,)).lastrowid
+        conn.execute('UPDATE feedback SET cleaner_id = ?, cleaner_name = ? WHERE cleaner_name IN (?, ?)',
+                     (cleaner_id, name, code, name))
+    conn.execute('''
+        INSERT OR IGNORE INTO cleaners (name, active, version)
+        SELECT DISTINCT cleaner_name, 0, 1 FROM feedback WHERE cleaner_id IS NULL AND cleaner_name IS NOT NULL
+    ''')
+    conn.execute('''
+        UPDATE feedback SET cleaner_id = (SELECT id FROM cleaners WHERE cleaners.name = feedback.cleaner_name)
+        WHERE cleaner_id IS NULL AND cleaner_name IS NOT NULL
+    ''')
+
+    # Выборки по клинеру - по целочисленному id вместо строки
+    conn.execute('DROP INDEX IF EXISTS idx_feedback_cleaner_date')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_feedback_cleaner_id_date ON feedback (cleaner_id, date)')
+    conn.execute('DROP TABLE IF EXISTS cleaner_stats')
+    conn.execute(stats.SCHEMA)
+    stats.rebuild(conn, archived=False)
+
+
+# 9. Итоги по дням и неделям для сводок администратору и отметки об отправленных сводках (reports.py).
+# Заполняет их планировщик сводок по мере появления отзывов, начиная с самого первого
+def create_summaries(conn):
+    conn.execute(reports.SCHEMA)
+    conn.execute(reports.SENT_SCHEMA)
+
+
+# 10. Список месяцев, перенесенных в архивные файлы, и вклад их отзывов в агрегаты (archive.py)
+def create_archive(conn):
+    conn.execute(archive.SCHEMA)
+    conn.execute(stats.ARCHIVE_SCHEMA)
+
+
+# 11. Изображения в очереди исходящих сообщений (графики сводок, вид строки photo)
+def add_outbox_photo(conn):
+    conn.execute('ALTER TABLE outbox ADD COLUMN photo BLOB')
+
+
+# Колонки вопроса, добавленного в QUESTIONS (checklist.py) после создания базы: ответ в feedback,
+# а для вопроса "выполнено/нет" - метрики в таблицах агрегатов. Миграция нового вопроса
+# вызывает add_question_columns(conn, 'ключ', 'INTEGER'). В новой базе таблицы агрегатов
+# уже созданы с колонками текущих вопросов, поэтому добавляются только недостающие
+AGGREGATE_TABLES = ('cleaner_stats', 'archive_stats', 'summaries')
+
+
+def table_columns(conn, table):
+    return {row[1] for row in conn.execute(f'PRAGMA table_info({table})')}
+
+
+def add_question_columns(conn, key, declared):
+    if key not in table_columns(conn, 'feedback'):
+        conn.execute(f'ALTER TABLE feedback ADD COLUMN {key} {declared}')
+    if key not in stats.CHECK_FIELDS:
+        return
+    for table in AGGREGATE_TABLES:
+        existing = table_columns(conn, table)
+        for column in (f'{key}_pass', f'{key}_answers'):
+            if column not in existing:
+                conn.execute(f'ALTER TABLE {table} ADD COLUMN {column} INTEGER NOT NULL DEFAULT 0')
+
+
+MIGRATIONS = (
+    (1, create_tables),
+    (2, dates_to_epoch),
+    (3, add_lookup_indexes),
+    (4, fill_cleaner_stats),
+    (5, create_coupons),
+    (6, create_outbox),
+    (7, track_checklist_messages),
+    (8, create_cleaners),
+    (9, create_summaries),
+    (10, create_archive),
+    (11, add_outbox_photo),
+)
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def current_version(conn):
+    return conn.execute('PRAGMA user_version').fetchone()[0]
+
+
+# Применение недостающих миграций. conn должен быть в режиме autocommit (isolation_level=None).
+# Версия перечитывается под блокировкой записи: воркеры, запущенные одновременно,
+# не применяют одну миграцию дважды
+def migrate(conn, target=LATEST_VERSION):
+    version = current_version(conn)
+    for number, migration in MIGRATIONS:
+        if version < number <= target:
+            conn.execute('BEGIN IMMEDIATE')
+            version = current_version(conn)
+            if version >= number:
+                # Миграцию уже применил другой процесс
+                conn.execute('COMMIT')
+                continue
+            logger.info(f"Миграция БД до версии {number}: {migration.__name__}")
+            try:
+                migration(conn)
+                conn.execute(f'PRAGMA user_version = {number}')
+                conn.execute('COMMIT')
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+            version = number
+    return version
+
+
+# Проверка после миграций: в feedback есть колонки всех вопросов чек-листа, а в таблицах
+# агрегатов - колонки всех метрик. Без миграции нового вопроса бот не запускается
+def check_schema(conn, feedback_columns):
+    required = {'feedback': feedback_columns}
+    for table in AGGREGATE_TABLES:
+        required[table] = tuple(stats.METRICS)
+    for table, columns in required.items():
+        existing = table_columns(conn, table)
+        missing = [column for column in columns if column not in existing]
+        if missing:
+            raise RuntimeError(f"В таблице {table} нет колонок {', '.join(missing)}: добавьте миграцию "
+                               f"с add_question_columns для новых вопросов чек-листа (migrations.py)")
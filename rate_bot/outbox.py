@@ -0,0 +1,316 @@
+import logging
+import threading
+import time
+
+from telebot import apihelper
+
+logger = logging.getLogger(__name__)
+
+# Очередь исходящих сообщений.
+# Ответы бота сначала записываются в таблицу outbox (через поток-писатель БД),
+# а отправляет их отдельный поток с ограничением скорости: общий лимит Telegram
+# (~30 сообщений в секунду) и лимит на один чат. При ошибке 429 отправка
+# приостанавливается на retry_after, при сетевых ошибках повторяется с растущей
+# паузой. Неотправленные сообщения (в том числе отчеты администратору) остаются
+# в базе и уходят после перезапуска.
+# В режиме сводки отчеты администратору копятся и отправляются одним
+# сообщением раз в digest_interval секунд.
+# Виды строк очереди (kind): message - обычное сообщение; tracked - вопрос
+# чек-листа, id отправленного сообщения запоминается в checklist_messages;
+# cleanup - удаление запомненных сообщений чата пакетами deleteMessages;
+# photo - изображение (PNG в колонке photo) с подписью в text.
+
+MAX_MESSAGE_LENGTH = 4096
+DELETE_CHUNK = 100  # Лимит deleteMessages
+MAX_ATTEMPTS = 10
+BACKOFF_BASE = 1
+BACKOFF_MAX = 300
+
+
+# Ведро токенов: rate токенов в секунду, не больше capacity подряд
+class TokenBucket:
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+
+    # Забирает токен и возвращает 0 или возвращает, сколько секунд ждать до следующего токена
+    def take(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0
+        return (1 - self.tokens) / self.rate
+
+    def full(self, now):
+        return self.tokens + (now - self.updated_at) * self.rate >= self.capacity
+
+
+# Разбиение длинного сообщения (например, отчета с длинным адресом или замечаниями)
+# на части не длиннее лимита Telegram: по строкам, а слишком длинная строка - по лимиту.
+# Иначе Telegram ответит 400 и сообщение будет удалено из очереди без доставки
+def split_message(text, limit=MAX_MESSAGE_LENGTH):
+    if len(text) <= limit:
+        return [text]
+    parts, current = [], ''
+    for line in text.splitlines(keepends=True):
+        if current and len(current) + len(line) > limit:
+            parts.append(current)
+            current = ''
+        while len(line) > limit:
+            parts.append(line[:limit])
+            line = line[limit:]
+        current += line
+    parts.append(current)
+    # Telegram не принимает сообщения из одних пробелов
+    return [part for part in parts if part.strip()]
+
+
+# Разбиение сводки на сообщения не длиннее лимита Telegram. Отчет, который не помещается
+# в одно сообщение вместе с заголовком, режется на части (split_message), а не обрезается
+def split_digest(texts, header):
+    messages, current = [], header
+    for text in texts:
+        for part in split_message(text.strip(), MAX_MESSAGE_LENGTH - len(header) - 2):
+            part = part.rstrip()
+            if len(current) + len(part) + 2 > MAX_MESSAGE_LENGTH:
+                messages.append(current)
+                current = header
+            current = f"{current}\n\n{part}"
+    messages.append(current)
+    return messages
+
+
+class Outbox:
+    def __init__(self, db, send, delete, send_photo=None, global_rate=30, chat_rate=1, chat_burst=3,
+                 digest_interval=0, poll_interval=1):
+        self.db = db
+        self.send = send  # send(chat_id, text, markup) -> Message
+        self.delete = delete  # delete(chat_id, message_ids)
+        self.send_photo = send_photo  # send_photo(chat_id, photo, caption)
+        # Общий лимит без запаса: сообщения идут равномерно, не больше global_rate за любую секунду
+        self.global_rate = global_rate
+        self.global_bucket = TokenBucket(global_rate, 1)
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.chat_buckets = {}
+        self.digest_interval = digest_interval
+        self.poll_interval = poll_interval
+        self.paused_until = 0
+        self.sent = 0
+        self.failed = 0
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._shard, self._shards = 0, 1
+
+    # Постановка сообщения в очередь. digest=True - отчет, который в режиме сводки
+    # объединяется с другими, track=True - сообщение чек-листа, которое удалится
+    # при его завершении. Возвращает Future записи в БД
+    def put(self, chat_id, text, markup=None, digest=False, track=False):
+        digest = int(bool(digest and self.digest_interval))
+        # Отчеты для сводки режутся при ее сборке (split_digest), остальные сообщения - здесь
+        texts = [text] if digest else split_message(text)
+        return self._insert(chat_id, texts, markup, digest, 'tracked' if track else 'message')
+
+    # Удаление сообщений чек-листа после всех ранее поставленных в очередь сообщений чата
+    def put_cleanup(self, chat_id):
+        return self._insert(chat_id, [''], None, 0, 'cleanup')
+
+    # Изображение (bytes) с подписью, уходит после ранее поставленных сообщений чата
+    def put_photo(self, chat_id, photo, caption=''):
+        return self._insert(chat_id, [caption], None, 0, 'photo', photo)
+
+    # Части одного сообщения записываются одной задачей и уходят подряд; клавиатура - у последней
+    def _insert(self, chat_id, texts, markup, digest, kind, photo=None):
+        now = int(time.time())
+        rows = [(chat_id, text, markup if i == len(texts) - 1 else None, digest, kind, photo, now)
+                for i, text in enumerate(texts)]
+        future = self.db.submit(lambda conn: conn.executemany(
+            'INSERT INTO outbox (chat_id, text, markup, digest, kind, photo, created_at) VALUES (?, ?, ?, ?, ?, ?, ?)',
+            rows).rowcount)
+        future.add_done_callback(lambda _: self._wakeup.set())
+        return future
+
+    def pending(self):
+        return self.db.query_one('SELECT COUNT(*) FROM outbox')[0]
+
+    # Запуск потока отправки. В режиме нескольких воркеров каждый отправляет
+    # сообщения чатов своего шарда, а общий лимит делится между воркерами
+    def start(self, shard=0, shards=1):
+        self._shard, self._shards = shard, shards
+        self.global_bucket = TokenBucket(self.global_rate / shards, 1)
+        self._thread = threading.Thread(target=self._send_loop, name='outbox', daemon=True)
+        self._thread.start()
+
+    # Условие "чат своего шарда" для SQL: остаток, как в Python (и в диспетчере обновлений),
+    # неотрицательный и для отрицательных id групп
+    def _own_sql(self):
+        return '((chat_id % ?) + ?) % ? = ?', (self._shards, self._shards, self._shards, self._shard)
+
+    def _send_loop(self):
+        next_digest_at = time.time() + self.digest_interval
+        if not self.digest_interval:
+            # Отчеты, накопленные до отключения режима сводки
+            self._flush_digest()
+        while True:
+            if self.digest_interval and time.time() >= next_digest_at:
+                try:
+                    self._flush_digest()
+                except Exception as e:
+                    logger.exception(f"Ошибка подготовки сводки: {e}")
+                next_digest_at = time.time() + self.digest_interval
+            self._wakeup.clear()
+            try:
+                delay = self._send_pending()
+            except Exception as e:
+                logger.exception(f"Ошибка отправки сообщений из очереди: {e}")
+                delay = self.poll_interval
+            if delay > 0:
+                self._wakeup.wait(min(delay, self.poll_interval))
+
+    # Один проход по очереди. Сообщения одного чата уходят строго по порядку:
+    # если первое ждет повтора или лимита, остальные сообщения чата тоже ждут.
+    # Из каждого чата своего шарда читаются только первые chat_burst сообщений (больше
+    # за проход не уйдет по лимиту чата), поэтому длинная очередь одного чата
+    # (например, отчетов администратору) не заслоняет сообщения других чатов.
+    # Возвращает, через сколько секунд стоит повторить проход: 0 - только если
+    # в этом проходе что-то отправлено
+    def _send_pending(self):
+        own, params = self._own_sql()
+        rows = self.db.query_all(f'''
+            SELECT id, chat_id, text, markup, kind, photo, attempts, next_attempt_at FROM (
+                SELECT *, ROW_NUMBER() OVER (PARTITION BY chat_id ORDER BY id) AS position FROM outbox
+                WHERE digest = 0 AND {own}
+            )
+            WHERE position <= ? ORDER BY id LIMIT 500
+        ''', (*params, max(1, int(self.chat_burst))))
+        blocked = set()
+        delay = self.poll_interval
+        done = []
+        sent = 0
+        for row_id, chat_id, text, markup, kind, photo, attempts, next_attempt_at in rows:
+            if chat_id in blocked:
+                continue
+            now = time.time()
+            if now < self.paused_until:
+                delay = min(delay, self.paused_until - now)
+                break
+            if next_attempt_at > now:
+                blocked.add(chat_id)
+                delay = min(delay, next_attempt_at - now)
+                continue
+
+            bucket = self.chat_buckets.get(chat_id)
+            if bucket is None:
+                bucket = self.chat_buckets[chat_id] = TokenBucket(self.chat_rate, self.chat_burst)
+            wait = bucket.take(time.monotonic())
+            if wait:
+                blocked.add(chat_id)
+                delay = min(delay, wait)
+                continue
+            wait = self.global_bucket.take(time.monotonic())
+            while wait:
+                time.sleep(wait)
+                wait = self.global_bucket.take(time.monotonic())
+
+            try:
+                if kind == 'cleanup':
+                    # id отправленных в этом проходе сообщений должны быть уже записаны
+                    for future in done:
+                        future.result()
+                    statements = self._delete_tracked(chat_id)
+                else:
+                    statements = self._deliver(chat_id, text, markup, kind, photo)
+            except Exception as e:
+                blocked.add(chat_id)
+                retry = self._retry_delay(e, attempts)
+                if retry is None:
+                    logger.error(f"Сообщение для {chat_id} не отправлено и удалено из очереди: {e}")
+                    self.failed += 1
+                    statements = [('DELETE FROM outbox WHERE id = ?', (row_id,))]
+                    if kind == 'cleanup':
+                        # Например, сообщения старше 48 часов удалить уже нельзя
+                        statements.append(('DELETE FROM checklist_messages WHERE chat_id = ?', (chat_id,)))
+                    done.append(self._commit(statements))
+                else:
+                    logger.warning(f"Сообщение для {chat_id} не отправлено, повтор через {retry:.0f} с: {e}")
+                    done.append(self.db.execute('UPDATE outbox SET attempts = ?, next_attempt_at = ? WHERE id = ?',
+                                                (attempts + 1, now + retry, row_id)))
+                    delay = min(delay, retry)
+                continue
+            self.sent += 1
+            sent += 1
+            done.append(self._commit(statements + [('DELETE FROM outbox WHERE id = ?', (row_id,))]))
+
+        # Ждем фиксации, чтобы следующий проход не отправил эти сообщения повторно
+        for future in done:
+            future.result()
+        if len(self.chat_buckets) > 10000:
+            now = time.monotonic()
+            self.chat_buckets = {chat_id: bucket for chat_id, bucket in self.chat_buckets.items()
+                                 if not bucket.full(now)}
+        return 0 if sent else delay
+
+    # Несколько запросов одной задачей записи (в одной транзакции)
+    def _commit(self, statements):
+        def job(conn):
+            for sql, params in statements:
+                conn.execute(sql, params)
+        return self.db.submit(job)
+
+    # Отправка сообщения. Возвращает запросы, которые выполнятся вместе с удалением строки очереди
+    def _deliver(self, chat_id, text, markup, kind, photo=None):
+        if kind == 'photo':
+            self.send_photo(chat_id, photo, text)
+            return []
+        message = self.send(chat_id, text, markup)
+        if kind != 'tracked':
+            return []
+        return [('INSERT OR IGNORE INTO checklist_messages (chat_id, message_id) VALUES (?, ?)',
+                 (chat_id, message.message_id))]
+
+    # Удаление запомненных сообщений чек-листа: одна-две пакетные операции вместо удаления по одному
+    def _delete_tracked(self, chat_id):
+        message_ids = [row[0] for row in self.db.query_all(
+            'SELECT message_id FROM checklist_messages WHERE chat_id = ? ORDER BY message_id', (chat_id,))]
+        for start in range(0, len(message_ids), DELETE_CHUNK):
+            self.delete(chat_id, message_ids[start:start + DELETE_CHUNK])
+        if not message_ids:
+            return []
+        return [('DELETE FROM checklist_messages WHERE chat_id = ? AND message_id <= ?', (chat_id, message_ids[-1]))]
+
+    # Пауза перед повтором или None, если повторять бессмысленно
+    def _retry_delay(self, error, attempts):
+        if isinstance(error, apihelper.ApiTelegramException):
+            if error.error_code == 429:
+                retry_after = (error.result_json.get('parameters') or {}).get('retry_after', BACKOFF_BASE)
+                self.paused_until = time.time() + retry_after
+                return retry_after
+            if error.error_code < 500:
+                # Чат не найден, бот заблокирован, некорректное сообщение
+                return None
+        if attempts + 1 >= MAX_ATTEMPTS:
+            return None
+        return min(BACKOFF_BASE * 2 ** attempts, BACKOFF_MAX)
+
+    # Объединение накопившихся отчетов в сводку: сводка записывается обычными
+    # сообщениями очереди, а исходные отчеты удаляются в той же транзакции
+    def _flush_digest(self):
+        own, params = self._own_sql()
+        rows = self.db.query_all(f'SELECT id, chat_id, text FROM outbox WHERE digest = 1 AND {own} ORDER BY id', params)
+        if not rows:
+            return
+        by_chat = {}
+        for row_id, chat_id, text in rows:
+            by_chat.setdefault(chat_id, []).append((row_id, text))
+
+        def job(conn):
+            now = int(time.time())
+            for chat_id, reports in by_chat.items():
+                header = f"Сводка отчетов: {len(reports)}"
+                for text in split_digest([text for _, text in reports], header):
+                    conn.execute('INSERT INTO outbox (chat_id, text, created_at) VALUES (?, ?, ?)', (chat_id, text, now))
+                conn.executemany('DELETE FROM outbox WHERE id = ?', [(row_id,) for row_id, _ in reports])
+        self.db.submit(job).result()
@@ -0,0 +1,255 @@
+import io
+import logging
+import threading
+import time
+from datetime import datetime, timedelta
+
+from rate_bot import metrics
+from rate_bot import stats
+
+logger = logging.getLogger(__name__)
+
+# Периодические сводки администратору: итоги за прошедший день и неделю с графиком.
+# Поток-планировщик раз в interval секунд переносит новые отзывы в таблицу summaries
+# (суммы по дням и неделям для каждого клинера, те же метрики, что в cleaner_stats).
+# Читаются только отзывы после отметки - id последнего учтенного отзыва
+# (export_state 'summaries'), поэтому проход стоит столько, сколько новых отзывов,
+# а не вся история. Итоги и отметка меняются одной задачей записи. id отзывов
+# растут в порядке фиксации (вставки идут транзакциями BEGIN IMMEDIATE), так что
+# отзыв с меньшим id не может появиться после прохода.
+# Начиная с hour часов сводка за вчера и за прошлую неделю собирается из summaries
+# и ставится в очередь отправки. Отправленные сводки отмечаются в summary_reports:
+# сводка приходит один раз, даже если планировщик запущен в нескольких процессах.
+# График рисуется в потоке планировщика (нужен пакет matplotlib, без него приходит только текст)
+# и ставится в очередь отправки после текста сводки: приходит следом и повторяется при ошибках.
+
+FOLD_CHUNK = 5000  # Отзывов за одну задачу записи: догоняющий проход не держит поток-писатель надолго
+HISTORY = {'day': 14, 'week': 8}  # Периодов на графике
+
+# Ключ периода - дата его начала (неделя начинается с понедельника), по локальному времени
+PERIODS = {
+    'day': "date(date, 'unixepoch', 'localtime')",
+    'week': "date(date, 'unixepoch', 'localtime', 'weekday 0', '-6 days')",
+}
+
+SCHEMA = f'''
+    CREATE TABLE IF NOT EXISTS summaries (
+        kind TEXT,
+        period TEXT,
+        cleaner_id INTEGER,
+        {', '.join(f'{column} INTEGER NOT NULL DEFAULT 0' for column in stats.METRICS)},
+        PRIMARY KEY (kind, period, cleaner_id)
+    )
+'''
+
+SENT_SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS summary_reports (
+        kind TEXT,
+        period TEXT,
+        sent_at INTEGER,
+        PRIMARY KEY (kind, period)
+    )
+'''
+
+_FOLD = f'''
+    INSERT INTO summaries (kind, period, cleaner_id, {', '.join(stats.METRICS)})
+    SELECT ?, {{period}}, COALESCE(cleaner_id, 0), {', '.join(f'COALESCE({expr}, 0)' for expr, _ in stats.METRICS.values())}
+    FROM feedback
+    WHERE id > ? AND id <= ?
+    GROUP BY 2, 3
+    ON CONFLICT (kind, period, cleaner_id) DO UPDATE SET
+        {', '.join(f'{column} = {column} + excluded.{column}' for column in stats.METRICS)}
+'''
+
+SUMMARY_ROWS = metrics.register(metrics.Counter('rate_bot_summary_rows_total', "Отзывы, учтенные в сводках"))
+SUMMARY_SECONDS = metrics.register(metrics.Histogram(
+    'rate_bot_summary_seconds', "Время этапов подготовки сводок", ['stage']))
+
+
+# Перенос следующей порции новых отзывов в summaries (задача записи).
+# Возвращает число учтенных отзывов: 0 - все отзывы уже учтены
+def fold(conn, limit=FOLD_CHUNK):
+    row = conn.execute("SELECT last_feedback_id FROM export_state WHERE name = 'summaries'").fetchone()
+    low = row[0] if row else 0
+    count, high = conn.execute('SELECT COUNT(*), MAX(id) FROM (SELECT id FROM feedback WHERE id > ? ORDER BY id LIMIT ?)',
+                               (low, limit)).fetchone()
+    if not count:
+        return 0
+    for kind, period_sql in PERIODS.items():
+        conn.execute(_FOLD.format(period=period_sql), (kind, low, high))
+    conn.execute('''
+        INSERT INTO export_state (name, last_feedback_id, exported_at) VALUES ('summaries', ?, ?)
+        ON CONFLICT(name) DO UPDATE SET last_feedback_id = excluded.last_feedback_id, exported_at = excluded.exported_at
+    ''', (high, int(time.time())))
+    return count
+
+
+# Начало периода, в который попадает день day
+def period_start(kind, day):
+    return day - timedelta(days=day.weekday()) if kind == 'week' else day
+
+
+def shift(kind, start, periods):
+    return start + timedelta(days=periods * (7 if kind == 'week' else 1))
+
+
+# Последний завершившийся период на дату today
+def last_complete(kind, today):
+    return shift(kind, period_start(kind, today), -1)
+
+
+def period_title(kind, start):
+    if kind == 'week':
+        return f"неделю {start:%d.%m}–{shift(kind, start, 1) - timedelta(days=1):%d.%m.%Y}"
+    return f"{start:%d.%m.%Y}"
+
+
+# Итоги периода по клинерам: {имя: суммы метрик}
+def load_period(conn, kind, start):
+    cursor = conn.execute('''
+        SELECT summaries.*, COALESCE(cleaners.name, '—') AS cleaner_name
+        FROM summaries LEFT JOIN cleaners ON cleaners.id = summaries.cleaner_id
+        WHERE kind = ? AND period = ?
+    ''', (kind, start.isoformat()))
+    columns = [column[0] for column in cursor.description]
+    by_cleaner = {}
+    for row in cursor:
+        row = dict(zip(columns, row))
+        totals = by_cleaner.setdefault(row['cleaner_name'], dict.fromkeys(stats.METRICS, 0))
+        for column in stats.METRICS:
+            totals[column] += row[column]
+    return by_cleaner
+
+
+# Отзывы и средняя оценка клинера за последние periods периодов (для графика), пропуски - нули
+def load_history(conn, kind, start, periods):
+    first = shift(kind, start, 1 - periods)
+    rows = {period: (reviews, rating_sum) for period, reviews, rating_sum in conn.execute('''
+        SELECT period, SUM(reviews), SUM(cleaner_rating_sum) FROM summaries
+        WHERE kind = ? AND period BETWEEN ? AND ?
+        GROUP BY period
+    ''', (kind, first.isoformat(), start.isoformat()))}
+    history = []
+    for i in range(periods):
+        period = shift(kind, first, i)
+        reviews, rating_sum = rows.get(period.isoformat(), (0, 0))
+        history.append((period, reviews, rating_sum / reviews if reviews else None))
+    return history
+
+
+def sum_totals(by_cleaner):
+    totals = dict.fromkeys(stats.METRICS, 0)
+    for cleaner_totals in by_cleaner.values():
+        for column in stats.METRICS:
+            totals[column] += cleaner_totals[column]
+    return totals
+
+
+# Короткая сводка: общие оценки, слабые пункты чек-листа и строка на клинера. None - отзывов не было
+def format_report(kind, start, by_cleaner, previous):
+    totals = sum_totals(by_cleaner)
+    reviews = totals['reviews']
+    if not reviews:
+        return None
+    nps = (totals['promoters'] - totals['detractors']) * 100 / reviews
+    before = "днем ранее" if kind == 'day' else "неделей ранее"
+    lines = [
+        f"📅 Сводка за {period_title(kind, start)}",
+        f"Отзывов: {reviews} ({before}: {sum_totals(previous)['reviews']})",
+        f"Клинер {totals['cleaner_rating_sum'] / reviews:.1f}, менеджер {totals['manager_rating_sum'] / reviews:.1f}, "
+        f"NPS {nps:.0f}",
+    ]
+    rates = sorted((totals[f'{field}_pass'] / totals[f'{field}_answers'], field)
+                   for field in stats.CHECK_FIELDS if totals[f'{field}_answers'])
+    weak = [f"{stats.CHECK_LABELS[field]} {rate * 100:.0f}%" for rate, field in rates[:3] if rate < 1]
+    if weak:
+        lines.append(f"Слабые пункты: {', '.join(weak)}")
+    for name, cleaner_totals in sorted(by_cleaner.items(), key=lambda item: -item[1]['reviews']):
+        lines.append(f"👨🏼‍🚀 {name}: {cleaner_totals['reviews']}, "
+                     f"оценка {cleaner_totals['cleaner_rating_sum'] / cleaner_totals['reviews']:.1f}")
+    return '\n'.join(lines)
+
+
+# PNG (bytes) с числом отзывов (столбцы) и средней оценкой клинера (линия) или None без matplotlib.
+# Используется Figure без pyplot: у pyplot общее состояние, а рисуем не в главном потоке
+def render_chart(kind, history):
+    try:
+        from matplotlib.figure import Figure
+    except ImportError:
+        return None
+    figure = Figure(figsize=(6, 3), dpi=100)
+    reviews_axes = figure.add_subplot()
+    labels = [f"{period:%d.%m}" for period, _, _ in history]
+    reviews_axes.bar(labels, [reviews for _, reviews, _ in history], color='#9ecae1')
+    reviews_axes.set_ylabel("Отзывы")
+    reviews_axes.tick_params(axis='x', labelrotation=45, labelsize=8)
+    rating_axes = reviews_axes.twinx()
+    rating_axes.plot(labels, [rating for _, _, rating in history], color='#de2d26', marker='o')
+    rating_axes.set_ylim(0, 10.5)
+    rating_axes.set_ylabel("Оценка клинера")
+    figure.suptitle("По дням" if kind == 'day' else "По неделям (с понедельника)", fontsize=10)
+    figure.tight_layout()
+    buffer = io.BytesIO()
+    figure.savefig(buffer, format='png')
+    return buffer.getvalue()
+
+
+class Scheduler:
+    def __init__(self, db, outbox, chat_id, charts=True, kinds=('day', 'week'), hour=9, interval=60):
+        self.db = db
+        self.outbox = outbox
+        self.chat_id = chat_id
+        self.charts = charts
+        self.kinds = kinds
+        self.hour = hour
+        self.interval = interval
+        self._thread = None
+
+    def start(self):
+        if not self.kinds or not self.chat_id or self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._loop, name='reports', daemon=True)
+        self._thread.start()
+
+    def _loop(self):
+        while True:
+            try:
+                self.run_once(datetime.now())
+            except Exception as e:
+                logger.exception(f"Ошибка подготовки сводки: {e}")
+            time.sleep(self.interval)
+
+    # Один проход: учесть новые отзывы и отправить сводки, время которых пришло
+    def run_once(self, now):
+        with SUMMARY_SECONDS.time('fold'):
+            while True:
+                count = self.db.submit(fold).result()
+                if not count:
+                    break
+                SUMMARY_ROWS.inc(amount=count)
+        if now.hour < self.hour:
+            return
+        for kind in self.kinds:
+            self.send_report(kind, last_complete(kind, now.date()))
+
+    # Сводка за период, начинающийся в start. Возвращает True, если она отправлена этим вызовом
+    def send_report(self, kind, start):
+        sent = self.db.query_one('SELECT 1 FROM summary_reports WHERE kind = ? AND period = ?', (kind, start.isoformat()))
+        if sent:
+            return False
+        conn = self.db.reader()
+        with SUMMARY_SECONDS.time('report'):
+            text = format_report(kind, start, load_period(conn, kind, start),
+                                 load_period(conn, kind, shift(kind, start, -1)))
+        # Отметка ставится до постановки в очередь: при сбое между ними сводка не придет дважды
+        marked = self.db.execute('INSERT OR IGNORE INTO summary_reports (kind, period, sent_at) VALUES (?, ?, ?)',
+                                 (kind, start.isoformat(), int(time.time()))).result()
+        if not marked or text is None:
+            return False
+        self.outbox.put(self.chat_id, text)
+        if self.charts:
+            with SUMMARY_SECONDS.time('chart'):
+                chart = render_chart(kind, load_history(conn, kind, start, HISTORY[kind]))
+            if chart is not None:
+                self.outbox.put_photo(self.chat_id, chart, f"Сводка за {period_title(kind, start)}")
+        return True
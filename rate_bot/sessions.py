@@ -0,0 +1,124 @@
+import json
+import threading
+import time
+from collections import OrderedDict
+
+
+# Ожидание фиксации записей, поставленных в очередь под блокировкой
+def wait(writes):
+    for future in writes:
+        future.result()
+
+
+# Хранилище сессий чек-листа.
+# Частичные ответы клиента держим на сервере до завершения чек-листа
+# (кнопки общие для всех клиентов, см. checklist.py).
+# Сессии живут в памяти и вытесняются по TTL; при указании db (запущенный Database)
+# они дублируются в SQLite и переживают перезапуск бота. Запись идет через поток-писатель
+# базы: задания ставятся в очередь под блокировкой (порядок записей одного чата сохраняется),
+# а их фиксации метод ждет уже после нее, чтобы не держать блокировку на время коммита.
+class SessionStore:
+    def __init__(self, ttl=3600, db=None):
+        self.ttl = ttl
+        self._sessions = OrderedDict()  # chat_id -> (data, touched_at)
+        self._lock = threading.Lock()
+        self.db = db
+        if db is not None:
+            db.execute('''
+                CREATE TABLE IF NOT EXISTS checklist_sessions (
+                    chat_id INTEGER PRIMARY KEY,
+                    data TEXT,
+                    touched_at REAL
+                )
+            ''').result()
+
+    # Число сессий в памяти (для метрик)
+    def __len__(self):
+        return len(self._sessions)
+
+    # Создание новой сессии (предыдущая сессия этого чата отбрасывается)
+    def start(self, chat_id, **data):
+        writes = []
+        with self._lock:
+            self._evict_expired(writes)
+            self._store(chat_id, dict(data), writes)
+        wait(writes)
+
+    # Получение данных сессии или None, если сессии нет
+    def get(self, chat_id):
+        writes = []
+        with self._lock:
+            entry = self._load(chat_id, writes)
+            data = None if entry is None else dict(entry[0])
+        wait(writes)
+        return data
+
+    # Сохранение очередных ответов в сессию. Возвращает False, если сессии нет
+    def update(self, chat_id, **data):
+        writes = []
+        with self._lock:
+            entry = self._load(chat_id, writes)
+            if entry is not None:
+                entry[0].update(data)
+                self._store(chat_id, entry[0], writes)
+        wait(writes)
+        return entry is not None
+
+    # Завершение сессии: возвращает собранные ответы и удаляет сессию
+    def finish(self, chat_id):
+        writes = []
+        with self._lock:
+            entry = self._load(chat_id, writes)
+            if entry is not None:
+                self._drop(chat_id, writes)
+        wait(writes)
+        return None if entry is None else entry[0]
+
+    def _store(self, chat_id, data, writes):
+        now = time.monotonic()
+        self._sessions[chat_id] = (data, now)
+        self._sessions.move_to_end(chat_id)
+        if self.db is not None:
+            writes.append(self.db.execute(
+                'INSERT OR REPLACE INTO checklist_sessions (chat_id, data, touched_at) VALUES (?, ?, ?)',
+                (chat_id, json.dumps(data), time.time())))
+
+    def _load(self, chat_id, writes):
+        entry = self._sessions.get(chat_id)
+        if entry is not None:
+            if time.monotonic() - entry[1] > self.ttl:
+                self._drop(chat_id, writes)
+                return None
+            return entry
+        if self.db is None:
+            return None
+
+        # Сессии нет в памяти (например, после перезапуска) - ищем ее в SQLite
+        row = self.db.query_one('SELECT data, touched_at FROM checklist_sessions WHERE chat_id = ?', (chat_id,))
+        if row is None:
+            return None
+        age = time.time() - row[1]
+        if age > self.ttl:
+            self._drop(chat_id, writes)
+            return None
+        entry = (json.loads(row[0]), time.monotonic() - age)
+        self._sessions[chat_id] = entry
+        return entry
+
+    def _drop(self, chat_id, writes):
+        self._sessions.pop(chat_id, None)
+        if self.db is not None:
+            writes.append(self.db.execute('DELETE FROM checklist_sessions WHERE chat_id = ?', (chat_id,)))
+
+    # Сессии упорядочены по времени последнего обращения, поэтому вытеснение
+    # останавливается на первой еще живой сессии
+    def _evict_expired(self, writes):
+        deadline = time.monotonic() - self.ttl
+        while self._sessions:
+            chat_id, entry = next(iter(self._sessions.items()))
+            if entry[1] > deadline:
+                break
+            self._sessions.popitem(last=False)
+        if self.db is not None:
+            writes.append(self.db.execute('DELETE FROM checklist_sessions WHERE touched_at < ?',
+                                          (time.time() - self.ttl,)))
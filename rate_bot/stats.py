@@ -0,0 +1,190 @@
+import re
+from datetime import datetime
+
+from rate_bot import checklist
+from rate_bot import cleaners
+
+# Агрегаты оценок по клинерам и типам уборки.
+# Таблица cleaner_stats обновляется в той же транзакции, что и вставка отзыва,
+# поэтому /stats отвечает по готовым суммам и не сканирует таблицу feedback.
+# Для каждого клинера и типа уборки хранятся строки за все время ('all'),
+# за год ('2026') и за месяц ('2026-09').
+
+# Поля чек-листа, по которым считается доля "выполнено" (вопросы "выполнено/нет" из checklist.py)
+CHECK_FIELDS = tuple(question.key for question in checklist.QUESTIONS if question.kind == checklist.CHECK)
+
+CHECK_LABELS = {question.key: question.label for question in checklist.QUESTIONS if question.kind == checklist.CHECK}
+
+# Метрики: имя колонки агрегата -> (выражение для пересчета из feedback, приращение по одному отзыву)
+METRICS = {
+    'reviews': ('COUNT(*)', lambda f: 1),
+    'cleaner_rating_sum': ('SUM(cleaner_rating)', lambda f: f['cleaner_rating']),
+    'manager_rating_sum': ('SUM(manager_rating)', lambda f: f['manager_rating']),
+    'recommendation_sum': ('SUM(recommendation_rating)', lambda f: f['recommendation_rating']),
+    # NPS: промоутеры 9-10, нейтралы 7-8, критики 1-6
+    'promoters': ('SUM(recommendation_rating >= 9)', lambda f: int(f['recommendation_rating'] >= 9)),
+    'passives': ('SUM(recommendation_rating BETWEEN 7 AND 8)', lambda f: int(7 <= f['recommendation_rating'] <= 8)),
+    'detractors': ('SUM(recommendation_rating <= 6)', lambda f: int(f['recommendation_rating'] <= 6)),
+}
+# Вопрос "выполнено/нет", по ответам на который считается метрика
+METRIC_FIELDS = {}
+for _field in CHECK_FIELDS:
+    # Часть вопросов задается только в генеральной уборке, поэтому считаем и число ответов
+    METRICS[f'{_field}_pass'] = (f'SUM({_field} = 1)', lambda f, field=_field: int(f.get(field) == 1))
+    METRICS[f'{_field}_answers'] = (f'SUM({_field} IS NOT NULL)', lambda f, field=_field: int(f.get(field) is not None))
+    METRIC_FIELDS[f'{_field}_pass'] = METRIC_FIELDS[f'{_field}_answers'] = _field
+del _field
+
+# Периоды, за которые ведутся агрегаты: ключ периода по дате отзыва (unix-время)
+# и SQL-выражение для пересчета. Периоды считаются по локальному времени
+PERIODS = (
+    (lambda date: 'all', "'all'"),
+    (lambda date: datetime.fromtimestamp(date).strftime('%Y'), "strftime('%Y', date, 'unixepoch', 'localtime')"),
+    (lambda date: datetime.fromtimestamp(date).strftime('%Y-%m'), "strftime('%Y-%m', date, 'unixepoch', 'localtime')"),
+)
+
+
+def _schema(table):
+    return f'''
+        CREATE TABLE IF NOT EXISTS {table} (
+            period TEXT,
+            cleaner_id INTEGER,
+            cleaning_type TEXT,
+            {', '.join(f'{column} INTEGER NOT NULL DEFAULT 0' for column in METRICS)},
+            PRIMARY KEY (period, cleaner_id, cleaning_type)
+        )
+    '''
+
+
+SCHEMA = _schema('cleaner_stats')
+# Вклад отзывов, перенесенных в архив (archive.py): пересчет cleaner_stats берет его отсюда
+ARCHIVE_SCHEMA = _schema('archive_stats')
+
+_UPSERT = f'''
+    INSERT INTO cleaner_stats (period, cleaner_id, cleaning_type, {', '.join(METRICS)})
+    VALUES (?, ?, ?, {', '.join('?' * len(METRICS))})
+    ON CONFLICT (period, cleaner_id, cleaning_type) DO UPDATE SET
+        {', '.join(f'{column} = {column} + excluded.{column}' for column in METRICS)}
+'''
+
+
+# Добавление в таблицу агрегатов сумм по отзывам, подходящим под условие where.
+# missing - вопросы, колонок которых еще нет в feedback: их метрики равны нулю
+def _aggregate(table, period_sql, where, missing=()):
+    expressions = ['0' if METRIC_FIELDS.get(column) in missing else f'COALESCE({expr}, 0)'
+                   for column, (expr, _) in METRICS.items()]
+    return f'''
+        INSERT INTO {table} (period, cleaner_id, cleaning_type, {', '.join(METRICS)})
+        SELECT {period_sql}, COALESCE(cleaner_id, 0), cleaning_type, {', '.join(expressions)}
+        FROM feedback
+        WHERE {where}
+        GROUP BY 1, 2, 3
+        ON CONFLICT (period, cleaner_id, cleaning_type) DO UPDATE SET
+            {', '.join(f'{column} = {column} + excluded.{column}' for column in METRICS)}
+    '''
+
+
+# Учет нового отзыва в агрегатах. Вызывается внутри транзакции вставки отзыва
+def apply_feedback(conn, feedback):
+    increments = [metric(feedback) for _, metric in METRICS.values()]
+    conn.executemany(_UPSERT, [
+        (period(feedback['date']), feedback['cleaner_id'], feedback['cleaning_type'], *increments)
+        for period, _ in PERIODS
+    ])
+
+
+# Вопросы чек-листа, колонки которых еще не добавлены в feedback. Так бывает в миграциях:
+# пересчет в миграции 8 выполняется раньше миграции, добавляющей колонку нового вопроса
+def missing_fields(conn):
+    existing = {row[1] for row in conn.execute('PRAGMA table_info(feedback)')}
+    return {field for field in CHECK_FIELDS if field not in existing}
+
+
+# Полный пересчет агрегатов по исходным отзывам и вкладу архива.
+# archived=False - без архива (для миграций до появления таблицы archive_stats)
+def rebuild(conn, archived=True):
+    missing = missing_fields(conn)
+    conn.execute('DELETE FROM cleaner_stats')
+    if archived:
+        conn.execute(f'''
+            INSERT INTO cleaner_stats (period, cleaner_id, cleaning_type, {', '.join(METRICS)})
+            SELECT period, cleaner_id, cleaning_type, {', '.join(METRICS)} FROM archive_stats
+        ''')
+    for _, period_sql in PERIODS:
+        conn.execute(_aggregate('cleaner_stats', period_sql, 'true', missing))
+    return conn.execute('SELECT COALESCE(SUM(reviews), 0) FROM cleaner_stats WHERE period = ?', ('all',)).fetchone()[0]
+
+
+# Запоминание вклада отзывов, которые переносятся в архив (в транзакции их удаления)
+def archive_feedback(conn, where, params):
+    for _, period_sql in PERIODS:
+        conn.execute(_aggregate('archive_stats', period_sql, where), params)
+
+
+# Разбор аргументов /stats [клинер] [период]. Период: all, year, month, ГГГГ или ГГГГ-ММ.
+# Остальные слова - имя клинера (может состоять из нескольких слов)
+def parse_stats_args(text):
+    words, period = [], 'all'
+    now = datetime.now()
+    for arg in text.split()[1:]:
+        if arg == 'all' or re.fullmatch(r'\d{4}(-\d{2})?', arg):
+            period = arg
+        elif arg == 'year':
+            period = now.strftime('%Y')
+        elif arg == 'month':
+            period = now.strftime('%Y-%m')
+        else:
+            words.append(arg)
+    return ' '.join(words) or None, period
+
+
+def percent(part, total):
+    return f"{part * 100 / total:.0f}%" if total else '—'
+
+
+# Сводка по одному клинеру (строки агрегатов разных типов уборки суммируются)
+def format_cleaner(cleaner_name, totals):
+    reviews = totals['reviews']
+    nps = (totals['promoters'] - totals['detractors']) * 100 / reviews
+    lines = [
+        f"👨🏼‍🚀 {cleaner_name}: отзывов {reviews}",
+        f"Оценка клинера: {totals['cleaner_rating_sum'] / reviews:.1f}",
+        f"Оценка менеджера: {totals['manager_rating_sum'] / reviews:.1f}",
+        f"Готовность рекомендовать: {totals['recommendation_sum'] / reviews:.1f}, NPS {nps:.0f}",
+    ]
+    for field in CHECK_FIELDS:
+        if totals[f'{field}_answers']:
+            lines.append(f"{CHECK_LABELS[field]}: {percent(totals[f'{field}_pass'], totals[f'{field}_answers'])}")
+    return '\n'.join(lines)
+
+
+# Ответ на /stats по готовым агрегатам (выборка по клинеру - по его id)
+def stats_report(db, text):
+    cleaner_name, period = parse_stats_args(text)
+    conn = db.reader()
+    sql, params = '''
+        SELECT cleaner_stats.*, COALESCE(cleaners.name, '—') AS cleaner_name
+        FROM cleaner_stats LEFT JOIN cleaners ON cleaners.id = cleaner_stats.cleaner_id
+        WHERE period = ?
+    ''', (period,)
+    if cleaner_name:
+        cleaner = cleaners.find(conn, cleaner_name)
+        if cleaner is None:
+            return f"Клинер {cleaner_name} не найден"
+        cleaner_name = cleaner[1]
+        sql, params = sql + ' AND cleaner_id = ?', params + (cleaner[0],)
+    cursor = conn.execute(sql, params)
+    columns = [column[0] for column in cursor.description]
+
+    by_cleaner = {}
+    for row in cursor:
+        row = dict(zip(columns, row))
+        totals = by_cleaner.setdefault(row['cleaner_name'], dict.fromkeys(METRICS, 0))
+        for column in METRICS:
+            totals[column] += row[column]
+
+    title = "за все время" if period == 'all' else f"за {period}"
+    if not by_cleaner:
+        return f"Нет отзывов {title}" + (f" по клинеру {cleaner_name}" if cleaner_name else '')
+    return f"📊 Статистика {title}\n\n" + '\n\n'.join(
+        format_cleaner(name, totals) for name, totals in sorted(by_cleaner.items()))
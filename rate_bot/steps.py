@@ -0,0 +1,104 @@
+import json
+import threading
+import time
+
+
+# Хранилища состояния "следующего шага" чек-листа.
+# Вместо bot.register_next_step_handler, который держит ожидающие шаги в памяти
+# одного процесса, имя следующего шага (и его аргументы) сохраняется по chat_id
+# во внешнем хранилище. Так чек-лист переживает перезапуск, а чаты можно
+# обслуживать несколькими процессами.
+# Все хранилища реализуют один интерфейс: get(chat_id), set(chat_id, step, *args), delete(chat_id).
+
+
+# Хранение шагов в SQLite. db - запущенный Database (db.py): запись идет через его
+# поток-писатель и фиксируется пакетами вместе с остальными записями, чтение - через
+# соединение потока. Запись завершается до возврата, поэтому следующий шаг ее видит
+class SQLiteStepStorage:
+    def __init__(self, db, ttl=None):
+        self.db = db
+        self.ttl = ttl
+        db.execute('''
+            CREATE TABLE IF NOT EXISTS checklist_steps (
+                chat_id INTEGER PRIMARY KEY,
+                step TEXT,
+                args TEXT,
+                updated_at REAL
+            )
+        ''').result()
+
+    def get(self, chat_id):
+        row = self.db.query_one('SELECT step, args, updated_at FROM checklist_steps WHERE chat_id = ?', (chat_id,))
+        if row is None or (self.ttl and time.time() - row[2] > self.ttl):
+            return None
+        return row[0], json.loads(row[1])
+
+    def set(self, chat_id, step, *args):
+        self.db.execute('INSERT OR REPLACE INTO checklist_steps (chat_id, step, args, updated_at) VALUES (?, ?, ?, ?)',
+                        (chat_id, step, json.dumps(args), time.time())).result()
+
+    def delete(self, chat_id):
+        self.db.execute('DELETE FROM checklist_steps WHERE chat_id = ?', (chat_id,)).result()
+
+
+# Хранение шагов в Redis. Подходит любой клиент с методами get/set(ex=...)/delete:
+# redis.Redis или LocalRedis ниже
+class RedisStepStorage:
+    def __init__(self, client, ttl=None, prefix='rate_bot:step:'):
+        self.client = client
+        self.ttl = ttl
+        self.prefix = prefix
+
+    def get(self, chat_id):
+        value = self.client.get(f'{self.prefix}{chat_id}')
+        if value is None:
+            return None
+        step, args = json.loads(value)
+        return step, args
+
+    def set(self, chat_id, step, *args):
+        self.client.set(f'{self.prefix}{chat_id}', json.dumps([step, args]), ex=self.ttl)
+
+    def delete(self, chat_id):
+        self.client.delete(f'{self.prefix}{chat_id}')
+
+
+# Локальная замена Redis-клиента в памяти процесса: для разработки и тестов
+# без поднятого Redis. Поддерживает только то, что нужно RedisStepStorage
+class LocalRedis:
+    def __init__(self):
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            value, expires_at = item
+            if expires_at is not None and time.monotonic() >= expires_at:
+                del self._data[key]
+                return None
+            return value
+
+    def set(self, key, value, ex=None):
+        if isinstance(value, str):
+            value = value.encode()
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + ex if ex else None)
+        return True
+
+    def delete(self, *keys):
+        with self._lock:
+            return sum(self._data.pop(key, None) is not None for key in keys)
+
+
+# Выбор хранилища шагов по настройкам из .env:
+# STEP_STORAGE=sqlite (по умолчанию) | redis | local. db - Database для режима sqlite
+def create_step_storage(kind, db, redis_url=None, ttl=None):
+    if kind == 'redis':
+        import redis  # Необязательная зависимость, нужна только для этого режима
+        return RedisStepStorage(redis.Redis.from_url(redis_url), ttl=ttl)
+    if kind == 'local':
+        return RedisStepStorage(LocalRedis(), ttl=ttl)
+    return SQLiteStepStorage(db, ttl=ttl)
@@ -0,0 +1,245 @@
+import asyncio
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+
+from aiohttp import web
+from telebot import types
+from telebot.async_telebot import AsyncTeleBot
+
+from rate_bot import export
+from rate_bot import main
+from rate_bot import metrics
+from rate_bot import stats
+from rate_bot.workers import update_chat_id
+
+# Асинхронный режим работы бота: Telegram присылает обновления на webhook,
+# а ответы отправляются неблокирующими вызовами AsyncTeleBot, поэтому медленный
+# запрос к API для одного клиента не задерживает остальных.
+# Шаги чек-листа общие с polling-режимом (main.py): они работают с БД и
+# выполняются в пуле потоков, а сообщения отправляются здесь.
+#
+# Запуск: python webhook.py или python -m rate_bot.webhook (нужны WEBHOOK_URL и,
+# желательно, WEBHOOK_SECRET в .env). Запуск через python main.py (polling) остается запасным вариантом.
+
+logger = logging.getLogger(__name__)
+
+WEBHOOK_URL = os.getenv('WEBHOOK_URL')  # Публичный адрес, например https://bot.example.com
+WEBHOOK_PATH = os.getenv('WEBHOOK_PATH', '/telegram')
+WEBHOOK_SECRET = os.getenv('WEBHOOK_SECRET')
+WEBHOOK_HOST = os.getenv('WEBHOOK_HOST', '0.0.0.0')
+WEBHOOK_PORT = int(os.getenv('WEBHOOK_PORT', 8080))
+MAX_CONCURRENT_UPDATES = int(os.getenv('MAX_CONCURRENT_UPDATES', 200))
+
+bot = AsyncTeleBot(main.TOKEN)
+
+
+# Ограничение параллельности: обновления одного чата обрабатываются строго
+# по очереди, а общее число одновременно обрабатываемых обновлений ограничено
+class ChatLimiter:
+    def __init__(self, max_concurrency):
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._locks = {}  # chat_id -> [lock, число ожидающих]
+
+    @asynccontextmanager
+    async def hold(self, chat_id):
+        entry = self._locks.setdefault(chat_id, [asyncio.Lock(), 0])
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                async with self._semaphore:
+                    yield
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0:
+                del self._locks[chat_id]
+
+
+limiter = ChatLimiter(MAX_CONCURRENT_UPDATES)
+pending_tasks = set()
+
+
+# Отправка ответов, подготовленных шагами чек-листа
+async def send_replies(replies):
+    for reply in replies:
+        if isinstance(reply, main.Cleanup):
+            # Удаление идет через очередь в БД: пакетами deleteMessages и вне обработчика
+            await asyncio.wrap_future(main.outbox.put_cleanup(reply.chat_id))
+        elif isinstance(reply, main.EditMarkup):
+            await bot.edit_message_reply_markup(reply.chat_id, reply.message_id, reply_markup=reply.markup)
+        elif reply.digest:
+            # Отчеты администратору идут через очередь в БД: не теряются при
+            # перезапуске и в режиме сводки объединяются
+            await asyncio.wrap_future(main.outbox.put(reply.chat_id, reply.text, reply.markup, reply.digest))
+        else:
+            sent = await bot.send_message(reply.chat_id, reply.text, reply_markup=reply.markup)
+            if reply.track:
+                main.db.track_message(reply.chat_id, sent.message_id)
+
+
+# Шаги чек-листа обращаются к SQLite, поэтому выполняются вне цикла событий
+db_executor = ThreadPoolExecutor(max_workers=int(os.getenv('DB_THREADS', 8)), thread_name_prefix='checklist-db')
+
+
+async def run_step(step, *args):
+    return await asyncio.get_running_loop().run_in_executor(db_executor, step, *args)
+
+
+@bot.message_handler(commands=['start'])
+@metrics.timed('start')
+async def start_handler(message):
+    await send_replies(await run_step(main.checklist.start, message))
+
+
+@bot.message_handler(commands=['get_db'])
+@metrics.timed('get_db')
+async def send_database(message):
+    user_id = message.chat.id
+    if str(user_id) != main.ADMIN_USER_ID:
+        await bot.send_message(user_id, "У вас нет доступа к этой команде.")
+        return
+    try:
+        fmt, since = export.parse_export_args(message.text)
+    except export.ExportError as e:
+        await bot.send_message(user_id, str(e))
+        return
+    await bot.send_message(user_id, "Готовлю выгрузку, файл придет отдельным сообщением.")
+    try:
+        file_name, buffer, last_feedback_id = await asyncio.get_running_loop().run_in_executor(
+            main.export_executor, export.export_database, main.db, fmt, since)
+        await bot.send_document(user_id, buffer, visible_file_name=file_name)
+        await run_step(export.mark_exported, main.db, last_feedback_id)
+    except Exception as e:
+        await bot.send_message(user_id, f"Ошибка при создании или отправке файла: {str(e)}")
+
+
+@bot.message_handler(commands=['db_stats'])
+@metrics.timed('db_stats')
+async def send_db_stats(message):
+    if str(message.chat.id) != main.ADMIN_USER_ID:
+        await bot.send_message(message.chat.id, "У вас нет доступа к этой команде.")
+        return
+    await bot.send_message(message.chat.id, await run_step(main.format_db_stats))
+
+
+@bot.message_handler(commands=['health'])
+@metrics.timed('health')
+async def send_health(message):
+    if str(message.chat.id) != main.ADMIN_USER_ID:
+        await bot.send_message(message.chat.id, "У вас нет доступа к этой команде.")
+        return
+    await bot.send_message(message.chat.id, await run_step(main.format_health))
+
+
+@bot.message_handler(commands=['stats'])
+@metrics.timed('stats')
+async def send_stats(message):
+    if str(message.chat.id) != main.ADMIN_USER_ID:
+        await bot.send_message(message.chat.id, "У вас нет доступа к этой команде.")
+        return
+    await bot.send_message(message.chat.id, await run_step(stats.stats_report, main.db, message.text))
+
+
+@bot.message_handler(commands=['rebuild_stats'])
+@metrics.timed('rebuild_stats')
+async def rebuild_stats(message):
+    if str(message.chat.id) != main.ADMIN_USER_ID:
+        await bot.send_message(message.chat.id, "У вас нет доступа к этой команде.")
+        return
+    reviews = await asyncio.wrap_future(main.db.rebuild_stats())
+    await bot.send_message(message.chat.id, f"Статистика пересчитана, учтено отзывов: {reviews}")
+
+
+@bot.message_handler(commands=['redeem'])
+@metrics.timed('redeem')
+async def redeem_coupon(message):
+    if str(message.chat.id) != main.ADMIN_USER_ID:
+        await bot.send_message(message.chat.id, "У вас нет доступа к этой команде.")
+        return
+    args = message.text.split()
+    if len(args) != 2:
+        await bot.send_message(message.chat.id, "Использование: /redeem КОД")
+        return
+    result = await asyncio.wrap_future(main.db.redeem_coupon(args[1].upper(), message.chat.id))
+    await bot.send_message(message.chat.id, result)
+
+
+@bot.message_handler(commands=['add_cleaner', 'remove_cleaner'])
+@metrics.timed('cleaners')
+async def edit_cleaners(message):
+    if str(message.chat.id) != main.ADMIN_USER_ID:
+        await bot.send_message(message.chat.id, "У вас нет доступа к этой команде.")
+        return
+    await bot.send_message(message.chat.id, await run_step(main.format_cleaners_command, message.text))
+
+
+@bot.callback_query_handler(func=lambda call: main.checklist.handles(call.data))
+@metrics.timed('callback')
+async def handle_callback(call):
+    alert, replies = await run_step(main.checklist.process_callback, call)
+    await bot.answer_callback_query(call.id, alert, show_alert=alert is not None)
+    await send_replies(replies)
+
+
+# Текстовые ответы: шаг проверяется внутри process_message, без блокирующего фильтра
+@bot.message_handler(content_types=['text'])
+@metrics.timed('next_step')
+async def handle_next_step(message):
+    await send_replies(await run_step(main.checklist.process_message, message))
+
+
+async def process_update(update, chat_id):
+    async with limiter.hold(chat_id):
+        try:
+            await bot.process_new_updates([update])
+        except Exception as e:
+            logger.exception(f"Ошибка обработки обновления {update.update_id}: {e}")
+
+
+# Прием обновления от Telegram. Отвечаем сразу, а обработку запускаем в фоне,
+# чтобы Telegram не ждал окончания обработки и не присылал обновление повторно
+async def handle_webhook(request):
+    if WEBHOOK_SECRET and request.headers.get('X-Telegram-Bot-Api-Secret-Token') != WEBHOOK_SECRET:
+        return web.Response(status=403)
+    payload = await request.json()
+    update = types.Update.de_json(payload)
+    task = asyncio.create_task(process_update(update, update_chat_id(payload)))
+    pending_tasks.add(task)
+    task.add_done_callback(pending_tasks.discard)
+    return web.Response()
+
+
+async def on_startup(app):
+    main.outbox.start()
+    main.reports_scheduler.start()
+    main.archiver.start()
+    main.start_metrics_server()
+    await bot.set_webhook(url=WEBHOOK_URL + WEBHOOK_PATH, secret_token=WEBHOOK_SECRET,
+                          max_connections=100)
+    logger.info(f"Webhook установлен: {WEBHOOK_URL}{WEBHOOK_PATH}")
+
+
+async def on_cleanup(app):
+    if pending_tasks:
+        await asyncio.gather(*pending_tasks, return_exceptions=True)
+    await bot.close_session()
+
+
+def create_app():
+    app = web.Application()
+    app.router.add_post(WEBHOOK_PATH, handle_webhook)
+    app.on_startup.append(on_startup)
+    app.on_cleanup.append(on_cleanup)
+    return app
+
+
+def run():
+    main.configure_logging()
+    main.setup()
+    metrics.instrument_async_telegram()
+    web.run_app(create_app(), host=WEBHOOK_HOST, port=WEBHOOK_PORT)
+
+
+if __name__ == '__main__':
+    run()
@@ -0,0 +1,101 @@
+import json
+import logging
+import sqlite3
+import time
+
+from telebot import apihelper, types
+
+from rate_bot.db import TimedConnection
+
+logger = logging.getLogger(__name__)
+
+
+# Определение чата, к которому относится обновление (для шардирования)
+def update_chat_id(update):
+    for key in ('message', 'edited_message'):
+        if key in update:
+            return update[key]['chat']['id']
+    if 'callback_query' in update:
+        query = update['callback_query']
+        if 'message' in query:
+            return query['message']['chat']['id']
+        return query['from']['id']
+    return 0
+
+
+# Очередь обновлений в SQLite, разбитая на шарды по chat_id.
+# Один процесс-диспетчер забирает обновления из getUpdates и кладет их в очередь,
+# несколько процессов-воркеров обрабатывают каждый свой шард. Все обновления
+# одного чата попадают в один шард и обрабатываются по порядку.
+class UpdateQueue:
+    def __init__(self, db_path):
+        self._conn = sqlite3.connect(db_path, timeout=30, factory=TimedConnection)
+        self._conn.execute('''
+            CREATE TABLE IF NOT EXISTS update_queue (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                shard INTEGER,
+                payload TEXT
+            )
+        ''')
+        self._conn.execute('CREATE INDEX IF NOT EXISTS idx_update_queue_shard ON update_queue (shard, id)')
+        self._conn.execute('''
+            CREATE TABLE IF NOT EXISTS update_offset (
+                id INTEGER PRIMARY KEY CHECK (id = 1),
+                next_offset INTEGER
+            )
+        ''')
+        self._conn.commit()
+
+    def offset(self):
+        row = self._conn.execute('SELECT next_offset FROM update_offset WHERE id = 1').fetchone()
+        return row[0] if row else None
+
+    # Обновления и новый offset сохраняются в одной транзакции
+    def push(self, updates, workers):
+        with self._conn:
+            self._conn.executemany('INSERT INTO update_queue (shard, payload) VALUES (?, ?)',
+                                   [(update_chat_id(u) % workers, json.dumps(u)) for u in updates])
+            self._conn.execute('INSERT OR REPLACE INTO update_offset (id, next_offset) VALUES (1, ?)',
+                               (updates[-1]['update_id'] + 1,))
+
+    def fetch(self, shard, limit=50):
+        return self._conn.execute('SELECT id, payload FROM update_queue WHERE shard = ? ORDER BY id LIMIT ?',
+                                  (shard, limit)).fetchall()
+
+    def ack(self, row_id):
+        with self._conn:
+            self._conn.execute('DELETE FROM update_queue WHERE id = ?', (row_id,))
+
+
+# Диспетчер: единственный процесс, который вызывает getUpdates
+def run_dispatcher(token, queue, workers, long_polling_timeout=20):
+    logger.info(f"Диспетчер запущен, воркеров: {workers}")
+    while True:
+        try:
+            updates = apihelper.get_updates(token, offset=queue.offset(), limit=100,
+                                            long_polling_timeout=long_polling_timeout)
+        except Exception as e:
+            logger.error(f"Ошибка получения обновлений: {e}")
+            time.sleep(3)
+            continue
+        if updates:
+            queue.push(updates, workers)
+
+
+# Воркер: обрабатывает обновления своего шарда тем же набором хендлеров, что и polling.
+# Обновление удаляется из очереди только после обработки, поэтому после падения
+# воркер продолжит с того же места
+def run_worker(bot, queue, shard, idle_sleep=0.2):
+    logger.info(f"Воркер {shard} запущен")
+    bot.threaded = False
+    while True:
+        rows = queue.fetch(shard)
+        if not rows:
+            time.sleep(idle_sleep)
+            continue
+        for row_id, payload in rows:
+            try:
+                bot.process_new_updates([types.Update.de_json(payload)])
+            except Exception as e:
+                logger.exception(f"Ошибка обработки обновления в воркере {shard}: {e}")
+            queue.ack(row_id)
@@ -0,0 +1,29 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from rate_bot.db import FEEDBACK_COLUMNS, Database
+
+
+# Рабочая база во временном каталоге: миграции применены, поток-писатель запущен
+@pytest.fixture
+def db(tmp_path):
+    database = Database(str(tmp_path / 'bot.db'))
+    database.start()
+    return database
+
+
+# Запись отзыва, как после завершения чек-листа: add_feedback(user_id, date, **ответы) -> id отзыва
+@pytest.fixture
+def add_feedback(db):
+    def add(user_id=1, date=1700000000, **answers):
+        feedback = dict.fromkeys(FEEDBACK_COLUMNS)
+        feedback.update(user_id=user_id, name='Иван', cleaner_id=1, address='Адрес', cleaning_type='m',
+                        surfaces=1, floor=1, bathrooms=1, kitchen=1, trash=1, mirror=1, cleaner_rating=9,
+                        manager_rating=9, recommendation_rating=10, suggestions='', cleaner_name='Илья', date=date)
+        feedback.update(answers)
+        return db.submit_feedback(user_id, date, feedback).result()[0]
+    return add
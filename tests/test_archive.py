@@ -0,0 +1,93 @@
+import csv
+import io
+import os
+import sqlite3
+import zipfile
+from datetime import datetime
+
+import pytest
+
+from rate_bot import archive, stats
+from rate_bot.archive import Archiver
+from rate_bot.export import export_database, mark_exported
+
+OLD = int(datetime(2023, 1, 10, 12).timestamp())
+NOW = datetime(2024, 6, 1)
+
+
+def feedback_ids(buffer):
+    with zipfile.ZipFile(buffer) as archive_file:
+        with archive_file.open('feedback.csv') as raw:
+            return [int(row['id']) for row in csv.DictReader(io.TextIOWrapper(raw, encoding='utf-8-sig'))]
+
+
+def archived_ids(path):
+    conn = sqlite3.connect(path)
+    try:
+        return [row[0] for row in conn.execute('SELECT id FROM feedback ORDER BY id')]
+    finally:
+        conn.close()
+
+
+@pytest.fixture
+def archiver(db, tmp_path):
+    return Archiver(db, directory=str(tmp_path / 'archive'), after_days=90)
+
+
+def test_due_months(db, add_feedback):
+    add_feedback(1, date=OLD)
+    add_feedback(2, date=int(datetime(2024, 5, 20).timestamp()))
+    assert archive.due_months(db.reader(), 90, NOW) == ['2023-01']
+
+
+# Старый месяц переносится в архив, агрегаты /stats и пересчет их не теряют
+def test_month_is_archived(db, add_feedback, archiver):
+    old = [add_feedback(user_id, date=OLD) for user_id in (1, 2)]
+    recent = add_feedback(3, date=int(datetime(2024, 5, 20).timestamp()))
+    before = db.query_all('SELECT * FROM cleaner_stats ORDER BY 1, 2, 3')
+    archiver.run_once(NOW)
+
+    assert db.query_all('SELECT id FROM feedback') == [(recent,)]
+    month, path, rows, max_id = db.query_one('SELECT month, path, rows, max_id FROM archived_months')
+    assert (month, rows, max_id) == ('2023-01', 2, old[-1])
+    assert archived_ids(path) == old
+    assert db.rebuild_stats().result() == 3
+    assert db.query_all('SELECT * FROM cleaner_stats ORDER BY 1, 2, 3') == before
+
+
+# Сбой между копией в архив и удалением из рабочей базы: следующий проход
+# удаляет скопированные строки, не дублируя их в архиве
+def test_repair_after_crash_between_copy_and_delete(db, add_feedback, archiver, monkeypatch):
+    old = [add_feedback(user_id, date=OLD) for user_id in (1, 2, 3)]
+
+    def crash(conn, where, params):
+        raise RuntimeError('сбой')
+    monkeypatch.setattr(stats, 'archive_feedback', crash)
+    with pytest.raises(RuntimeError):
+        archiver.run_once(NOW)
+    path = os.path.join(archiver.directory, 'feedback_2023-01.db')
+    assert archived_ids(path) == old
+    assert db.query_one('SELECT COUNT(*) FROM feedback')[0] == 3
+    assert db.query_one('SELECT COUNT(*) FROM archived_months')[0] == 0
+
+    monkeypatch.undo()
+    archiver.run_once(NOW)
+    assert archived_ids(path) == old
+    assert db.query_one('SELECT COUNT(*) FROM feedback')[0] == 0
+    assert db.query_one('SELECT rows FROM archived_months')[0] == 3
+    assert db.rebuild_stats().result() == 3
+
+
+# Выгрузка читает архивные месяцы вместе с рабочей базой, с учетом since
+def test_export_includes_archived_months(db, add_feedback, archiver):
+    old = [add_feedback(user_id, date=OLD) for user_id in (1, 2)]
+    mark_exported(db, old[0]).result()
+    recent = add_feedback(3, date=int(datetime(2024, 5, 20).timestamp()))
+    archiver.run_once(NOW)
+    # Колонка, добавленная после переноса месяца, в архивных строках пустая
+    db.execute('ALTER TABLE feedback ADD COLUMN oven INTEGER').result()
+
+    _, buffer, last_id = export_database(db, 'csv')
+    assert feedback_ids(buffer) == old + [recent] and last_id == recent
+    assert feedback_ids(export_database(db, 'csv', 'last')[1]) == [old[1], recent]
+    assert feedback_ids(export_database(db, 'csv', '2024-01-01')[1]) == [recent]
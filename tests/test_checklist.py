@@ -0,0 +1,114 @@
+import json
+from types import SimpleNamespace
+
+import pytest
+
+from rate_bot import checklist
+from rate_bot.checklist import CHECK, SESSION_EXPIRED_TEXT, STALE_BUTTON_TEXT, STALE_ROSTER_TEXT, Checklist, EditMarkup
+from rate_bot.cleaners import Roster
+from rate_bot.sessions import SessionStore
+from rate_bot.steps import LocalRedis, RedisStepStorage
+
+GENERAL_ONLY = {question.key for question in checklist.QUESTIONS if question.only_for == ('g',)}
+
+
+def message(chat_id, text):
+    return SimpleNamespace(chat=SimpleNamespace(id=chat_id), text=text, message_id=1)
+
+
+def callback(chat_id, data):
+    return SimpleNamespace(data=data, message=message(chat_id, ''))
+
+
+@pytest.fixture
+def completed():
+    return []
+
+
+@pytest.fixture
+def engine(db, completed):
+    def on_complete(message, answers):
+        completed.append(answers)
+        return []
+    return Checklist(SessionStore(), RedisStepStorage(LocalRedis()), on_complete,
+                     rosters={'cleaner_id': Roster(db)})
+
+
+# Прохождение чек-листа до конца; asked - ключи заданных вопросов по порядку
+def run(engine, chat_id, cleaning_type):
+    asked = []
+
+    def step(replies):
+        for reply in replies:
+            asked.append(engine.step_states.get(chat_id)[0])
+
+    step(engine.start(message(chat_id, '/start')))
+    step(engine.process_message(message(chat_id, 'Иван')))
+    step(engine.process_callback(callback(chat_id, 'cleaner_id:1'))[1])
+    step(engine.process_message(message(chat_id, 'Адрес')))
+    step(engine.process_callback(callback(chat_id, f'cleaning_type:{cleaning_type}'))[1])
+    while asked[-1] != 'cleaner_rating':
+        question = engine.by_key[asked[-1]]
+        assert question.kind == CHECK
+        # Первый пункт не выполнен, остальные выполнены
+        step(engine.process_message(message(chat_id, question.options[len(asked) == 5])))
+    for key in ('cleaner_rating', 'manager_rating', 'recommendation_rating'):
+        step(engine.process_callback(callback(chat_id, f'{key}:9'))[1])
+    step(engine.process_callback(callback(chat_id, 'suggestions:'))[1])
+    return asked
+
+
+def test_flows(engine):
+    general = [question.key for question in engine.flow('g')]
+    maintenance = [question.key for question in engine.flow('m')]
+    assert GENERAL_ONLY and GENERAL_ONLY <= set(general)
+    assert not GENERAL_ONLY & set(maintenance)
+    assert [key for key in general if key not in GENERAL_ONLY] == maintenance
+
+
+@pytest.mark.parametrize('cleaning_type', ['g', 'm'])
+def test_branching(engine, completed, cleaning_type):
+    asked = run(engine, 5, cleaning_type)
+    assert asked == [question.key for question in engine.flow(cleaning_type)]
+    assert len(completed) == 1
+    answers = completed[0]
+    assert answers['cleaning_type'] == cleaning_type
+    assert answers['cleaner_id'] == 1
+    assert answers['suggestions'] == ''
+    assert answers['recommendation_rating'] == 9
+    checks = [question.key for question in engine.flow(cleaning_type) if question.kind == CHECK]
+    assert [answers[key] for key in checks] == [0] + [1] * (len(checks) - 1)
+    if cleaning_type == 'm':
+        assert not GENERAL_ONLY & set(answers)
+    assert engine.step_states.get(5) is None
+    assert engine.sessions.get(5) is None
+
+
+def test_stale_and_expired_buttons(engine):
+    assert engine.process_callback(callback(6, 'cleaning_type:g')) == (SESSION_EXPIRED_TEXT, [])
+    engine.start(message(6, '/start'))
+    engine.process_message(message(6, 'Иван'))
+    assert engine.process_callback(callback(6, 'cleaning_type:g')) == (STALE_BUTTON_TEXT, [])
+    assert engine.process_callback(callback(6, 'cleaner_id:999')) == (STALE_ROSTER_TEXT, [])
+    warning, replies = engine.process_callback(callback(6, 'cleaner_id:page:0'))
+    assert warning is None and isinstance(replies[0], EditMarkup)
+    # Пока ждем кнопку, текст не принимается
+    assert engine.process_message(message(6, 'Илья')) == []
+    assert engine.step_states.get(6)[0] == 'cleaner_id'
+
+
+def test_session_expired_midway(engine, completed):
+    engine.start(message(7, '/start'))
+    engine.process_message(message(7, 'Иван'))
+    engine.sessions.finish(7)
+    _, replies = engine.process_callback(callback(7, 'cleaner_id:1'))
+    assert replies[0].text == SESSION_EXPIRED_TEXT
+    assert engine.step_states.get(7) is None
+    assert completed == []
+
+
+def test_markups_are_prebuilt(engine):
+    markup = json.loads(engine.markups['cleaning_type'])
+    assert [button['callback_data'] for button in markup['inline_keyboard'][0]] == ['cleaning_type:g', 'cleaning_type:m']
+    assert engine.handles('cleaner_rating:7') and engine.handles('cleaner_id:1')
+    assert not engine.handles('unknown:1')
@@ -0,0 +1,55 @@
+import json
+
+from rate_bot.cleaners import Roster
+
+
+def buttons(markup):
+    return [[button['callback_data'] for button in row] for row in json.loads(markup)['inline_keyboard']]
+
+
+def add_cleaners(db, count):
+    for i in range(count):
+        assert db.add_cleaner(f'Клинер {i:02}').result() == f'Клинер Клинер {i:02} добавлен'
+
+
+def test_pages(db):
+    add_cleaners(db, 3)
+    roster = Roster(db, page_size=2, row_width=2)
+    # Алексей, Илья и 3 новых клинера по алфавиту - 3 страницы по 2 кнопки
+    first = buttons(roster.markup(0))
+    assert first == [['cleaner_id:2', 'cleaner_id:1'], ['cleaner_id:page:2', 'cleaner_id:-', 'cleaner_id:page:1']]
+    assert buttons(roster.markup(1))[0] == ['cleaner_id:3', 'cleaner_id:4']
+    last = buttons(roster.markup(2))
+    assert last[0] == ['cleaner_id:5'] and last[-1][2] == 'cleaner_id:page:0'
+    # Номер страницы приводится к существующим страницам
+    assert roster.markup(10) == roster.markup(2)
+    assert roster.markup(-1) == roster.markup(0)
+
+
+def test_single_page_has_no_navigation(db):
+    assert buttons(Roster(db).markup()) == [['cleaner_id:2', 'cleaner_id:1']]
+
+
+# Клавиатура собирается один раз на версию списка и пересобирается после его изменения
+def test_markup_is_cached_by_version(db):
+    roster = Roster(db)
+    snapshot = roster.snapshot()
+    markup = roster.markup()
+    assert roster.markup() is markup and roster.snapshot() is snapshot
+
+    assert db.add_cleaner('Мария').result() == 'Клинер Мария добавлен'
+    assert roster.snapshot() is not snapshot
+    assert buttons(roster.markup()) == [['cleaner_id:2', 'cleaner_id:1'], ['cleaner_id:3']]
+
+
+# Удаленного клинера нельзя выбрать, но его имя остается для отчетов
+def test_removed_cleaner(db):
+    roster = Roster(db)
+    assert roster.choice('1') == 1
+    assert db.remove_cleaner('илья').result() == 'Клинер Илья удален из списка выбора'
+    assert roster.choice('1') is None and roster.name(1) == 'Илья'
+    assert buttons(roster.markup()) == [['cleaner_id:2']]
+    assert db.remove_cleaner('Алексей').result().startswith('Нельзя удалить последнего клинера')
+    assert db.add_cleaner('ИЛЬЯ').result() == 'Клинер Илья снова в списке'
+    assert roster.choice('1') == 1
+    assert roster.choice('page') is None and roster.name(99) == '99'
@@ -0,0 +1,66 @@
+import sqlite3
+import string
+import time
+
+from rate_bot import coupons, migrations
+
+
+# Перестановка на уменьшенном пространстве кодов: проверяется вся область целиком
+def test_permute_is_bijection(monkeypatch):
+    monkeypatch.setattr(coupons, 'HALF_BITS', 6)
+    monkeypatch.setattr(coupons, 'HALF_MASK', 63)
+    monkeypatch.setattr(coupons, 'SPACE', 26 ** 2)
+    values = [coupons.permute(b'k' * 16, seq) for seq in range(26 ** 2)]
+    assert sorted(values) == list(range(26 ** 2))
+
+
+def test_permute_depends_on_key():
+    first = [coupons.permute(b'a' * 16, seq) for seq in range(100)]
+    second = [coupons.permute(b'b' * 16, seq) for seq in range(100)]
+    assert first != second
+
+
+def test_codes_are_unique_and_well_formed():
+    key = b'secret-key-16byt'
+    codes = {coupons.encode(coupons.permute(key, seq)) for seq in range(20000)}
+    assert len(codes) == 20000
+    assert all(len(code) == coupons.CODE_LENGTH and set(code) <= set(string.ascii_uppercase) for code in codes)
+
+
+def test_encode_bounds():
+    assert coupons.encode(0) == 'AAAAAA'
+    assert coupons.encode(coupons.SPACE - 1) == 'ZZZZZZ'
+
+
+def issuer_conn():
+    conn = sqlite3.connect(':memory:', isolation_level=None)
+    migrations.migrate(conn)
+    return conn
+
+
+# Номер, код которого совпал с ранее выданным случайным купоном, пропускается
+def test_issuer_skips_legacy_codes():
+    conn = issuer_conn()
+    key = conn.execute('SELECT key FROM coupon_state').fetchone()[0]
+    legacy = coupons.encode(coupons.permute(key, 0))
+    conn.execute('INSERT INTO coupons (code, user_id) VALUES (?, 1)', (legacy,))
+    issuer = coupons.CouponIssuer(conn)
+    code = issuer.issue(conn, 2, 1000)
+    assert code != legacy
+    assert code == coupons.encode(coupons.permute(key, 1))
+    assert conn.execute('SELECT next_seq FROM coupon_state').fetchone()[0] == 2
+
+
+def test_issue_and_redeem():
+    conn = issuer_conn()
+    issuer = coupons.CouponIssuer(conn, ttl=coupons.DEFAULT_TTL)
+    now = int(time.time())
+    code = issuer.issue(conn, 7, now)
+    expires_at = conn.execute('SELECT expires_at FROM coupons WHERE code = ?', (code,)).fetchone()[0]
+    assert expires_at == now + int(coupons.DEFAULT_TTL.total_seconds())
+    assert 'погашен' in coupons.redeem(conn, code, 999)
+    assert 'уже использован' in coupons.redeem(conn, code, 999)
+    assert 'не найден' in coupons.redeem(conn, 'NOCODE', 999)
+
+    expired = issuer.issue(conn, 8, now - int(coupons.DEFAULT_TTL.total_seconds()) - 10)
+    assert 'истек' in coupons.redeem(conn, expired, 999)
@@ -0,0 +1,112 @@
+import threading
+
+import pytest
+
+from rate_bot.db import Database
+
+
+# Поток-писатель занят первой задачей, пока остальные задачи копятся в очереди.
+# Задача-блокировка - отдельный пакет, он тоже учитывается в db.batches
+def hold_writer(db):
+    started, release = threading.Event(), threading.Event()
+
+    def job(conn):
+        started.set()
+        release.wait(5)
+    future = db.submit(job)
+    started.wait(5)
+    return future, release
+
+
+def test_queued_writes_share_one_transaction(db):
+    blocker, release = hold_writer(db)
+    batches = db.batches
+    futures = [db.track_message(1, message_id) for message_id in range(50)]
+    release.set()
+    blocker.result()
+    assert [future.result() for future in futures] == [1] * 50
+    # Все 50 задач из очереди зафиксированы одним пакетом
+    assert db.batches == batches + 2
+    assert db.query_one('SELECT COUNT(*) FROM checklist_messages')[0] == 50
+
+
+def test_batch_size_limits_transaction(tmp_path):
+    db = Database(str(tmp_path / 'bot.db'), batch_size=10)
+    db.start()
+    blocker, release = hold_writer(db)
+    batches = db.batches
+    futures = [db.track_message(1, message_id) for message_id in range(25)]
+    release.set()
+    blocker.result()
+    for future in futures:
+        future.result()
+    assert db.batches == batches + 4
+
+
+# Ошибка одной задачи откатывается до ее точки сохранения, остальные задачи пакета фиксируются
+def test_failed_job_does_not_roll_back_batch(db):
+    def broken(conn):
+        conn.execute('INSERT INTO checklist_messages (chat_id, message_id) VALUES (2, 1)')
+        raise RuntimeError('сбой')
+
+    blocker, release = hold_writer(db)
+    batches = db.batches
+    before = db.track_message(1, 1)
+    failed = db.submit(broken)
+    after = db.track_message(1, 2)
+    release.set()
+    blocker.result()
+    assert before.result() == 1 and after.result() == 1
+    with pytest.raises(RuntimeError):
+        failed.result()
+    assert db.batches == batches + 2
+    assert db.query_all('SELECT chat_id, message_id FROM checklist_messages ORDER BY message_id') == [(1, 1), (1, 2)]
+
+
+# Задача вне транзакции завершает пакет и выполняется отдельно
+def test_job_outside_transaction_runs_alone(db):
+    blocker, release = hold_writer(db)
+    first = db.track_message(1, 1)
+    alone = db.submit(lambda conn: conn.in_transaction, transaction=False)
+    second = db.track_message(1, 2)
+    release.set()
+    blocker.result()
+    assert first.result() == 1 and second.result() == 1
+    assert alone.result() is False
+
+
+def test_last_check_is_cached(db, add_feedback):
+    assert db.last_check(1) is None
+    add_feedback(1, date=1700000000)
+    # Запись отзыва сразу обновляет кэш
+    assert db.last_check(1) == 1700000000
+    db.execute('UPDATE users SET last_check = 1800000000 WHERE user_id = 1').result()
+    assert db.last_check(1) == 1700000000
+    assert db.last_check(1, cached=False) == 1800000000
+    assert db.last_check(1) == 1800000000
+
+
+def test_last_check_cache_limits(tmp_path):
+    db = Database(str(tmp_path / 'bot.db'), last_check_cache_size=2, last_check_ttl=0)
+    db.start()
+    for user_id in (1, 2, 3):
+        db.last_check(user_id)
+    assert list(db._last_checks) == [2, 3]
+    # Значение старше last_check_ttl перечитывается из БД
+    db.execute("INSERT INTO users (user_id, name, last_check) VALUES (3, 'Иван', 1700000000)").result()
+    assert db.last_check(3) == 1700000000
+
+
+# Чтение началось до фиксации отзыва, а закончилось после: прочитанное старое значение
+# не должно вытеснить из кэша время, запомненное при записи отзыва
+def test_stale_read_does_not_overwrite_cache(db, add_feedback, monkeypatch):
+    query_one = db.query_one
+
+    def slow_read(sql, params=()):
+        row = query_one(sql, params)
+        add_feedback(1, date=1700000000)
+        return row
+    monkeypatch.setattr(db, 'query_one', slow_read)
+    assert db.last_check(1) is None
+    monkeypatch.undo()
+    assert db.last_check(1) == 1700000000
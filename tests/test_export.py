@@ -0,0 +1,49 @@
+import csv
+import io
+import zipfile
+
+import pytest
+
+from rate_bot.export import ExportError, export_database, mark_exported, parse_export_args
+
+
+def feedback_ids(buffer):
+    with zipfile.ZipFile(buffer) as archive:
+        with archive.open('feedback.csv') as raw:
+            rows = list(csv.DictReader(io.TextIOWrapper(raw, encoding='utf-8-sig')))
+    return [int(row['id']) for row in rows]
+
+
+def test_parse_export_args():
+    assert parse_export_args('/get_db') == ('xlsx', None)
+    assert parse_export_args('/get_db csv since=last') == ('csv', 'last')
+    assert parse_export_args('/get_db since=2024-08-01 PARQUET') == ('parquet', '2024-08-01')
+    with pytest.raises(ExportError):
+        parse_export_args('/get_db since=вчера')
+    with pytest.raises(ExportError):
+        parse_export_args('/get_db pdf')
+
+
+# since=last выгружает только отзывы после отметки прошлой выгрузки
+def test_since_last_continues_from_mark(db, add_feedback):
+    first = [add_feedback(user_id) for user_id in (1, 2)]
+    name, buffer, last_id = export_database(db, 'csv', 'last')
+    assert name.endswith('.csv.zip') and '_since_last_' in name
+    assert feedback_ids(buffer) == first and last_id == first[-1]
+
+    # Пока отметка не сохранена, повторная выгрузка отдает те же отзывы
+    assert feedback_ids(export_database(db, 'csv', 'last')[1]) == first
+    mark_exported(db, last_id).result()
+    assert feedback_ids(export_database(db, 'csv', 'last')[1]) == []
+
+    later = add_feedback(3)
+    _, buffer, last_id = export_database(db, 'csv', 'last')
+    assert feedback_ids(buffer) == [later] and last_id == later
+    # Полная выгрузка отметку не учитывает
+    assert feedback_ids(export_database(db, 'csv')[1]) == first + [later]
+
+
+def test_since_date(db, add_feedback):
+    add_feedback(1, date=1700000000)
+    recent = add_feedback(2, date=1800000000)
+    assert feedback_ids(export_database(db, 'csv', '2025-01-01')[1]) == [recent]
@@ -0,0 +1,102 @@
+import sqlite3
+
+import pytest
+
+from rate_bot import migrations, stats
+from rate_bot.db import FEEDBACK_COLUMNS
+
+
+def connect(path=':memory:'):
+    return sqlite3.connect(path, isolation_level=None)
+
+
+def test_fresh_database():
+    conn = connect()
+    assert migrations.migrate(conn) == migrations.LATEST_VERSION
+    assert migrations.current_version(conn) == migrations.LATEST_VERSION
+    migrations.check_schema(conn, FEEDBACK_COLUMNS)
+    # Повторный запуск ничего не применяет
+    assert migrations.migrate(conn) == migrations.LATEST_VERSION
+
+
+# База прежней версии бота: даты строками, латинские коды клинеров, купоны в users
+def test_legacy_database():
+    conn = connect()
+    migrations.migrate(conn, target=1)
+    conn.execute("INSERT INTO users (user_id, name, last_check, coupon) VALUES (1, 'Иван', '2024-08-01 12:00:00', 'QWERTY')")
+    for cleaner in ('Ilya', 'Мария'):
+        conn.execute('''
+            INSERT INTO feedback (user_id, name, cleaner_name, cleaning_type, surfaces, cleaner_rating, manager_rating,
+                                  recommendation_rating, date)
+            VALUES (1, 'Иван', ?, 'm', 1, 8, 9, 10, '2024-08-01 12:00:00.123456')
+        ''', (cleaner,))
+
+    assert migrations.migrate(conn) == migrations.LATEST_VERSION
+    assert conn.execute("SELECT COUNT(*) FROM feedback WHERE typeof(date) != 'integer'").fetchone()[0] == 0
+    assert conn.execute("SELECT typeof(last_check) FROM users").fetchone()[0] == 'integer'
+    rows = conn.execute('''
+        SELECT feedback.cleaner_name, cleaners.name, cleaners.active
+        FROM feedback JOIN cleaners ON cleaners.id = feedback.cleaner_id ORDER BY feedback.id
+    ''').fetchall()
+    assert rows == [('Илья', 'Илья', 1), ('Мария', 'Мария', 0)]
+    assert conn.execute("SELECT seq, user_id FROM coupons WHERE code = 'QWERTY'").fetchone() == (None, 1)
+    assert conn.execute("SELECT SUM(reviews), SUM(surfaces_pass) FROM cleaner_stats WHERE period = 'all'").fetchone() == (2, 2)
+
+
+# Другой процесс применил миграции между чтением версии и блокировкой записи
+def test_version_reread_under_lock(tmp_path, monkeypatch):
+    path = str(tmp_path / 'bot.db')
+    migrations.migrate(connect(path))
+
+    read_version = migrations.current_version
+    calls = []
+
+    def stale_version(conn):
+        calls.append(1)
+        return 0 if len(calls) == 1 else read_version(conn)
+
+    monkeypatch.setattr(migrations, 'current_version', stale_version)
+    assert migrations.migrate(connect(path)) == migrations.LATEST_VERSION
+
+
+def test_failed_migration_rolls_back(monkeypatch):
+    conn = connect()
+    migrations.migrate(conn, target=migrations.LATEST_VERSION - 1)
+
+    def broken(conn):
+        conn.execute('CREATE TABLE half_done (id INTEGER)')
+        raise RuntimeError('сбой')
+
+    monkeypatch.setattr(migrations, 'MIGRATIONS', migrations.MIGRATIONS[:-1] + ((migrations.LATEST_VERSION, broken),))
+    with pytest.raises(RuntimeError):
+        migrations.migrate(conn)
+    assert migrations.current_version(conn) == migrations.LATEST_VERSION - 1
+    assert conn.execute("SELECT name FROM sqlite_master WHERE name = 'half_done'").fetchone() is None
+
+
+# Новый вопрос без миграции: бот не запускается, add_question_columns добавляет недостающее
+def test_check_schema_and_question_columns():
+    conn = connect()
+    migrations.migrate(conn)
+    with pytest.raises(RuntimeError, match='oven'):
+        migrations.check_schema(conn, FEEDBACK_COLUMNS + ('oven',))
+    migrations.add_question_columns(conn, 'oven', 'INTEGER')
+    migrations.check_schema(conn, FEEDBACK_COLUMNS + ('oven',))
+
+    conn.execute('ALTER TABLE summaries DROP COLUMN mirror_pass')
+    with pytest.raises(RuntimeError, match='summaries'):
+        migrations.check_schema(conn, FEEDBACK_COLUMNS)
+    migrations.add_question_columns(conn, 'mirror', 'INTEGER')
+    migrations.check_schema(conn, FEEDBACK_COLUMNS)
+
+
+# Пересчет агрегатов, когда колонка вопроса еще не добавлена в feedback (как в миграции 8)
+def test_rebuild_without_question_column():
+    conn = connect()
+    migrations.migrate(conn)
+    conn.execute("INSERT INTO feedback (cleaner_id, cleaning_type, mirror, cleaner_rating, manager_rating, "
+                 "recommendation_rating, date) VALUES (1, 'm', 1, 8, 9, 10, 1700000000)")
+    conn.execute('ALTER TABLE feedback DROP COLUMN mirror')
+    assert stats.missing_fields(conn) == {'mirror'}
+    assert stats.rebuild(conn) == 1
+    assert conn.execute("SELECT mirror_pass, mirror_answers FROM cleaner_stats WHERE period = 'all'").fetchone() == (0, 0)
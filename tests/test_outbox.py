@@ -0,0 +1,219 @@
+import time
+
+import pytest
+from telebot import apihelper
+
+from rate_bot import outbox as outbox_module
+from rate_bot.outbox import MAX_MESSAGE_LENGTH, Outbox, split_digest, split_message
+
+
+def api_error(code, retry_after=None):
+    result_json = {'ok': False, 'error_code': code, 'description': 'error'}
+    if retry_after is not None:
+        result_json['parameters'] = {'retry_after': retry_after}
+    return apihelper.ApiTelegramException('sendMessage', None, result_json)
+
+
+# Отправка с заранее заданными ошибками: errors - исключения для первых вызовов
+class FakeTelegram:
+    def __init__(self, errors=()):
+        self.errors = list(errors)
+        self.sent = []
+        self.deleted = []
+        self.next_id = 100
+
+    def send(self, chat_id, text, markup):
+        if self.errors:
+            raise self.errors.pop(0)
+        self.sent.append((chat_id, text, markup))
+        self.next_id += 1
+        return type('Message', (), {'message_id': self.next_id})
+
+    def send_photo(self, chat_id, photo, caption):
+        if self.errors:
+            raise self.errors.pop(0)
+        self.sent.append((chat_id, caption, photo))
+
+    def delete(self, chat_id, message_ids):
+        self.deleted.append((chat_id, list(message_ids)))
+
+
+@pytest.fixture
+def telegram():
+    return FakeTelegram()
+
+
+@pytest.fixture
+def outbox(db, telegram):
+    return Outbox(db, telegram.send, telegram.delete, send_photo=telegram.send_photo, global_rate=1000,
+                  chat_rate=1000, chat_burst=1000)
+
+
+def rows(db):
+    return db.query_all('SELECT chat_id, text, attempts, next_attempt_at FROM outbox ORDER BY id')
+
+
+def test_messages_are_sent_in_order(outbox, telegram, db):
+    for text in ('первое', 'второе', 'третье'):
+        outbox.put(1, text).result()
+    outbox._send_pending()
+    assert [text for _, text, _ in telegram.sent] == ['первое', 'второе', 'третье']
+    assert outbox.pending() == 0
+
+
+def queue_many(db, chat_id, count):
+    db.submit(lambda conn: conn.executemany('INSERT INTO outbox (chat_id, text) VALUES (?, ?)',
+                                            [(chat_id, f'отчет {i}') for i in range(count)])).result()
+
+
+# Длинная очередь одного чата не задерживает сообщения других чатов
+def test_long_queue_of_one_chat_does_not_block_others(db, telegram):
+    outbox = Outbox(db, telegram.send, telegram.delete)
+    queue_many(db, 42, 600)
+    outbox.put(7, 'вопрос').result()
+    delay = outbox._send_pending()
+    assert (7, 'вопрос', None) in telegram.sent
+    assert [chat_id for chat_id, _, _ in telegram.sent].count(42) == outbox.chat_burst
+    assert delay == 0
+    # Лимит чата исчерпан, отправлять нечего - проход не повторяется сразу
+    assert outbox._send_pending() > 0
+
+
+# Воркер отправляет только чаты своего шарда; чужие строки не мешают и не зацикливают проход
+def test_shard_rows_are_selected_in_sql(db, telegram):
+    outbox = Outbox(db, telegram.send, telegram.delete)
+    outbox._shard, outbox._shards = 0, 2
+    queue_many(db, 1, 500)
+    for chat_id in (2, -4, -3):
+        outbox.put(chat_id, 'свое' if chat_id % 2 == 0 else 'чужое').result()
+    assert outbox._send_pending() == 0
+    assert sorted(chat_id for chat_id, _, _ in telegram.sent) == [-4, 2]
+    assert outbox._send_pending() > 0
+    assert outbox.pending() == 501
+
+
+def test_rate_limit_pauses_sending(outbox, telegram, db):
+    telegram.errors = [api_error(429, retry_after=30)]
+    outbox.put(1, 'a').result()
+    outbox.put(2, 'b').result()
+    started = time.time()
+    outbox._send_pending()
+    # После 429 отправка приостановлена для всех чатов
+    assert telegram.sent == []
+    assert outbox.paused_until >= started + 30
+    chat_id, _, attempts, next_attempt_at = rows(db)[0]
+    assert (chat_id, attempts) == (1, 1)
+    assert next_attempt_at >= started + 30
+
+    outbox.paused_until = 0
+    db.execute('UPDATE outbox SET next_attempt_at = 0').result()
+    outbox._send_pending()
+    assert [text for _, text, _ in telegram.sent] == ['a', 'b']
+
+
+def test_network_error_is_retried_with_backoff(outbox, telegram, db):
+    telegram.errors = [ConnectionError('сеть'), ConnectionError('сеть')]
+    outbox.put(1, 'первое').result()
+    outbox.put(1, 'второе').result()
+    started = time.time()
+    outbox._send_pending()
+    # Второе сообщение чата ждет, пока не уйдет первое
+    assert telegram.sent == []
+    assert [(text, attempts) for _, text, attempts, _ in rows(db)] == [('первое', 1), ('второе', 0)]
+    assert rows(db)[0][3] >= started + outbox_module.BACKOFF_BASE
+
+    db.execute('UPDATE outbox SET next_attempt_at = 0').result()
+    outbox._send_pending()
+    assert rows(db)[0][2] == 2
+    db.execute('UPDATE outbox SET next_attempt_at = 0').result()
+    outbox._send_pending()
+    assert [text for _, text, _ in telegram.sent] == ['первое', 'второе']
+    assert outbox.failed == 0
+
+
+def test_attempts_are_limited(outbox, telegram, db):
+    telegram.errors = [ConnectionError('сеть')] * outbox_module.MAX_ATTEMPTS
+    outbox.put(1, 'a').result()
+    for _ in range(outbox_module.MAX_ATTEMPTS):
+        db.execute('UPDATE outbox SET next_attempt_at = 0').result()
+        outbox._send_pending()
+    assert outbox.pending() == 0
+    assert outbox.failed == 1
+
+
+def test_client_error_drops_message(outbox, telegram, db):
+    telegram.errors = [api_error(403)]
+    outbox.put(1, 'a').result()
+    outbox.put(2, 'b').result()
+    outbox._send_pending()
+    assert outbox.failed == 1
+    assert [chat_id for chat_id, _, _ in telegram.sent] == [2]
+    assert outbox.pending() == 0
+
+
+def test_tracked_messages_are_deleted_by_cleanup(outbox, telegram, db):
+    outbox.put(1, 'вопрос 1', track=True).result()
+    outbox.put(1, 'вопрос 2', track=True).result()
+    outbox.put_cleanup(1).result()
+    outbox.put(1, 'спасибо').result()
+    outbox._send_pending()
+    assert telegram.deleted == [(1, [101, 102])]
+    assert [text for _, text, _ in telegram.sent] == ['вопрос 1', 'вопрос 2', 'спасибо']
+    assert db.query_one('SELECT COUNT(*) FROM checklist_messages')[0] == 0
+
+
+def test_photo_follows_text(outbox, telegram, db):
+    outbox.put(1, 'сводка').result()
+    outbox.put_photo(1, b'\x89PNG', 'график').result()
+    outbox._send_pending()
+    assert telegram.sent == [(1, 'сводка', None), (1, 'график', b'\x89PNG')]
+
+
+def test_long_message_is_split(outbox, telegram, db):
+    text = '\n'.join(f'строка {i} ' + 'x' * 100 for i in range(100))
+    outbox.put(1, text, markup='{"keyboard": []}').result()
+    outbox._send_pending()
+    parts = [sent_text for _, sent_text, _ in telegram.sent]
+    assert len(parts) > 1
+    assert all(len(part) <= MAX_MESSAGE_LENGTH for part in parts)
+    assert ''.join(parts) == text
+    # Клавиатура - только у последней части
+    assert [markup for _, _, markup in telegram.sent] == [None] * (len(parts) - 1) + ['{"keyboard": []}']
+
+
+def test_split_message():
+    assert split_message('коротко') == ['коротко']
+    parts = split_message('a' * (MAX_MESSAGE_LENGTH * 2 + 10))
+    assert [len(part) for part in parts] == [MAX_MESSAGE_LENGTH, MAX_MESSAGE_LENGTH, 10]
+    assert split_message('a' * MAX_MESSAGE_LENGTH + '\n' + ' ' * 5) == ['a' * MAX_MESSAGE_LENGTH]
+
+
+def test_split_digest():
+    reports = ['x' * 3000, 'y' * 3000, 'z' * 10]
+    messages = split_digest(reports, 'Сводка')
+    assert len(messages) == 2
+    assert all(message.startswith('Сводка') and len(message) <= MAX_MESSAGE_LENGTH for message in messages)
+
+
+# Длинный отчет в сводке не обрезается, а переносится в следующие сообщения
+def test_split_digest_keeps_long_reports():
+    report = '\n'.join(f'Адрес {i} ' + 'x' * 200 for i in range(40))
+    messages = split_digest(['короткий', report], 'Сводка')
+    assert all(message.startswith('Сводка') and len(message) <= MAX_MESSAGE_LENGTH for message in messages)
+    body = ''.join(message[len('Сводка\n\n'):] for message in messages)
+    assert 'короткий' in body
+    assert body.replace('короткий', '').replace('\n', '') == report.replace('\n', '')
+
+
+def test_digest_flush_sends_long_report_in_full(db, telegram):
+    outbox = Outbox(db, telegram.send, telegram.delete, chat_rate=1000, chat_burst=1000, digest_interval=60)
+    report = '\n'.join(f'Замечание {i} ' + 'x' * 300 for i in range(30))
+    outbox.put(999, report, digest=True).result()
+    outbox.put(999, 'второй отчет', digest=True).result()
+    outbox._flush_digest()
+    outbox._send_pending()
+    texts = [text for _, text, _ in telegram.sent]
+    assert len(texts) > 1 and all(len(text) <= MAX_MESSAGE_LENGTH for text in texts)
+    body = ''.join(texts)
+    assert all(f'Замечание {i} ' + 'x' * 300 in body for i in range(30))
+    assert 'второй отчет' in body
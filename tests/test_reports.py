@@ -0,0 +1,68 @@
+from datetime import date, datetime
+
+from rate_bot import reports
+from rate_bot.reports import Scheduler, fold
+
+MONDAY = int(datetime(2024, 3, 4, 12).timestamp())
+PREVIOUS_WEEK = int(datetime(2024, 2, 27, 12).timestamp())
+
+
+class FakeOutbox:
+    def __init__(self):
+        self.sent = []
+
+    def put(self, chat_id, text):
+        self.sent.append((chat_id, text))
+
+    def put_photo(self, chat_id, photo, caption):
+        self.sent.append((chat_id, caption))
+
+
+def reviews(db, kind):
+    return dict(db.query_all('SELECT period, SUM(reviews) FROM summaries WHERE kind = ? GROUP BY period', (kind,)))
+
+
+# Отзывы переносятся в summaries порциями после отметки; повторный проход ничего не добавляет
+def test_fold_moves_watermark(db, add_feedback):
+    for user_id in range(4):
+        add_feedback(user_id, date=MONDAY)
+    last = add_feedback(9, date=PREVIOUS_WEEK, cleaner_id=2)
+    assert [db.submit(lambda conn: fold(conn, limit=2)).result() for _ in range(4)] == [2, 2, 1, 0]
+    assert db.query_one("SELECT last_feedback_id FROM export_state WHERE name = 'summaries'")[0] == last
+    assert reviews(db, 'day') == {'2024-02-27': 1, '2024-03-04': 4}
+    assert reviews(db, 'week') == {'2024-02-26': 1, '2024-03-04': 4}
+
+    add_feedback(10, date=MONDAY)
+    assert db.submit(fold).result() == 1
+    assert reviews(db, 'day')['2024-03-04'] == 5
+
+
+# Сводка отправляется начиная с hour и один раз, даже при нескольких планировщиках
+def test_reports_are_sent_once(db, add_feedback):
+    add_feedback(1, date=MONDAY)
+    add_feedback(2, date=PREVIOUS_WEEK)
+    outbox = FakeOutbox()
+    scheduler = Scheduler(db, outbox, 999, charts=False, hour=9)
+    scheduler.run_once(datetime(2024, 3, 5, 8))
+    assert outbox.sent == []
+    assert reviews(db, 'day') == {'2024-02-27': 1, '2024-03-04': 1}
+
+    scheduler.run_once(datetime(2024, 3, 5, 10))
+    assert [text.splitlines()[0] for _, text in outbox.sent] == [
+        '📅 Сводка за 04.03.2024', '📅 Сводка за неделю 26.02–03.03.2024']
+    assert 'Отзывов: 1 (днем ранее: 0)' in outbox.sent[0][1]
+    Scheduler(db, outbox, 999, charts=False, hour=9).run_once(datetime(2024, 3, 5, 11))
+    assert len(outbox.sent) == 2
+
+
+# Период без отзывов отмечается, но сводка не приходит
+def test_empty_period(db):
+    outbox = FakeOutbox()
+    assert not Scheduler(db, outbox, 999, charts=False).send_report('day', date(2024, 3, 4))
+    assert db.query_one('SELECT COUNT(*) FROM summary_reports')[0] == 1
+    assert outbox.sent == []
+
+
+def test_last_complete():
+    assert reports.last_complete('day', date(2024, 3, 5)) == date(2024, 3, 4)
+    assert reports.last_complete('week', date(2024, 3, 10)) == date(2024, 2, 26)
@@ -0,0 +1,53 @@
+import time
+
+from rate_bot.db import Database
+from rate_bot.sessions import SessionStore
+
+
+def test_session_lifecycle():
+    sessions = SessionStore()
+    assert sessions.get(1) is None
+    assert not sessions.update(1, name='Иван')
+    sessions.start(1, name='Иван')
+    assert sessions.update(1, address='Адрес')
+    assert sessions.get(1) == {'name': 'Иван', 'address': 'Адрес'}
+    assert sessions.finish(1) == {'name': 'Иван', 'address': 'Адрес'}
+    assert sessions.get(1) is None and len(sessions) == 0
+
+
+def test_ttl():
+    sessions = SessionStore(ttl=0.05)
+    sessions.start(1, name='Иван')
+    time.sleep(0.1)
+    assert sessions.get(1) is None
+    sessions.start(2)
+    time.sleep(0.1)
+    # Просроченные сессии вытесняются при создании новой
+    sessions.start(3)
+    assert len(sessions) == 1
+
+
+# Ответы незавершенного чек-листа переживают перезапуск: новый процесс читает их из SQLite
+def test_session_is_restored_from_sqlite(db):
+    sessions = SessionStore(db=db)
+    sessions.start(1, name='Иван')
+    sessions.update(1, cleaner_id=2)
+    sessions.start(2, name='Анна')
+    sessions.finish(2)
+
+    restarted = Database(db.path)
+    restarted.start()
+    sessions = SessionStore(db=restarted)
+    assert len(sessions) == 0
+    assert sessions.get(1) == {'name': 'Иван', 'cleaner_id': 2}
+    assert sessions.get(2) is None
+    assert sessions.update(1, address='Адрес')
+    assert SessionStore(db=restarted).finish(1) == {'name': 'Иван', 'cleaner_id': 2, 'address': 'Адрес'}
+    assert restarted.query_one('SELECT COUNT(*) FROM checklist_sessions')[0] == 0
+
+
+def test_expired_session_is_not_restored(db):
+    SessionStore(db=db).start(1, name='Иван')
+    db.execute('UPDATE checklist_sessions SET touched_at = touched_at - 100').result()
+    assert SessionStore(ttl=50, db=db).get(1) is None
+    assert db.query_one('SELECT COUNT(*) FROM checklist_sessions')[0] == 0
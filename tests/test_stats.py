@@ -0,0 +1,38 @@
+from rate_bot import stats
+
+ANSWERS = [
+    dict(user_id=1, date=1700000000, cleaning_type='g', windows=1, cobweb=0, balcony=1, recommendation_rating=10),
+    dict(user_id=2, date=1700000000, cleaning_type='m', floor=0, recommendation_rating=8, cleaner_rating=6),
+    dict(user_id=3, date=1710000000, cleaning_type='m', cleaner_id=2, recommendation_rating=3),
+    dict(user_id=4, date=1720000000, cleaning_type='g', windows=0, cobweb=None, balcony=1, manager_rating=5),
+]
+
+
+def stats_rows(db):
+    return db.query_all('SELECT * FROM cleaner_stats ORDER BY period, cleaner_id, cleaning_type')
+
+
+# Агрегаты, накопленные по одному отзыву, совпадают с полным пересчетом по feedback
+def test_incremental_matches_rebuild(db, add_feedback):
+    for answers in ANSWERS:
+        add_feedback(**answers)
+    incremental = stats_rows(db)
+    assert db.rebuild_stats().result() == len(ANSWERS)
+    assert stats_rows(db) == incremental
+    assert {row[0] for row in incremental} == {'all', '2023', '2024', '2023-11', '2024-03', '2024-07'}
+
+
+def test_stats_report(db, add_feedback):
+    for answers in ANSWERS:
+        add_feedback(**answers)
+    report = stats.stats_report(db, '/stats Илья')
+    assert report.startswith('📊 Статистика за все время')
+    assert 'отзывов 3' in report
+    assert 'NPS 67' in report and 'Пол: 67%' in report
+    assert stats.stats_report(db, '/stats Никто') == 'Клинер Никто не найден'
+    assert stats.stats_report(db, '/stats 2020') == 'Нет отзывов за 2020'
+
+
+def test_parse_stats_args():
+    assert stats.parse_stats_args('/stats') == (None, 'all')
+    assert stats.parse_stats_args('/stats Анна Мария 2024-03') == ('Анна Мария', '2024-03')
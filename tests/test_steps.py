@@ -0,0 +1,76 @@
+import time
+
+import pytest
+
+from rate_bot.db import Database
+from rate_bot.steps import LocalRedis, RedisStepStorage, SQLiteStepStorage, create_step_storage
+
+
+# Все хранилища шагов реализуют один интерфейс: get/set/delete
+@pytest.fixture(params=['sqlite', 'redis', 'local'])
+def make_storage(request, db):
+    def make(ttl=None):
+        if request.param == 'sqlite':
+            return SQLiteStepStorage(db, ttl=ttl)
+        if request.param == 'redis':
+            return RedisStepStorage(LocalRedis(), ttl=ttl)
+        return create_step_storage('local', None, ttl=ttl)
+    return make
+
+
+def test_set_get_delete(make_storage):
+    storage = make_storage()
+    assert storage.get(1) is None
+    storage.set(1, 'cleaning_type', 'g')
+    assert storage.get(1) == ('cleaning_type', ['g'])
+    storage.set(1, 'windows')
+    assert storage.get(1) == ('windows', [])
+    storage.delete(1)
+    assert storage.get(1) is None
+    storage.delete(1)
+
+
+def test_chats_are_independent(make_storage):
+    storage = make_storage()
+    storage.set(1, 'name')
+    storage.set(2, 'address', None)
+    storage.delete(1)
+    assert storage.get(1) is None
+    assert storage.get(2) == ('address', [None])
+
+
+def test_ttl(make_storage):
+    storage = make_storage(ttl=0.05)
+    storage.set(1, 'name')
+    assert storage.get(1) == ('name', [])
+    time.sleep(0.1)
+    assert storage.get(1) is None
+
+
+# Шаг в SQLite переживает перезапуск (новый Database к тому же файлу)
+def test_sqlite_survives_restart(db):
+    SQLiteStepStorage(db).set(1, 'floor', 'm')
+    restarted = Database(db.path)
+    restarted.start()
+    assert SQLiteStepStorage(restarted).get(1) == ('floor', ['m'])
+
+
+# Отдельный файл шагов (STEP_DB) открывается без миграций бота
+def test_sqlite_in_separate_file(tmp_path):
+    database = Database(str(tmp_path / 'steps.db'))
+    database.start(migrate=False)
+    storage = SQLiteStepStorage(database)
+    storage.set(1, 'name')
+    assert storage.get(1) == ('name', [])
+    assert database.query_all("SELECT name FROM sqlite_master WHERE name = 'feedback'") == []
+
+
+def test_local_redis():
+    client = LocalRedis()
+    assert client.get('a') is None
+    assert client.set('a', 'значение')
+    assert client.get('a') == 'значение'.encode()
+    client.set('b', b'x', ex=0.01)
+    time.sleep(0.05)
+    assert client.get('b') is None
+    assert client.delete('a', 'b', 'c') == 1
@@ -0,0 +1,5 @@
+# Запуск webhook-сервера: python webhook.py. Код сервера - rate_bot/webhook.py
+from rate_bot.webhook import run
+
+if __name__ == '__main__':
+    run()